@@ -0,0 +1,386 @@
+"""HTTP inference API with an asynchronous request queue.
+
+Clients `POST /analyze` with the encoded image bytes as the request body and
+receive a job id (202), then poll `GET /results/{id}` until the job is `done`
+or `error`. `GET /metrics` returns queue depth, rejected-request counts,
+request latency percentiles, and the pipeline's own metrics.
+
+Accepted images wait in a bounded queue; when it is full, requests are
+rejected with 503 instead of queueing without limit. A single worker drains
+the queue into batches (up to the VLM batch size, waiting at most
+`max_wait_ms` for a batch to fill) and runs them on the resident pipeline in
+a dedicated thread, so the event loop keeps accepting requests while the
+model is busy.
+"""
+
+import asyncio
+import io
+import json
+import signal
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+
+from PIL import Image, UnidentifiedImageError
+
+from bda_svc import app, constants, export
+
+# Longest time a client may take to send its request
+REQUEST_TIMEOUT_S = 30.0
+
+
+@dataclass
+class Job:
+    """An analysis request and its result."""
+
+    id: str
+    image: bytes | None
+    status: str = "queued"  # queued | running | done | error
+    result: dict | None = None
+    error: str | None = None
+    accepted: float = field(default_factory=time.monotonic)
+
+    def to_dict(self) -> dict:
+        """Return the job as a JSON-serializable reply."""
+        reply = {"id": self.id, "status": self.status}
+        if self.result is not None:
+            reply["result"] = self.result
+        if self.error is not None:
+            reply["error"] = self.error
+        return reply
+
+
+class AnalysisService:
+    """Asynchronous HTTP front end for one resident BDAPipeline."""
+
+    def __init__(
+        self,
+        model,
+        queue_size: int = 64,
+        max_batch_size: int | None = None,
+        max_wait_ms: float = 50.0,
+        max_results: int = 1024,
+        max_body_mb: float = 32.0,
+    ) -> None:
+        """Initialize the queue and job store.
+
+        Args:
+            model: Loaded BDAPipeline (or any object with `analyze_batch`,
+                `metrics`, and `vlm.batch_size`).
+            queue_size: Maximum number of images waiting for the worker.
+            max_batch_size: Maximum images per batch (VLM batch size if None).
+            max_wait_ms: Maximum time the first image of a batch waits for
+                more to arrive.
+            max_results: Number of finished jobs kept for `GET /results`.
+            max_body_mb: Largest accepted request body, in megabytes.
+        """
+        self.model = model
+        self.metrics = model.metrics
+        self.queue_size = max(1, int(queue_size))
+        self.max_batch_size = max(1, int(max_batch_size or model.vlm.batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_results = max(1, int(max_results))
+        self.max_body = int(max_body_mb * 1024 * 1024)
+
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue: asyncio.Queue[Job] | None = None
+        self._worker: asyncio.Task | None = None
+        self._server: asyncio.Server | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="bda-model"
+        )
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        """Start the model worker and listen for HTTP requests.
+
+        Args:
+            host: Interface to bind.
+            port: TCP port to bind (0 picks a free port).
+
+        Returns:
+            Listening server.
+        """
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run_worker())
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    @property
+    def port(self) -> int:
+        """Port the server is listening on."""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stop accepting requests, then stop the worker."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    def submit(self, image: bytes) -> Job:
+        """Queue an image for analysis.
+
+        Args:
+            image: Encoded image bytes.
+
+        Returns:
+            Queued job.
+
+        Raises:
+            asyncio.QueueFull: If the queue is at capacity.
+        """
+        job = Job(id=uuid.uuid4().hex, image=image)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self._record_queue_depth()
+        return job
+
+    def metrics_snapshot(self) -> dict:
+        """Return queue state and all run metrics.
+
+        Returns:
+            Dictionary with `queue` (depth, capacity, and rejected requests)
+            and the metrics snapshot (`api.latency_ms` holds request latency
+            percentiles).
+        """
+        snapshot = self.metrics.snapshot()
+        queue = {
+            "depth": self._queue.qsize(),
+            "capacity": self.queue_size,
+            "rejected": snapshot["counters"].get("api.rejected", 0),
+        }
+        return {"queue": queue, **snapshot}
+
+    async def _run_worker(self) -> None:
+        """Drain the queue into batches and run them on the pipeline.
+
+        If a batch fails, its jobs are retried one at a time, so only the jobs
+        that fail on their own are marked as errors.
+        """
+        while True:
+            batch = await self._collect()
+            self._record_queue_depth()
+            self.metrics.count("api.batch_size", len(batch))
+            for job in batch:
+                job.status = "running"
+
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._fail(batch[0], e)
+                else:
+                    # Retry one at a time, so a bad image fails only its own job
+                    for job in batch:
+                        try:
+                            await self._run_batch([job])
+                        except Exception as job_error:
+                            self._fail(job, job_error)
+
+            finished = time.monotonic()
+            for job in batch:
+                job.image = None
+                self.metrics.observe("api.latency_ms", (finished - job.accepted) * 1000)
+            self._evict_results()
+
+    async def _run_batch(self, jobs: list[Job]) -> None:
+        """Analyze jobs as one batch on the pipeline and store their results."""
+        streams = [io.BytesIO(job.image) for job in jobs]
+        responses = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.model.analyze_batch, streams
+        )
+        for job, response in zip(jobs, responses, strict=True):
+            job.status, job.result = "done", export.to_result(response)
+
+    def _fail(self, job: Job, error: Exception) -> None:
+        """Mark a job as failed."""
+        job.status, job.error = "error", f"Analysis failed: {error}"
+        self.metrics.increment("api.failed")
+
+    async def _collect(self) -> list[Job]:
+        """Wait for a job, then gather more until the batch is full or times out."""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except TimeoutError:
+                break
+        return batch
+
+    def _record_queue_depth(self) -> None:
+        """Update the queue depth gauge."""
+        self.metrics.set_gauge("api.queue_depth", self._queue.qsize())
+
+    def _evict_results(self) -> None:
+        """Forget the oldest finished jobs beyond `max_results`."""
+        finished = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in ("done", "error")
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_results)]:
+            del self.jobs[job_id]
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer one HTTP request and close the connection."""
+        try:
+            async with asyncio.timeout(REQUEST_TIMEOUT_S):
+                method, path, body = await self._read_request(reader)
+            status, reply = self._route(method, path, body)
+        except _HTTPError as e:
+            status, reply = e.status, {"error": e.message}
+        except (TimeoutError, ValueError, asyncio.IncompleteReadError):
+            status, reply = HTTPStatus.BAD_REQUEST, {"error": "Malformed request."}
+
+        payload = json.dumps(reply).encode()
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[str, str, bytes]:
+        """Parse the request line, headers, and body.
+
+        Returns:
+            Request method, path (without query string), and body.
+
+        Raises:
+            _HTTPError: If the body is too large.
+            ValueError: If the request is malformed.
+        """
+        method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            raise _HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Image too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], body
+
+    def _route(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        """Dispatch a request to its endpoint.
+
+        Returns:
+            Response status and JSON reply.
+
+        Raises:
+            _HTTPError: If the route, method, or request body is invalid.
+        """
+        if path == "/analyze":
+            _require(method, "POST")
+            return self._analyze(body)
+        if path.startswith("/results/"):
+            _require(method, "GET")
+            job = self.jobs.get(path.removeprefix("/results/"))
+            if job is None:
+                raise _HTTPError(HTTPStatus.NOT_FOUND, "Unknown job id.")
+            return HTTPStatus.OK, job.to_dict()
+        if path == "/metrics":
+            _require(method, "GET")
+            return HTTPStatus.OK, self.metrics_snapshot()
+        raise _HTTPError(HTTPStatus.NOT_FOUND, "Not found.")
+
+    def _analyze(self, body: bytes) -> tuple[HTTPStatus, dict]:
+        """Validate an uploaded image and queue it."""
+        try:
+            with Image.open(io.BytesIO(body)) as image:
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError) as e:
+            raise _HTTPError(
+                HTTPStatus.BAD_REQUEST, "Request body is not a valid image."
+            ) from e
+
+        try:
+            job = self.submit(body)
+        except asyncio.QueueFull as e:
+            self.metrics.increment("api.rejected")
+            raise _HTTPError(
+                HTTPStatus.SERVICE_UNAVAILABLE, "Queue is full, retry later."
+            ) from e
+        return HTTPStatus.ACCEPTED, job.to_dict()
+
+
+class _HTTPError(Exception):
+    """Error answered with an HTTP status and message."""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _require(method: str, expected: str) -> None:
+    """Reject requests that use the wrong method for an endpoint."""
+    if method != expected:
+        raise _HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {expected}.")
+
+
+def serve_http(
+    host: str | None, port: int | None, queue_size: int | None, model=None
+) -> None:
+    """Load the pipeline and serve the HTTP API until interrupted.
+
+    Args:
+        host: Optional interface from command-line arguments.
+        port: Optional TCP port from command-line arguments.
+        queue_size: Optional queue capacity from command-line arguments.
+        model: Optional loaded BDAPipeline (loaded from config if None).
+    """
+    if model is None:
+        model = app.load_pipeline()
+
+    # Explicit zero or empty values (e.g., `--port 0` for a free port) are kept
+    host = constants.DEFAULT_HTTP_HOST if host is None else host
+    port = constants.DEFAULT_HTTP_PORT if port is None else port
+    if queue_size is None:
+        queue_size = constants.DEFAULT_HTTP_QUEUE_SIZE
+    service = AnalysisService(model, queue_size=queue_size)
+
+    async def run() -> None:
+        stop = asyncio.Event()
+        # Shut down cleanly on SIGTERM as well as Ctrl-C
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        await service.start(host, port)
+        print(f"[*] Serving HTTP on {host}:{service.port}")
+        try:
+            await stop.wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        model.close()
+        app.print_summary(model.metrics.summary())
@@ -1,25 +1,344 @@
-"""Main application entry point for BDA Service."""
-
-from bda_svc import cli, export, inputs
-
-
-def main() -> None:
-    """Run BDA analysis on an image."""
-    # Get command-line arguments (if any)
-    args = cli.get_args()
-
-    # Lazy load heavy packages
-    from bda_svc.pipeline.model import BDAPipeline
-
-    # Get input data
-    input_folder = inputs.get_input_folder(args.input)
-    input_paths = inputs.get_input_paths(input_folder)
-
-    # Initialize model
-    model = BDAPipeline()
-
-    # Run analysis
-    for input_path in input_paths:
-        print(f"\nProcessing: {input_path}\n{'-' * 80}")
-        result = model.analyze(input_path)
-        export.save_json(result, input_path, args.output)
+"""Main application entry point for BDA Service."""
+
+import itertools
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from bda_svc import cli, constants, export, inputs, journal, shards
+
+
+def main() -> None:
+    """Run BDA analysis on an image."""
+    # Get command-line arguments (if any)
+    args = cli.get_args()
+
+    if args.command == "http":
+        from bda_svc import api
+
+        api.serve_http(args.host, args.port, args.queue_size)
+        return
+
+    if args.command == "merge-shards":
+        merge_shards(args.manifests, args.input)
+        return
+
+    if args.command is not None:
+        from bda_svc import server
+
+        if args.command == "serve":
+            server.serve(args.socket)
+        else:
+            server.submit(args.input, args.output, args.socket)
+        return
+
+    # Get input data
+    input_folder = inputs.get_input_folder(args.input)
+
+    if args.watch:
+        watch(args, input_folder)
+        return
+
+    input_paths = inputs.get_input_paths(
+        input_folder, args.shard_index, args.shard_count
+    )
+
+    # Record finished inputs; on resume, skip those completed by earlier runs
+    output_folder = args.output or constants.DEFAULT_OUTPUT_PATH
+    run_journal = journal.RunJournal(output_folder)
+    completed = run_journal.completed(input_paths) if args.resume else {}
+    pending = [path for path in input_paths if path not in completed]
+    if args.resume:
+        print(
+            f"[*] Resuming: {len(completed)} of {len(input_paths)} inputs "
+            f"already done ({run_journal.path})"
+        )
+
+    # Videos are decoded as streams of sampled frames, after the images
+    videos = [
+        path for path in pending if path.suffix.lower() in constants.VIDEO_EXTENSIONS
+    ]
+    images = [
+        path for path in pending if path.suffix.lower() in constants.IMAGE_EXTENSIONS
+    ]
+    sampler = None
+    if videos:
+        from bda_svc import video
+
+        video.require_pyav()
+        try:
+            sampler = video.FrameSampler(
+                args.video_sampling,
+                args.video_every,
+                args.video_fps,
+                args.video_scene_threshold,
+            )
+        except ValueError as e:
+            sys.exit(f"\n{e} Exiting.\n")
+
+    # Optionally analyze only one representative per near-duplicate group
+    groups = None
+    analyzed_paths = images
+    if args.dedupe is not None and images:
+        from bda_svc import dedupe
+
+        groups = dedupe.group_frames(
+            images, args.dedupe, args.dedupe_hash, constants.DECODE_THREADS
+        )
+        analyzed_paths = [group.representative for group in groups]
+        print(
+            f"[*] Dedupe: {len(images)} images in {len(groups)} groups "
+            f"({len(images) - len(groups)} results propagated)"
+        )
+
+    model = None
+    try:
+        if not analyzed_paths:
+            # Nothing hashed to this shard, or everything was already done
+            exported = []
+        elif args.workers > 1:
+            from bda_svc import workers
+
+            exported = workers.analyze_parallel(
+                analyzed_paths, args.output, args.workers, run_journal=run_journal
+            )
+        else:
+            model = load_pipeline()
+
+            # Run analysis in batches
+            exported = analyze_paths(
+                model, analyzed_paths, args.output, run_journal=run_journal
+            )
+
+        if groups is not None:
+            exported = dedupe.propagate(groups, images, exported, args.output)
+        outputs = dict(zip(images, exported, strict=True))
+        for group in groups or []:
+            for path, _ in group.members:
+                run_journal.record(path, "done", outputs[path])
+
+        for path in videos:
+            model = model or load_pipeline()
+            outputs[path] = video.analyze_video(model, path, args.output, sampler)
+            run_journal.record(path, "done", outputs[path])
+    finally:
+        run_journal.close()
+        if model is not None:
+            model.close()
+
+    # Report run metrics
+    if model is not None:
+        print_summary(model.metrics.summary())
+
+    if args.shard_count > 1:
+        completed.update(outputs)
+        shards.write_manifest(
+            input_folder,
+            input_paths,
+            [completed[path] for path in input_paths],
+            output_folder,
+            args.shard_index,
+            args.shard_count,
+        )
+
+
+def load_pipeline():
+    """Load the BDA pipeline from config."""
+    # Lazy load heavy packages
+    from bda_svc.pipeline.model import BDAPipeline
+
+    return BDAPipeline()
+
+
+def print_summary(summary: str, title: str = "Run summary") -> None:
+    """Print a metrics summary under a heading (nothing if it is empty).
+
+    Args:
+        summary: Summary text from `RunMetrics.summary`.
+        title: Heading printed above the summary.
+    """
+    if summary:
+        print(f"\n{title}\n{'-' * 80}\n{summary}")
+
+
+def watch(args, input_folder: Path) -> None:
+    """Analyze images as they arrive in the input folder until interrupted.
+
+    Args:
+        args: Parsed command-line arguments.
+        input_folder: Folder to watch.
+
+    Raises:
+        SystemExit: If the input path is not a folder.
+    """
+    from bda_svc import watch
+
+    if not input_folder.is_dir():
+        sys.exit(f"\nThe input path {input_folder} is not a folder. Exiting.\n")
+    shards.validate(args.shard_index, args.shard_count)
+
+    model = load_pipeline()
+    run_journal = journal.RunJournal(args.output or constants.DEFAULT_OUTPUT_PATH)
+    try:
+        watch.watch_folder(
+            model,
+            input_folder,
+            args.output,
+            args.watch_debounce,
+            args.watch_interval,
+            run_journal,
+            args.resume,
+            args.shard_index,
+            args.shard_count,
+        )
+    except KeyboardInterrupt:
+        print("\n[*] Stopped watching")
+    finally:
+        run_journal.close()
+        model.close()
+
+    print_summary(model.metrics.summary())
+
+
+def merge_shards(manifests: list[str], cmdline_input: str | None) -> None:
+    """Check shard manifests and print the coverage report.
+
+    Args:
+        manifests: Shard manifest file paths.
+        cmdline_input: Optional input folder to list the images that should be
+            covered.
+
+    Raises:
+        SystemExit: If any image is missing or covered more than once.
+    """
+    expected = None
+    if cmdline_input:
+        input_folder = inputs.get_input_folder(cmdline_input)
+        expected = [
+            shards.relative_name(path, input_folder)
+            for path in inputs.get_input_paths(input_folder)
+        ]
+
+    report = shards.merge_manifests([Path(path) for path in manifests], expected)
+
+    print(f"\nShard coverage\n{'-' * 80}")
+    for name, value in report.items():
+        if isinstance(value, list):
+            value = ", ".join(map(str, value)) or "none"
+        print(f"{name}: {value}")
+
+    if not report["ok"]:
+        sys.exit("\nShard manifests do not cover every image exactly once.\n")
+
+
+def analyze_paths(
+    model,
+    input_paths: list[Path],
+    output_path: str | Path | None,
+    prefetch: int = constants.PREFETCH_IMAGES,
+    decode_threads: int = constants.DECODE_THREADS,
+    run_journal: journal.RunJournal | None = None,
+) -> list[Path]:
+    """Analyze images in batches and export each result.
+
+    Runs as three overlapped stages connected by bounded queues: a thread
+    pool prepares (`model.prepare`: cached result lookup, else decode) up to
+    `prefetch` images ahead of the current batch, the
+    calling thread only runs inference, and a writer thread parses and writes
+    the results. The model therefore does not wait on disk reads or writes
+    unless a stage falls a full queue behind.
+
+    Args:
+        model: Loaded BDAPipeline.
+        input_paths: Image paths to analyze.
+        output_path: Path of output folder. Uses default if None/empty.
+        prefetch: Number of images decoded ahead of the current batch.
+        decode_threads: Number of decoding threads.
+        run_journal: Optional run manifest that records each exported image.
+
+    Returns:
+        Paths of the exported JSON files, in input order.
+
+    Raises:
+        OSError: If an image cannot be read or a result cannot be written.
+    """
+    batch_size = model.vlm.batch_size
+    writes: queue.Queue[tuple[str, Path] | None] = queue.Queue(maxsize=max(1, prefetch))
+    exported: list[Path] = []
+    errors: list[Exception] = []
+    writer = threading.Thread(
+        target=_write_results,
+        args=(writes, output_path, exported, errors, run_journal),
+        name="bda-writer",
+        daemon=True,
+    )
+    writer.start()
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(1, decode_threads), thread_name_prefix="bda-decode"
+        ) as pool:
+            # Decoded images in flight, at most one batch plus `prefetch` ahead
+            decoding: deque[Future] = deque()
+            upcoming = iter(input_paths)
+            for start in range(0, len(input_paths), batch_size):
+                batch_paths = input_paths[start : start + batch_size]
+                for input_path in itertools.islice(
+                    upcoming, len(batch_paths) + max(0, prefetch) - len(decoding)
+                ):
+                    decoding.append(pool.submit(model.prepare, input_path))
+
+                waited = time.perf_counter()
+                results = [decoding.popleft().result() for _ in batch_paths]
+                model.metrics.observe(
+                    "io.decode_wait_ms", (time.perf_counter() - waited) * 1000
+                )
+
+                # Prepared items are cached results (str) or decoded images
+                pending = [
+                    i for i, item in enumerate(results) if not isinstance(item, str)
+                ]
+                for i in pending:
+                    print(f"\nProcessing: {batch_paths[i]}\n{'-' * 80}")
+                if pending:
+                    analyzed = model.analyze_batch([results[i] for i in pending])
+                    for i, result in zip(pending, analyzed, strict=True):
+                        results[i] = result
+
+                for input_path, result in zip(batch_paths, results, strict=True):
+                    writes.put((result, input_path))
+                model.metrics.set_gauge("io.write_backlog", writes.qsize())
+    finally:
+        writes.put(None)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+    return exported
+
+
+def _write_results(
+    writes: queue.Queue,
+    output_path: str | Path | None,
+    exported: list[Path],
+    errors: list[Exception],
+    run_journal: journal.RunJournal | None,
+) -> None:
+    """Export (result, input path) items until a None sentinel arrives.
+
+    After a failed write, later items are drained without writing so that the
+    model thread never blocks on a full queue.
+    """
+    while (item := writes.get()) is not None:
+        if errors:
+            continue
+        try:
+            exported.append(export.save_json(*item, output_path))
+            if run_journal is not None:
+                run_journal.record(item[1], "done", exported[-1])
+        except Exception as e:
+            errors.append(e)
@@ -0,0 +1,224 @@
+"""Benchmark the two-stage and fused pipeline modes against each other."""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from bda_svc import export, inputs
+from bda_svc.metrics import summarize
+
+
+def get_args() -> argparse.Namespace:
+    """Parse benchmark command-line arguments.
+
+    Returns:
+        Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare latency and output agreement of BDA pipeline modes."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        help=("Path to input image file or folder."),
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help=("Path to write the benchmark report as JSON."),
+    )
+
+    return parser.parse_args()
+
+
+def assessed_targets(bda: str) -> list[tuple[str, str]] | None:
+    """Extract (target_type, damage_category) pairs from a BDA response.
+
+    Args:
+        bda: BDA analysis text.
+
+    Returns:
+        Normalized pairs for every assessed target, or None if the response
+        cannot be parsed.
+    """
+    try:
+        parsed = export.to_dict(bda)
+    except ValueError:
+        return None
+
+    targets = []
+    for entry in parsed.values():
+        if not isinstance(entry, dict) or "target_type" not in entry:
+            continue
+        target_type = str(entry.get("target_type", "")).strip().lower()
+        damage = str(entry.get("damage_category", "")).strip().upper()
+        targets.append((target_type, damage))
+    return targets
+
+
+def multiset_f1(reference: list, candidate: list) -> float:
+    """Return the F1 score between two multisets.
+
+    Args:
+        reference: Reference items (repeats count).
+        candidate: Candidate items (repeats count).
+
+    Returns:
+        F1 score in [0, 1]; 1.0 when both are empty.
+    """
+    if not reference and not candidate:
+        return 1.0
+
+    overlap = sum((Counter(reference) & Counter(candidate)).values())
+    return 2 * overlap / (len(reference) + len(candidate))
+
+
+def agreement(reference: str, candidate: str) -> dict:
+    """Score how closely a candidate BDA matches a reference BDA.
+
+    Args:
+        reference: Reference BDA text (two-stage mode).
+        candidate: Candidate BDA text (fused mode).
+
+    Returns:
+        Dictionary with `parsed` (both responses parsed), `count_match`,
+        `target_type_f1`, and `assessment_f1` (over target type and damage
+        category pairs).
+    """
+    ref_targets = assessed_targets(reference)
+    cand_targets = assessed_targets(candidate)
+    if ref_targets is None or cand_targets is None:
+        return {
+            "parsed": False,
+            "count_match": False,
+            "target_type_f1": 0.0,
+            "assessment_f1": 0.0,
+        }
+
+    return {
+        "parsed": True,
+        "count_match": len(ref_targets) == len(cand_targets),
+        "target_type_f1": multiset_f1(
+            [t for t, _ in ref_targets], [t for t, _ in cand_targets]
+        ),
+        "assessment_f1": multiset_f1(ref_targets, cand_targets),
+    }
+
+
+def run_mode(model, mode: str, paths: list[Path]) -> tuple[list[str], list[float]]:
+    """Analyze every image in one pipeline mode with cold caches.
+
+    Args:
+        model: Loaded BDAPipeline.
+        mode: Pipeline mode to benchmark.
+        paths: Image paths to analyze.
+
+    Returns:
+        Model responses and per-image latencies in milliseconds.
+    """
+    model.mode = mode
+    for cache in (
+        getattr(model.vlm, "vision_cache", None),
+        getattr(model.vlm, "prefix_cache", None),
+    ):
+        if cache is not None:
+            cache.clear()
+
+    outputs, latencies = [], []
+    for path in paths:
+        started = time.perf_counter()
+        outputs.append(model.analyze(path))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return outputs, latencies
+
+
+def compare_modes(model, paths: list[Path]) -> dict:
+    """Benchmark the two-stage and fused modes on the same images.
+
+    Args:
+        model: Loaded BDAPipeline.
+        paths: Image paths to analyze.
+
+    Returns:
+        Benchmark report with latency summaries per mode, mean agreement of
+        fused against two-stage outputs, and per-image details.
+    """
+    original_mode = model.mode
+    # Measure the model, not the on-disk result cache
+    result_cache = getattr(model, "result_cache", None)
+    model.result_cache = None
+    try:
+        two_stage, two_stage_ms = run_mode(model, "two-stage", paths)
+        fused, fused_ms = run_mode(model, "fused", paths)
+    finally:
+        model.mode = original_mode
+        model.result_cache = result_cache
+
+    scores = [agreement(a, b) for a, b in zip(two_stage, fused, strict=True)]
+    n = max(1, len(scores))
+
+    return {
+        "images": len(paths),
+        "latency_ms": {
+            "two-stage": summarize(two_stage_ms),
+            "fused": summarize(fused_ms),
+        },
+        "agreement": {
+            "parsed": sum(s["parsed"] for s in scores) / n,
+            "count_match": sum(s["count_match"] for s in scores) / n,
+            "target_type_f1": sum(s["target_type_f1"] for s in scores) / n,
+            "assessment_f1": sum(s["assessment_f1"] for s in scores) / n,
+        },
+        "per_image": [
+            {
+                "path": str(path),
+                "two_stage_ms": a_ms,
+                "fused_ms": b_ms,
+                **score,
+            }
+            for path, a_ms, b_ms, score in zip(
+                paths, two_stage_ms, fused_ms, scores, strict=True
+            )
+        ],
+    }
+
+
+def main() -> None:
+    """Run the pipeline mode benchmark."""
+    args = get_args()
+
+    # Lazy load heavy packages
+    from bda_svc.pipeline.model import BDAPipeline
+
+    input_folder = inputs.get_input_folder(args.input)
+    input_paths = inputs.image_paths(inputs.get_input_paths(input_folder))
+    if not input_paths:
+        sys.exit(f"\nThe input path {input_folder} contains no images. Exiting.\n")
+
+    model = BDAPipeline()
+
+    report = compare_modes(model, input_paths)
+    model.close()
+
+    print(f"\nBenchmark ({report['images']} images)\n{'-' * 80}")
+    for mode, stats in report["latency_ms"].items():
+        print(
+            f"{mode}: mean={stats['mean']:.1f} ms p50={stats['p50']:.1f} ms "
+            f"p95={stats['p95']:.1f} ms"
+        )
+    for name, value in report["agreement"].items():
+        print(f"agreement.{name}: {value:.3f}")
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with output_path.open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"[*] Exported: {output_path}")
@@ -2,21 +2,222 @@
 
 import argparse
 
+from bda_svc import constants
+
 
 def get_args() -> argparse.Namespace:
     """Parse command-line arguments.
 
+    Without a subcommand, images are analyzed in-process. `serve` keeps the
+    pipeline resident behind a Unix domain socket, `submit` sends a job to
+    a running server, `http` serves an HTTP inference API, and
+    `merge-shards` checks the manifests of a sharded run.
+
     Returns:
-        Parsed command-line arguments.
+        Parsed command-line arguments (`command` is None, `serve`, `submit`,
+        `http`, or `merge-shards`).
     """
     bda_svc_desc = "Automated BDA service powered by machine learning."
 
     parser = argparse.ArgumentParser(description=bda_svc_desc)
+    add_io_args(parser)
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes, each with its own pipeline on its own "
+            "GPU or CPU cores (default: 1)."
+        ),
+    )
+
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=0,
+        help=("Index of the shard of the input folder to analyze (default: 0)."),
+    )
+
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=1,
+        help=(
+            "Number of shards the input folder is split into across nodes; "
+            "writes a shard manifest to the output folder (default: 1)."
+        ),
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Skip images already completed in the output folder's run manifest "
+            "(unchanged size and modification time, output file present)."
+        ),
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Keep the pipeline loaded and analyze images as they arrive in the "
+            "input folder (inotify, or polling where unavailable)."
+        ),
+    )
+
+    parser.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=constants.WATCH_DEBOUNCE_S,
+        metavar="SECONDS",
+        help=(
+            "Seconds an arriving file must stay unchanged before it is analyzed "
+            f"(default: {constants.WATCH_DEBOUNCE_S})."
+        ),
+    )
+
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=constants.WATCH_POLL_INTERVAL_S,
+        metavar="SECONDS",
+        help=(
+            "Rescan interval when inotify is unavailable "
+            f"(default: {constants.WATCH_POLL_INTERVAL_S})."
+        ),
+    )
+
+    parser.add_argument(
+        "--dedupe",
+        type=int,
+        nargs="?",
+        const=constants.DEDUPE_THRESHOLD,
+        metavar="BITS",
+        help=(
+            "Analyze one representative per group of near-duplicate images "
+            "(perceptual hashes within BITS of 64, default: "
+            f"{constants.DEDUPE_THRESHOLD}) and copy its result to the others."
+        ),
+    )
+
+    parser.add_argument(
+        "--dedupe-hash",
+        choices=("dhash", "phash", "both"),
+        default=constants.DEDUPE_HASH,
+        help=(
+            "Perceptual hash used by --dedupe; `both` requires both to match "
+            f"(default: {constants.DEDUPE_HASH})."
+        ),
+    )
+
+    parser.add_argument(
+        "--video-sampling",
+        choices=("every", "fps", "scene"),
+        default=constants.VIDEO_SAMPLING,
+        help=(
+            "Which frames of input videos are analyzed: every Nth frame, a fixed "
+            "rate, or scene changes (default: "
+            f"{constants.VIDEO_SAMPLING})."
+        ),
+    )
+
+    parser.add_argument(
+        "--video-every",
+        type=int,
+        default=constants.VIDEO_EVERY,
+        metavar="N",
+        help=(
+            "Frame interval for --video-sampling every "
+            f"(default: {constants.VIDEO_EVERY})."
+        ),
+    )
 
     parser.add_argument(
+        "--video-fps",
+        type=float,
+        default=constants.VIDEO_FPS,
+        help=(
+            "Frames per second of video for --video-sampling fps "
+            f"(default: {constants.VIDEO_FPS})."
+        ),
+    )
+
+    parser.add_argument(
+        "--video-scene-threshold",
+        type=int,
+        default=constants.VIDEO_SCENE_THRESHOLD,
+        metavar="BITS",
+        help=(
+            "dHash distance (of 64 bits) from the last sampled frame that counts "
+            f"as a scene change (default: {constants.VIDEO_SCENE_THRESHOLD})."
+        ),
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    serve = subparsers.add_parser(
+        "serve", help="Load the pipeline once and serve jobs over a Unix socket."
+    )
+    add_socket_arg(serve)
+
+    submit = subparsers.add_parser(
+        "submit", help="Analyze images with a running `bda-svc serve` process."
+    )
+    # Suppressed defaults keep `-i`/`-o` given before the subcommand
+    add_io_args(submit, default=argparse.SUPPRESS)
+    add_socket_arg(submit)
+
+    http = subparsers.add_parser(
+        "http", help="Load the pipeline once and serve an HTTP inference API."
+    )
+    http.add_argument(
+        "--host",
+        type=str,
+        help=("Interface to listen on (default: 127.0.0.1)."),
+    )
+    http.add_argument(
+        "--port",
+        type=int,
+        help=("TCP port to listen on (default: 8080)."),
+    )
+    http.add_argument(
+        "--queue-size",
+        type=int,
+        help=("Maximum queued images before requests are rejected (default: 64)."),
+    )
+
+    merge = subparsers.add_parser(
+        "merge-shards",
+        help="Check that shard manifests cover every image exactly once.",
+    )
+    merge.add_argument("manifests", nargs="+", type=str, help=("Shard manifest files."))
+    merge.add_argument(
         "-i",
         "--input",
         type=str,
+        default=argparse.SUPPRESS,
+        help=("Path to the input folder, to also check for uncovered images."),
+    )
+
+    return parser.parse_args()
+
+
+def add_io_args(parser: argparse.ArgumentParser, default=None) -> None:
+    """Add the input and output path arguments.
+
+    Args:
+        parser: Parser to extend.
+        default: Value when an argument is omitted (`argparse.SUPPRESS` leaves
+            a value parsed by the parent parser in place).
+    """
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        default=default,
         help=("Path to input image file or folder."),
     )
 
@@ -24,7 +225,20 @@ def get_args() -> argparse.Namespace:
         "-o",
         "--output",
         type=str,
+        default=default,
         help=("Path to output folder."),
     )
 
-    return parser.parse_args()
+
+def add_socket_arg(parser: argparse.ArgumentParser) -> None:
+    """Add the server socket path argument.
+
+    Args:
+        parser: Parser to extend.
+    """
+    parser.add_argument(
+        "-s",
+        "--socket",
+        type=str,
+        help=("Path to the server's Unix domain socket."),
+    )
@@ -3,6 +3,35 @@
 # Input-related constants
 ENV_INPUT_NAME = "BDA_INPUT"
 DEFAULT_INPUT_PATH = "./bda_input"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
 
 # Output-related constants
 DEFAULT_OUTPUT_PATH = "./bda_output"
+
+# Overlapped I/O: images decoded ahead of the model, and decoding threads
+PREFETCH_IMAGES = 8
+DECODE_THREADS = 4
+
+# Near-duplicate suppression: default Hamming threshold (of 64 bits) and hash
+DEDUPE_THRESHOLD = 6
+DEDUPE_HASH = "both"
+
+# Video frame sampling: default mode, frame interval, rate, and scene threshold
+VIDEO_SAMPLING = "fps"
+VIDEO_EVERY = 30
+VIDEO_FPS = 1.0
+VIDEO_SCENE_THRESHOLD = 12
+
+# Watch mode: seconds a new file must stay unchanged, and polling interval
+WATCH_DEBOUNCE_S = 1.0
+WATCH_POLL_INTERVAL_S = 2.0
+
+# Server-related constants
+ENV_SOCKET_NAME = "BDA_SOCKET"
+DEFAULT_SOCKET_PATH = "/tmp/bda-svc.sock"
+
+# HTTP API-related constants
+DEFAULT_HTTP_HOST = "127.0.0.1"
+DEFAULT_HTTP_PORT = 8080
+DEFAULT_HTTP_QUEUE_SIZE = 64
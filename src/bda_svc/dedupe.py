@@ -0,0 +1,216 @@
+"""Near-duplicate suppression for frame sequences.
+
+Frames are fingerprinted with 64-bit perceptual hashes (dHash and/or pHash),
+computed with NumPy over small grayscale thumbnails for all frames at once.
+Each frame joins the group whose representative is closest, if it is within
+a Hamming distance threshold; otherwise it starts a new group. Only
+representatives are analyzed, and their results are propagated to the other
+members with a record of where each result came from. A frame that cannot be
+decoded is kept in a group of its own, so it fails later on its own.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from bda_svc import export
+
+# Hash methods: difference hash, DCT-based hash, or both (both must match)
+HASH_METHODS = ("dhash", "phash", "both")
+
+# Thumbnail side for pHash (its 8x8 lowest DCT frequencies form the hash)
+PHASH_SIZE = 32
+
+
+@dataclass
+class FrameGroup:
+    """Near-duplicate frames sharing one analyzed representative."""
+
+    representative: Path
+    # Propagated frames and their Hamming distance to the representative
+    members: list[tuple[Path, int]] = field(default_factory=list)
+
+
+def load_thumbnails(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Decode a frame into the grayscale thumbnails the hashes use.
+
+    JPEGs are decoded in draft mode, since only a tiny thumbnail is needed.
+
+    Args:
+        path: Image file path.
+
+    Returns:
+        9x8 (width x height) thumbnail for dHash and 32x32 thumbnail for pHash.
+    """
+    with Image.open(path) as image:
+        image.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+        gray = image.convert("L")
+    small = gray.resize((9, 8), Image.Resampling.BILINEAR)
+    large = gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BILINEAR)
+    return np.asarray(small, dtype=np.float32), np.asarray(large, dtype=np.float32)
+
+
+def _try_load_thumbnails(path: Path) -> tuple[np.ndarray, np.ndarray] | None:
+    """Return a frame's thumbnails, or None if it cannot be decoded."""
+    try:
+        return load_thumbnails(path)
+    except (OSError, ValueError) as e:
+        print(f"[!] Cannot hash {path} ({e}); analyzing it separately")
+        return None
+
+
+def dhash(thumbnails: np.ndarray) -> np.ndarray:
+    """Compute difference hashes for a stack of 8x9 thumbnails.
+
+    Args:
+        thumbnails: Array of shape (N, 8, 9).
+
+    Returns:
+        Array of N 64-bit hashes (bit set where brightness increases to the
+        right).
+    """
+    return _pack(thumbnails[:, :, 1:] > thumbnails[:, :, :-1])
+
+
+def phash(thumbnails: np.ndarray) -> np.ndarray:
+    """Compute DCT perceptual hashes for a stack of square thumbnails.
+
+    Args:
+        thumbnails: Array of shape (N, S, S).
+
+    Returns:
+        Array of N 64-bit hashes (bit set where an 8x8 low-frequency DCT
+        coefficient exceeds their median, ignoring the DC term).
+    """
+    size = thumbnails.shape[-1]
+    k = np.arange(size)
+    basis = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    low = (basis[:8] @ thumbnails @ basis[:8].T).reshape(len(thumbnails), 64)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """Pack (N, ..., 64 bits) booleans into N unsigned 64-bit integers."""
+    packed = np.packbits(bits.reshape(len(bits), 64), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def group_frames(
+    paths: list[Path], threshold: int, method: str = "both", threads: int = 4
+) -> list[FrameGroup]:
+    """Group near-duplicate frames.
+
+    Frames are visited in order; each joins the closest existing group whose
+    representative is within `threshold` bits, else it becomes the
+    representative of a new group. Distances are to the representative, so
+    slow drift across a long sequence still starts new groups. Frames that
+    cannot be decoded each form a group of their own.
+
+    Args:
+        paths: Image paths (in sequence order).
+        threshold: Maximum Hamming distance (of 64 bits) to a representative.
+        method: `dhash`, `phash`, or `both` (the larger distance counts).
+        threads: Number of threads decoding thumbnails.
+
+    Returns:
+        Groups in order of their representatives.
+
+    Raises:
+        ValueError: If the hash method is unknown.
+    """
+    if method not in HASH_METHODS:
+        expected = ", ".join(HASH_METHODS)
+        raise ValueError(
+            f"Unknown hash method '{method}'. Expected one of: {expected}."
+        )
+    if not paths:
+        return []
+
+    with ThreadPoolExecutor(max(1, threads), thread_name_prefix="bda-hash") as pool:
+        thumbnails = list(pool.map(_try_load_thumbnails, paths))
+
+    # Hashes of the decodable frames, in order
+    hashes = iter(())
+    readable = [thumbs for thumbs in thumbnails if thumbs is not None]
+    if readable:
+        small, large = zip(*readable, strict=True)
+        columns = []
+        if method in ("dhash", "both"):
+            columns.append(dhash(np.stack(small)))
+        if method in ("phash", "both"):
+            columns.append(phash(np.stack(large)))
+        hashes = iter(np.stack(columns, axis=1))
+
+    groups: list[FrameGroup] = []
+    # Hashes of the decodable representatives and the index of their group
+    representatives = np.empty((0, 2 if method == "both" else 1), dtype=np.uint64)
+    hashed_groups: list[int] = []
+    for path, thumbs in zip(paths, thumbnails, strict=True):
+        if thumbs is None:
+            groups.append(FrameGroup(representative=path))
+            continue
+
+        frame_hash = next(hashes)
+        if hashed_groups:
+            distances = np.bitwise_count(representatives ^ frame_hash).max(axis=1)
+            closest = int(distances.argmin())
+            if distances[closest] <= threshold:
+                group = groups[hashed_groups[closest]]
+                group.members.append((path, int(distances[closest])))
+                continue
+        hashed_groups.append(len(groups))
+        groups.append(FrameGroup(representative=path))
+        representatives = np.vstack([representatives, frame_hash])
+    return groups
+
+
+def propagate(
+    groups: list[FrameGroup],
+    input_paths: list[Path],
+    exported: list[Path],
+    output_path: str | Path | None,
+) -> list[Path]:
+    """Copy each representative's result to its group members.
+
+    Every exported JSON gains a `dedupe` entry: `inferred` (with the frames
+    it was propagated to) for representatives, and `propagated` (with the
+    source frame and Hamming distance) for the other members.
+
+    Args:
+        groups: Frame groups from `group_frames`.
+        input_paths: All frame paths, in input order.
+        exported: Exported JSON file of each representative, in group order.
+        output_path: Path of output folder. Uses default if None/empty.
+
+    Returns:
+        Exported JSON file of every frame, in input order.
+    """
+    by_frame: dict[Path, Path] = {}
+    for group, json_path in zip(groups, exported, strict=True):
+        with json_path.open(encoding="utf-8") as f:
+            result = json.load(f)
+
+        inferred = {
+            "status": "inferred",
+            "propagated_to": [str(path) for path, _ in group.members],
+        }
+        with json_path.open("w", encoding="utf-8") as f:
+            json.dump({**result, "dedupe": inferred}, f, indent=4)
+        by_frame[group.representative] = json_path
+
+        for path, distance in group.members:
+            propagated = {
+                "status": "propagated",
+                "source": str(group.representative),
+                "hamming_distance": distance,
+            }
+            by_frame[path] = export.save_json(
+                json.dumps({**result, "dedupe": propagated}), path, output_path
+            )
+
+    return [by_frame[path] for path in input_paths]
@@ -1,7 +1,9 @@
 """Export utilities."""
 
 import datetime
+import hashlib
 import json
+import os
 from pathlib import Path
 
 from json_repair import repair_json
@@ -21,43 +23,74 @@ def to_dict(bda: str) -> dict:
     Raises:
         ValueError: If BDA text cannot be parsed into a JSON dictionary.
     """
-    # Preferred path: model already returned JSON text
+    # Preferred path: model already returned JSON text (always true for
+    # grammar-constrained reports), so only repair when strict parsing fails
     try:
-        parsed = json.loads(repair_json(bda))
-        if isinstance(parsed, dict):
-            return parsed
-    except Exception:
-        pass
+        parsed = json.loads(bda)
+    except json.JSONDecodeError:
+        try:
+            parsed = json.loads(repair_json(bda))
+        except Exception:
+            parsed = None
+    if isinstance(parsed, dict):
+        return parsed
 
     # TODO: Legacy fallback: parse old sectioned plaintext format.
     raise ValueError("Unable to parse BDA output into a JSON dictionary.")
 
 
-def save_json(bda: str, image_path: str | Path, output_path: str | Path | None) -> None:
+def to_result(bda: str) -> dict:
+    """Convert BDA string to its exported dictionary.
+
+    Args:
+        bda: BDA analysis text.
+
+    Returns:
+        Dictionary form of BDA, or the raw model output with the parse error
+        if it cannot be parsed.
+    """
+    try:
+        return to_dict(bda)
+    except ValueError as e:
+        return {
+            "parse_error": str(e),
+            "raw_output": bda,
+        }
+
+
+def save_json(
+    bda: str,
+    image_path: str | Path,
+    output_path: str | Path | None,
+    extra: dict | None = None,
+) -> Path:
     """Save BDA as a JSON file.
 
+    The file is named after the image's stem, a short hash of its absolute
+    path (so same-named images in different folders do not overwrite each
+    other), and the UTC time.
+
     Args:
         bda: BDA analysis text.
         image_path: Path of the original image.
         output_path: Path of output folder. Uses default if None/empty.
+        extra: Optional entries added to the exported dictionary (e.g., the
+            source video and timestamp of a frame).
+
+    Returns:
+        Path of the written JSON file.
     """
     image_path = Path(image_path)
     output_path = Path(output_path or constants.DEFAULT_OUTPUT_PATH)
     output_path.mkdir(parents=True, exist_ok=True)
 
     timestamp = datetime.datetime.now(datetime.UTC).strftime("%Y-%m-%d_%H%M%SZ")
-    json_path = output_path / f"{image_path.stem}_{timestamp}.json"
+    digest = hashlib.sha1(os.fsencode(os.path.abspath(image_path))).hexdigest()[:8]
+    json_path = output_path / f"{image_path.stem}_{digest}_{timestamp}.json"
 
     # Preserve raw model output if parse fails
-    try:
-        bda_dict = to_dict(bda)
-    except ValueError as e:
-        bda_dict = {
-            "parse_error": str(e),
-            "raw_output": bda,
-        }
-
     with json_path.open("w", encoding="utf-8") as f:
-        json.dump(bda_dict, f, indent=4)
+        json.dump({**to_result(bda), **(extra or {})}, f, indent=4)
 
     print(f"[*] Exported: {json_path}")
+    return json_path
@@ -4,7 +4,7 @@ import sys
 from os import environ
 from pathlib import Path
 
-from bda_svc import constants
+from bda_svc import constants, shards
 
 
 def get_input_folder(cmdline_path: str | None) -> Path:
@@ -43,20 +43,28 @@ def get_input_folder(cmdline_path: str | None) -> Path:
     return input_folder
 
 
-def get_input_paths(input_folder: Path) -> list[Path]:
-    """Retrieve paths to all input image files.
+def get_input_paths(
+    input_folder: Path, shard_index: int = 0, shard_count: int = 1
+) -> list[Path]:
+    """Retrieve paths to all input image and video files (or one shard of them).
 
     Args:
         input_folder: Input folder path (or a single file path).
+        shard_index: Index of the shard to select.
+        shard_count: Total number of shards. Each image belongs to the shard
+            given by a hash of its path relative to `input_folder`.
 
     Returns:
-        List of valid image file paths.
+        List of valid image file paths in the selected shard (may be empty
+        when sharding).
 
     Raises:
-        SystemExit: If no valid input images are found.
+        SystemExit: If no valid input images are found, or the shard
+            selection is invalid.
     """
+    shards.validate(shard_index, shard_count)
     files: list[Path] = []
-    valid_ext = (".png", ".jpg", ".jpeg", ".bmp")
+    valid_ext = constants.IMAGE_EXTENSIONS + constants.VIDEO_EXTENSIONS
 
     # Return early if input_folder is actually a file
     if input_folder.is_file():
@@ -83,4 +91,43 @@ def get_input_paths(input_folder: Path) -> list[Path]:
         )
 
     files.sort()
+    if shard_count > 1:
+        files = [
+            path
+            for path in files
+            if in_shard(path, input_folder, shard_index, shard_count)
+        ]
+        print(f"[*] Shard {shard_index} of {shard_count}: {len(files)} images")
     return files
+
+
+def in_shard(
+    path: Path, input_folder: Path, shard_index: int = 0, shard_count: int = 1
+) -> bool:
+    """Check whether an image belongs to the selected shard.
+
+    Args:
+        path: Image path.
+        input_folder: Input folder the shard is selected from.
+        shard_index: Index of the shard to select.
+        shard_count: Total number of shards.
+
+    Returns:
+        True if the image's relative path hashes to `shard_index`.
+    """
+    if shard_count <= 1:
+        return True
+    relative = shards.relative_name(path, input_folder)
+    return shards.shard_of(relative, shard_count) == shard_index
+
+
+def image_paths(paths: list[Path]) -> list[Path]:
+    """Keep only image files (for callers that cannot decode videos).
+
+    Args:
+        paths: Input paths from `get_input_paths`.
+
+    Returns:
+        Paths with an image extension, in the same order.
+    """
+    return [path for path in paths if path.suffix.lower() in constants.IMAGE_EXTENSIONS]
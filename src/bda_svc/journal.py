@@ -0,0 +1,142 @@
+"""Append-only run manifest for resumable runs.
+
+Every exported (or failed) image is appended to `run_manifest.jsonl` in the
+output folder as one JSON line with its path, size, modification time,
+status, and output file. Lines are flushed as they are written, so the
+manifest survives a crash up to the last finished image. `--resume` loads
+the manifest into a dictionary and skips images whose latest entry is
+`done`, whose size and modification time are unchanged, and whose output
+file still exists: one lookup and two `stat` calls per image.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+MANIFEST_NAME = "run_manifest.jsonl"
+
+
+class RunJournal:
+    """Append-only journal of analyzed images in an output folder."""
+
+    def __init__(self, output_path: str | Path) -> None:
+        """Load the existing manifest (if any) from the output folder.
+
+        Args:
+            output_path: Path of the output folder.
+        """
+        self.output_path = Path(output_path)
+        self.path = self.output_path / MANIFEST_NAME
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        # Length of the complete lines, if a torn last line must be cut off
+        self._truncate_to: int | None = None
+
+        if self.path.exists():
+            complete = 0
+            with self.path.open("rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Partial last line from an interrupted run
+                        self._truncate_to = complete
+                        break
+                    complete += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    # Later entries supersede earlier ones
+                    self._entries[entry["path"]] = entry
+
+    def lookup(self, image_path: Path) -> Path | None:
+        """Return the output file of an image completed by a previous run.
+
+        Args:
+            image_path: Input image path.
+
+        Returns:
+            Exported JSON path, or None if the image was not completed, has
+            changed since, or its output file is gone.
+        """
+        entry = self._entries.get(_key(image_path))
+        if entry is None or entry["status"] != "done":
+            return None
+
+        try:
+            stat = image_path.stat()
+        except OSError:
+            return None
+        output = self.output_path / entry["output"]
+        if (
+            stat.st_size != entry["size"]
+            or stat.st_mtime_ns != entry["mtime_ns"]
+            or not output.exists()
+        ):
+            return None
+        return output
+
+    def completed(self, image_paths: list[Path]) -> dict[Path, Path]:
+        """Return the images completed by previous runs and their output files.
+
+        Args:
+            image_paths: Input image paths.
+
+        Returns:
+            Dictionary of completed image path to exported JSON path.
+        """
+        completed = {}
+        for image_path in image_paths:
+            output = self.lookup(image_path)
+            if output is not None:
+                completed[image_path] = output
+        return completed
+
+    def record(self, image_path: Path, status: str, output: Path | None = None) -> None:
+        """Append an image's outcome to the manifest (thread-safe).
+
+        An image that no longer exists (e.g., failed because it was removed)
+        is recorded without a size and modification time, so it is never
+        skipped on resume.
+
+        Args:
+            image_path: Input image path.
+            status: `done` or `failed`.
+            output: Exported JSON path (for `done`).
+        """
+        try:
+            stat = image_path.stat()
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size = mtime_ns = None
+        entry = {
+            "path": _key(image_path),
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "status": status,
+            "output": output.name if output is not None else None,
+        }
+        with self._lock:
+            if self._file is None:
+                self.output_path.mkdir(parents=True, exist_ok=True)
+                if self._truncate_to is not None:
+                    # Appending onto a torn line would corrupt the new entry
+                    os.truncate(self.path, self._truncate_to)
+                    self._truncate_to = None
+                self._file = self.path.open("a", encoding="utf-8")
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self._entries[entry["path"]] = entry
+
+    def close(self) -> None:
+        """Close the manifest file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _key(image_path: Path) -> str:
+    """Return the manifest key of an image (its absolute path)."""
+    return os.path.abspath(image_path)
@@ -0,0 +1,143 @@
+"""Run metrics collection."""
+
+import statistics
+import threading
+from collections import Counter, deque
+
+# Most recent samples kept per metric (bounds memory on long-running services)
+SAMPLE_WINDOW = 10_000
+
+
+class RunMetrics:
+    """Thread-safe store of counters, gauges, samples, and histograms."""
+
+    def __init__(self) -> None:
+        """Initialize empty metric stores."""
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._gauge_peaks: dict[str, float] = {}
+        self._samples: dict[str, deque[float]] = {}
+        self._sample_counts: dict[str, int] = {}
+        self._histograms: dict[str, Counter] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add a value to a counter.
+
+        Args:
+            name: Metric name.
+            value: Amount to add.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set the current value of a gauge and track its peak.
+
+        Args:
+            name: Metric name.
+            value: Current value.
+        """
+        with self._lock:
+            self._gauges[name] = value
+            self._gauge_peaks[name] = max(self._gauge_peaks.get(name, value), value)
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample (e.g., a latency) for summary statistics.
+
+        Only the most recent `SAMPLE_WINDOW` samples of each metric are kept;
+        the total number of samples is still counted.
+
+        Args:
+            name: Metric name.
+            value: Sample value.
+        """
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=SAMPLE_WINDOW)
+            self._samples[name].append(value)
+            self._sample_counts[name] = self._sample_counts.get(name, 0) + 1
+
+    def count(self, name: str, bucket: int | str) -> None:
+        """Increment a histogram bucket.
+
+        Args:
+            name: Metric name.
+            bucket: Histogram bucket (e.g., a batch size).
+        """
+        with self._lock:
+            self._histograms.setdefault(name, Counter())[bucket] += 1
+
+    def snapshot(self) -> dict:
+        """Return a point-in-time copy of all metrics.
+
+        Returns:
+            Dictionary with `counters`, `gauges`, `samples` (the total count,
+            plus mean/p50/p95/max over the recent sample window), and
+            `histograms`.
+        """
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+            sample_counts = dict(self._sample_counts)
+            snapshot = {
+                "counters": dict(self._counters),
+                "gauges": {
+                    k: {"current": v, "peak": self._gauge_peaks[k]}
+                    for k, v in self._gauges.items()
+                },
+                "histograms": {
+                    k: dict(sorted(v.items())) for k, v in self._histograms.items()
+                },
+            }
+
+        snapshot["samples"] = {
+            k: summarize(v) | {"count": sample_counts[k]} for k, v in samples.items()
+        }
+        return snapshot
+
+    def summary(self) -> str:
+        """Format all metrics as a human-readable run summary.
+
+        Returns:
+            Multi-line summary text.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name}: {value:g}")
+        for name, gauge in sorted(snapshot["gauges"].items()):
+            lines.append(f"{name}: {gauge['current']:g} (peak {gauge['peak']:g})")
+        for name, stats in sorted(snapshot["samples"].items()):
+            lines.append(
+                f"{name}: n={stats['count']} mean={stats['mean']:.1f} "
+                f"p50={stats['p50']:.1f} p95={stats['p95']:.1f} max={stats['max']:.1f}"
+            )
+        for name, hist in sorted(snapshot["histograms"].items()):
+            buckets = ", ".join(f"{k}: {v}" for k, v in hist.items())
+            lines.append(f"{name}: {{{buckets}}}")
+
+        return "\n".join(lines)
+
+
+def summarize(values: list[float]) -> dict:
+    """Summarize samples with count, mean, median, 95th percentile, and max.
+
+    Args:
+        values: Sample values.
+
+    Returns:
+        Dictionary of summary statistics (zeros if there are no samples).
+    """
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    ordered = sorted(values)
+    p95_index = min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": statistics.median(ordered),
+        "p95": ordered[p95_index],
+        "max": ordered[-1],
+    }
@@ -0,0 +1,316 @@
+"""Caches for reusing model work across pipeline stages and runs."""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from PIL import Image
+
+from bda_svc.metrics import RunMetrics
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by entries and/or bytes."""
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        sizeof: Callable[[Any], int] | None = None,
+        metrics: RunMetrics | None = None,
+        name: str = "cache",
+    ) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            max_entries: Maximum number of entries (unbounded if None).
+            max_bytes: Maximum total size of entries (unbounded if None).
+            sizeof: Function returning the size of a value in bytes.
+            metrics: Optional metrics store for hit/miss/eviction counters.
+            name: Prefix for metric names.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.metrics = metrics
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._nbytes = 0
+
+    def __len__(self) -> int:
+        """Return the number of cached entries."""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return whether a key is cached (does not affect recency)."""
+        return key in self._entries
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of cached values in bytes."""
+        return self._nbytes
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return a cached value and mark it most recently used.
+
+        Args:
+            key: Cache key.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        self._count("hits" if entry is not None else "misses")
+        return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value, evicting least recently used entries.
+
+        Values larger than `max_bytes` on their own are not cached.
+
+        Args:
+            key: Cache key.
+            value: Value to cache.
+        """
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._nbytes += size
+
+            while self._over_limit():
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._nbytes -= old_size
+                evicted += 1
+
+        if evicted:
+            self._count("evictions", evicted)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _over_limit(self) -> bool:
+        """Return whether the cache exceeds its entry or byte limit."""
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._nbytes > self.max_bytes
+
+    def _count(self, event: str, value: int = 1) -> None:
+        """Record a cache event in the metrics store."""
+        if self.metrics is not None:
+            self.metrics.increment(f"{self.name}.{event}", value)
+
+
+def image_digest(image: Image.Image) -> str:
+    """Return a content hash identifying a decoded image.
+
+    Args:
+        image: PIL image.
+
+    Returns:
+        Hex digest over the image mode, size, and pixel data.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def source_digest(source: str | Path | BinaryIO | Image.Image) -> str:
+    """Return a content hash identifying an image source.
+
+    Files and streams are hashed over their encoded bytes, without decoding.
+
+    Args:
+        source: Image file path, binary stream of image bytes, or decoded image.
+
+    Returns:
+        Hex digest of the source content.
+    """
+    if isinstance(source, Image.Image):
+        return image_digest(source)
+
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, str | Path):
+        with Path(source).open("rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    elif isinstance(source, io.BytesIO):
+        digest.update(source.getbuffer())
+    else:
+        position = source.tell()
+        digest.update(source.read())
+        source.seek(position)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of analysis results keyed by image content and config.
+
+    Each entry is a small JSON file named by its key. The least recently
+    used entries (by file modification time, refreshed on every hit) are
+    evicted once the cache exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        fingerprint: str,
+        max_bytes: int | None = None,
+        hash_threads: int = 4,
+        metrics: RunMetrics | None = None,
+    ) -> None:
+        """Index the entries of a cache directory (created on first write).
+
+        Args:
+            directory: Cache directory.
+            fingerprint: Digest of everything besides the image that determines
+                a result (model, quantization, prompts, doctrine, ...).
+            max_bytes: Maximum total size of cached entries (unbounded if None).
+            hash_threads: Number of threads hashing image content.
+            metrics: Optional metrics store for hit/miss/eviction counters.
+        """
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        self.hash_threads = max(1, int(hash_threads))
+        self.metrics = metrics or RunMetrics()
+
+        self._lock = threading.Lock()
+        # Index existing entries from least to most recently used
+        entries = []
+        for entry in self.directory.glob("*.json"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.stem, stat.st_size))
+        self._entries: OrderedDict[str, int] = OrderedDict(
+            (key, size) for _, key, size in sorted(entries)
+        )
+        self._nbytes = sum(self._entries.values())
+
+    def __len__(self) -> int:
+        """Return the number of cached entries."""
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of cached entries in bytes."""
+        return self._nbytes
+
+    def key(self, source: str | Path | BinaryIO | Image.Image, extra: str = "") -> str:
+        """Return the cache key for an image source.
+
+        Args:
+            source: Image file path, binary stream of image bytes, or decoded
+                image.
+            extra: Settings that may change between calls (e.g., the mode).
+
+        Returns:
+            Hex digest of the image content, fingerprint, and extra settings.
+        """
+        started = time.perf_counter()
+        content = source_digest(source)
+        self.metrics.observe(
+            "result_cache.hash_ms", (time.perf_counter() - started) * 1000
+        )
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{content}:{self.fingerprint}:{extra}".encode())
+        return digest.hexdigest()
+
+    def keys(self, sources: list, extra: str = "") -> list[str]:
+        """Return cache keys for many image sources, hashing them in parallel.
+
+        Args:
+            sources: Image sources (see `key`).
+            extra: Settings that may change between calls.
+
+        Returns:
+            One key per source, in input order.
+        """
+        if len(sources) <= 1:
+            return [self.key(source, extra) for source in sources]
+        workers = min(self.hash_threads, len(sources))
+        with ThreadPoolExecutor(workers, thread_name_prefix="bda-hash") as pool:
+            return list(pool.map(lambda source: self.key(source, extra), sources))
+
+    def get(self, key: str) -> str | None:
+        """Return a cached result and mark it most recently used.
+
+        Args:
+            key: Cache key.
+
+        Returns:
+            The cached result text, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with path.open(encoding="utf-8") as f:
+                result = json.load(f)["result"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.metrics.increment("result_cache.misses")
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        self.metrics.increment("result_cache.hits")
+        return result
+
+    def put(self, key: str, result: str) -> None:
+        """Store a result, evicting least recently used entries over the cap.
+
+        Args:
+            key: Cache key.
+            result: Result text.
+        """
+        data = json.dumps({"result": result}).encode("utf-8")
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+
+        # Write atomically so concurrent readers never see a partial entry
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+        evicted = []
+        with self._lock:
+            self._nbytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self.max_bytes is not None and self._nbytes > self.max_bytes:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._nbytes -= old_size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            self._path(old_key).unlink(missing_ok=True)
+        if evicted:
+            self.metrics.increment("result_cache.evictions", len(evicted))
+
+    def _path(self, key: str) -> Path:
+        """Return the file path of an entry."""
+        return self.directory / f"{key}.json"
@@ -0,0 +1,894 @@
+"""Generation-time hooks for VLM decoding."""
+
+import bisect
+import copy
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+from bda_svc.metrics import RunMetrics
+from bda_svc.pipeline.cache import LRUCache
+
+
+class FirstTokenTimer(LogitsProcessor):
+    """Record time-to-first-token without changing the scores.
+
+    Logits processors first run right after the prefill forward pass, so the
+    first call marks when the first token is about to be sampled.
+    """
+
+    def __init__(self, started: float | None = None) -> None:
+        """Initialize the timer.
+
+        Args:
+            started: `time.perf_counter()` value of the request start.
+                Defaults to now.
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.first_token: float | None = None
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        """Mark the first decoding step and return scores unchanged."""
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        return scores
+
+    @property
+    def ttft_ms(self) -> float | None:
+        """Milliseconds from request start to the first token, if reached."""
+        if self.first_token is None:
+            return None
+        return (self.first_token - self.started) * 1000
+
+
+class ForwardCounter:
+    """Count forward passes of a model while used as a context manager."""
+
+    def __init__(self, module: torch.nn.Module) -> None:
+        """Initialize the counter.
+
+        Args:
+            module: Model whose top-level forward calls are counted.
+        """
+        self.module = module
+        self.calls = 0
+        self._handle = None
+
+    def __enter__(self) -> "ForwardCounter":
+        """Start counting."""
+        self._handle = self.module.register_forward_hook(self._count)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop counting."""
+        self._handle.remove()
+
+    def _count(self, module, args, output) -> None:
+        """Forward hook incrementing the call count."""
+        self.calls += 1
+
+
+# Structural stop kinds: a balanced top-level JSON object, or a one-line list
+STOP_KINDS = ("json", "list")
+
+# Confidence levels allowed by the report prompt
+CONFIDENCE_LEVELS = ("confirmed", "probable", "possible")
+
+_WHITESPACE = " \t\n\r"
+_ESCAPES = '"\\/bfnrt'
+
+
+class Grammar(ABC):
+    """Character-level automaton over model output.
+
+    States are hashable so that allowed-token sets can be memoized per state.
+    """
+
+    @abstractmethod
+    def initial(self):
+        """Return the state before any output."""
+
+    @abstractmethod
+    def advance(self, state, char: str):
+        """Consume one character.
+
+        Args:
+            state: Current state.
+            char: Next output character.
+
+        Returns:
+            The next state, or None if the character is not allowed.
+        """
+
+    @abstractmethod
+    def accepts(self, state) -> bool:
+        """Return whether the output may end in this state."""
+
+    def in_string(self, state) -> bool:
+        """Return whether the state is inside a free-text string value."""
+        return False
+
+
+class _GrammarState(NamedTuple):
+    """Position of a partial response within a ReportGrammar program."""
+
+    step: int
+    offset: int = 0
+    text: str | None = None
+    escape: bool = False
+    target: int = 1
+    target_type: str = ""
+
+
+class ReportGrammar(Grammar):
+    """Character-level automaton for the report stage's JSON schema.
+
+    Accepts `{"target_1": {...}, "target_2": {...}}` with keys numbered in
+    order, each target holding `target_type`, `damage_category`,
+    `confidence_level`, and `logic` in that order, or the canonical
+    `{"no_targets": {"logic": ...}}`. `target_type` is limited to the given
+    category keys, `damage_category` to the doctrinal labels of the chosen
+    category, and `confidence_level` to CONFIDENCE_LEVELS. Whitespace between
+    tokens is free up to `max_whitespace` characters per gap.
+    """
+
+    def __init__(
+        self,
+        damage_labels: dict[str, list[str]],
+        confidence_levels: tuple[str, ...] = CONFIDENCE_LEVELS,
+        max_whitespace: int = 16,
+    ) -> None:
+        """Build the automaton.
+
+        Args:
+            damage_labels: Allowed damage labels per allowed category key.
+            confidence_levels: Allowed confidence levels.
+            max_whitespace: Maximum whitespace characters between tokens.
+        """
+        self.damage_labels = {k: list(v) for k, v in damage_labels.items() if v}
+        self.confidence_levels = tuple(confidence_levels)
+        self.max_whitespace = max_whitespace
+
+        def field(name: str, value: tuple) -> list[tuple]:
+            return [
+                ("lit", f'"{name}"'),
+                ("ws", None),
+                ("lit", ":"),
+                ("ws", None),
+                value,
+                ("ws", None),
+            ]
+
+        program = [("ws", None), ("lit", "{"), ("ws", None)]
+        self._key_step = len(program) - 1
+        program += [("key", None), ("ws", None), ("lit", ":"), ("ws", None)]
+        program += [("lit", "{"), ("ws", None)]
+        for name in ("target_type", "damage_category", "confidence_level"):
+            program += field(name, ("enum", name)) + [("lit", ","), ("ws", None)]
+        program += field("logic", ("string", None))
+        program += [("lit", "}"), ("ws", None), ("next", None)]
+        self._done_step = len(program)
+        program += [("ws", None), ("done", None)]
+        self._no_targets_step = len(program)
+        program += [
+            ("ws", None),
+            ("lit", ":"),
+            ("ws", None),
+            ("lit", "{"),
+            ("ws", None),
+        ]
+        program += field("logic", ("string", None))
+        program += [("lit", "}"), ("ws", None), ("lit", "}")]
+        program += [("jump", self._done_step)]
+        self._program = program
+
+    def initial(self) -> _GrammarState:
+        """Return the state before any output."""
+        return _GrammarState(step=0)
+
+    def advance(self, state: _GrammarState, char: str) -> _GrammarState | None:
+        """Consume one character (see Grammar.advance)."""
+        kind, arg = self._program[state.step]
+
+        if kind == "jump":
+            return self.advance(state._replace(step=arg, offset=0), char)
+
+        if kind == "ws":
+            if char in _WHITESPACE and state.offset < self.max_whitespace:
+                return state._replace(offset=state.offset + 1)
+            return self.advance(state._replace(step=state.step + 1, offset=0), char)
+
+        if kind == "lit":
+            if char != arg[state.offset]:
+                return None
+            if state.offset + 1 < len(arg):
+                return state._replace(offset=state.offset + 1)
+            return state._replace(step=state.step + 1, offset=0)
+
+        if kind in ("key", "enum"):
+            if state.text is None:
+                return state._replace(text="") if char == '"' else None
+            options = self._options(kind, arg, state)
+            if char == '"':
+                if state.text not in options:
+                    return None
+                return self._close(kind, arg, state)
+            text = state.text + char
+            if not any(option.startswith(text) for option in options):
+                return None
+            return state._replace(text=text)
+
+        if kind == "string":
+            if state.text is None:
+                return state._replace(text="") if char == '"' else None
+            if state.escape:
+                return state._replace(escape=False) if char in _ESCAPES else None
+            if char == "\\":
+                return state._replace(escape=True)
+            if char == '"':
+                return state._replace(step=state.step + 1, text=None)
+            return state if ord(char) >= 0x20 else None
+
+        if kind == "next":
+            if char == ",":
+                return _GrammarState(step=self._key_step, target=state.target + 1)
+            if char == "}":
+                return _GrammarState(step=self._done_step, target=state.target)
+            return None
+
+        return None
+
+    def accepts(self, state: _GrammarState) -> bool:
+        """Return whether the output may end in this state."""
+        kind, arg = self._program[state.step]
+        while kind in ("ws", "jump"):
+            step = arg if kind == "jump" else state.step + 1
+            state = state._replace(step=step, offset=0)
+            kind, arg = self._program[state.step]
+        return kind == "done"
+
+    def in_string(self, state: _GrammarState) -> bool:
+        """Return whether the state is inside a free-text string value."""
+        kind, _ = self._program[state.step]
+        return kind == "string" and state.text is not None and not state.escape
+
+    def _options(self, kind: str, name: str | None, state: _GrammarState) -> list:
+        """Return the allowed values of a key or enum."""
+        if kind == "key":
+            options = [f"target_{state.target}"] if self.damage_labels else []
+            return options + (["no_targets"] if state.target == 1 else [])
+        if name == "target_type":
+            return list(self.damage_labels)
+        if name == "damage_category":
+            return self.damage_labels.get(state.target_type, [])
+        return list(self.confidence_levels)
+
+    def _close(self, kind: str, name: str | None, state: _GrammarState):
+        """Return the state after a key or enum value's closing quote."""
+        if kind == "key" and state.text == "no_targets":
+            return _GrammarState(step=self._no_targets_step)
+        if name == "target_type":
+            state = state._replace(target_type=state.text)
+        return state._replace(step=state.step + 1, offset=0, text=None)
+
+
+class _LabelState(NamedTuple):
+    """Position of a partial response within a ClassifyGrammar."""
+
+    text: str = ""
+    count: int = 0
+    space: bool = False
+    quote: bool = False
+
+
+class ClassifyGrammar(Grammar):
+    """Automaton for the classify stage's comma-separated list of labels.
+
+    Accepts `label, label, ...` (a single space after each comma is
+    optional) where every label is one of the category keys, or an empty
+    answer (nothing, or `""`). Once `max_labels` labels have been emitted only
+    end-of-sequence is allowed, so the list always terminates.
+    """
+
+    def __init__(self, labels: list[str], max_labels: int = 32) -> None:
+        """Build the automaton.
+
+        Args:
+            labels: Allowed labels (category keys).
+            max_labels: Maximum number of labels in the list.
+        """
+        self.labels = frozenset(labels)
+        self.max_labels = max(1, int(max_labels))
+        self._prefixes = frozenset(
+            label[:i] for label in self.labels for i in range(1, len(label) + 1)
+        )
+
+    def initial(self) -> _LabelState:
+        """Return the state before any output."""
+        return _LabelState()
+
+    def advance(self, state: _LabelState, char: str) -> _LabelState | None:
+        """Consume one character (see Grammar.advance)."""
+        if state.quote:
+            # Second quote of an explicit empty answer
+            return None if state.text or char != '"' else state._replace(text='""')
+        if state == self.initial() and char == '"':
+            return state._replace(quote=True)
+
+        text = state.text + char
+        if text in self._prefixes:
+            return state._replace(text=text, space=False)
+        if char == "," and state.text in self.labels:
+            if state.count + 1 >= self.max_labels:
+                return None
+            return _LabelState(count=state.count + 1, space=True)
+        if char == " " and state.space:
+            return state._replace(space=False)
+        return None
+
+    def accepts(self, state: _LabelState) -> bool:
+        """Return whether the output may end in this state."""
+        if state.quote:
+            return state.text == '""'
+        return state.text in self.labels or state == self.initial()
+
+
+class ChoiceGrammar(Grammar):
+    """Automaton accepting exactly one of a few fixed answers (e.g., yes/no)."""
+
+    def __init__(self, choices: tuple[str, ...]) -> None:
+        """Build the automaton.
+
+        Args:
+            choices: Allowed answers.
+        """
+        self.choices = frozenset(choices)
+        self._prefixes = frozenset(
+            choice[:i] for choice in self.choices for i in range(1, len(choice) + 1)
+        )
+
+    def initial(self) -> str:
+        """Return the state before any output."""
+        return ""
+
+    def advance(self, state: str, char: str) -> str | None:
+        """Consume one character (see Grammar.advance)."""
+        text = state + char
+        return text if text in self._prefixes else None
+
+    def accepts(self, state: str) -> bool:
+        """Return whether the output may end in this state."""
+        return state in self.choices
+
+
+class TokenVocabulary:
+    """Decoded token strings indexed for grammar-constrained decoding.
+
+    Assumes each token decodes to the same text regardless of its neighbors,
+    which holds for byte-level BPE tokenizers such as Qwen2's (InternVL3).
+    """
+
+    def __init__(
+        self,
+        texts: list[str],
+        eos_token_id: int,
+        excluded_ids: set[int] | None = None,
+        max_masks: int = 1024,
+    ) -> None:
+        """Index token strings.
+
+        Args:
+            texts: Decoded text of each token id.
+            eos_token_id: End-of-sequence token id, allowed once output is
+                complete.
+            excluded_ids: Token ids never allowed (special or added tokens).
+            max_masks: Number of per-state allowed-token sets to memoize.
+        """
+        excluded_ids = excluded_ids or set()
+        self.eos_token_id = eos_token_id
+        self.texts = {
+            i: text
+            for i, text in enumerate(texts)
+            if text and "�" not in text and i not in excluded_ids
+        }
+
+        ordered = sorted((text, i) for i, text in self.texts.items())
+        self._sorted_texts = [text for text, _ in ordered]
+        self._sorted_ids = [i for _, i in ordered]
+
+        # Tokens that leave a free-text string state unchanged
+        unsafe = set('"\\') | {chr(c) for c in range(0x20)}
+        self._string_safe = torch.tensor(
+            [i for i, text in self.texts.items() if not unsafe.intersection(text)],
+            dtype=torch.long,
+        )
+        self._string_unsafe = [
+            (text, i) for i, text in self.texts.items() if unsafe.intersection(text)
+        ]
+
+        self._masks = LRUCache(max_entries=max_masks, name="grammar_masks")
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer) -> "TokenVocabulary":
+        """Index every token of a Hugging Face tokenizer.
+
+        Args:
+            tokenizer: Hugging Face tokenizer.
+
+        Returns:
+            Token vocabulary excluding special and added tokens.
+        """
+        texts = tokenizer.batch_decode(
+            [[i] for i in range(len(tokenizer))], clean_up_tokenization_spaces=False
+        )
+        excluded = set(tokenizer.all_special_ids)
+        excluded |= set(getattr(tokenizer, "added_tokens_decoder", {}))
+        return cls(texts, tokenizer.eos_token_id, excluded)
+
+    def walk(self, grammar: Grammar, state, text: str):
+        """Advance a grammar state over a string, or None if it is rejected."""
+        for char in text:
+            state = grammar.advance(state, char)
+            if state is None:
+                return None
+        return state
+
+    def allowed(self, grammar: Grammar, state) -> torch.Tensor:
+        """Return the token ids the grammar accepts next.
+
+        Args:
+            grammar: Grammar being decoded.
+            state: Current grammar state.
+
+        Returns:
+            1-D tensor of allowed token ids (memoized per grammar and state).
+        """
+        # Keyed on the grammar itself: a cached entry keeps its grammar alive,
+        # so a new grammar can never pick up another's masks
+        key = (grammar, state)
+        ids = self._masks.get(key)
+        if ids is not None:
+            return ids
+
+        if grammar.in_string(state):
+            matched = [
+                i
+                for text, i in self._string_unsafe
+                if self.walk(grammar, state, text) is not None
+            ]
+            ids = torch.cat(
+                [self._string_safe, torch.tensor(matched, dtype=torch.long)]
+            )
+        else:
+            matched = []
+            self._search(grammar, state, 0, len(self._sorted_texts), 0, matched)
+            ids = torch.tensor(matched, dtype=torch.long)
+
+        if grammar.accepts(state):
+            ids = torch.cat([ids, torch.tensor([self.eos_token_id])])
+
+        self._masks.put(key, ids)
+        return ids
+
+    def _search(
+        self, grammar: Grammar, state, lo: int, hi: int, depth: int, out: list
+    ) -> None:
+        """Collect accepted tokens among sorted texts[lo:hi] sharing a prefix."""
+        texts = self._sorted_texts
+        i = lo
+        while i < hi and len(texts[i]) == depth:
+            out.append(self._sorted_ids[i])
+            i += 1
+
+        while i < hi:
+            prefix = texts[i][: depth + 1]
+            j = bisect.bisect_left(texts, prefix[:-1] + chr(ord(prefix[-1]) + 1), i, hi)
+            next_state = grammar.advance(state, prefix[-1])
+            if next_state is not None:
+                self._search(grammar, next_state, i, j, depth + 1, out)
+            i = j
+
+
+class _TokenTracker(ABC):
+    """Per-row state over generated tokens that follows the sequences it sees.
+
+    Hooks usually see one new token per call, but assisted generation calls
+    them on draft candidates (which may be rejected) and on several new tokens
+    at once. The state after every generated token is kept, so each call
+    rewinds to the longest prefix it shares with the previous call and
+    advances through the rest.
+    """
+
+    def __init__(self, initial: list, prompt_length: int | None = None) -> None:
+        """Initialize per-row histories.
+
+        Args:
+            initial: State of each batch row before any output.
+            prompt_length: Length of the prompt in the sequences passed to
+                the hook (defaults to the length seen on the first call).
+        """
+        self.prompt_length = prompt_length
+        self._tokens: list[list[int]] = [[] for _ in initial]
+        self._history: list[list] = [[state] for state in initial]
+
+    @property
+    def states(self) -> list:
+        """Current state of each row."""
+        return [history[-1] for history in self._history]
+
+    def _sync(self, input_ids: torch.LongTensor) -> None:
+        """Bring every row's state up to date with the given sequences."""
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+
+        for row, generated in enumerate(input_ids[:, self.prompt_length :].tolist()):
+            tokens, history = self._tokens[row], self._history[row]
+            common = len(tokens)
+            if generated[:common] != tokens:
+                common = 0
+                while common < len(generated) and tokens[common] == generated[common]:
+                    common += 1
+            del tokens[common:]
+            del history[common + 1 :]
+
+            for token_id in generated[common:]:
+                tokens.append(token_id)
+                history.append(self._step(row, history[-1], token_id))
+
+    def _set_state(self, row: int, state) -> None:
+        """Replace a row's current state."""
+        self._history[row][-1] = state
+
+    @abstractmethod
+    def _step(self, row: int, state, token_id: int):
+        """Return a row's state after one more generated token."""
+
+
+class GrammarConstraint(_TokenTracker, LogitsProcessor):
+    """Mask logits so each row's output stays within its grammar.
+
+    Rows without a grammar are left unconstrained. If a row ever reaches a
+    state with no allowed tokens (or emits an unindexed token), it falls back
+    to unconstrained decoding rather than stalling.
+    """
+
+    def __init__(
+        self,
+        grammars: list[Grammar | None],
+        vocabulary: TokenVocabulary,
+        metrics: RunMetrics | None = None,
+        pad_token_id: int | None = None,
+        prompt_length: int | None = None,
+    ) -> None:
+        """Initialize per-row grammar states.
+
+        Args:
+            grammars: Grammar for each batch row (None for unconstrained).
+            vocabulary: Indexed token strings.
+            metrics: Optional metrics store for fallback counts.
+            pad_token_id: Token fed to rows that have already finished.
+            prompt_length: Length of the prompt in the scored sequences
+                (defaults to the length seen on the first call).
+        """
+        super().__init__(
+            [g.initial() if g is not None else None for g in grammars], prompt_length
+        )
+        self.grammars = list(grammars)
+        self.vocabulary = vocabulary
+        self.metrics = metrics
+        self.finished_ids = {vocabulary.eos_token_id, pad_token_id} - {None}
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        """Advance each row past its new tokens and mask disallowed tokens."""
+        self._sync(input_ids)
+
+        mask = torch.zeros_like(scores)
+        for row, state in enumerate(self.states):
+            if state is None:
+                continue
+            ids = self.vocabulary.allowed(self.grammars[row], state)
+            # A draft model may score a smaller (unpadded) vocabulary
+            ids = ids[ids < scores.shape[-1]]
+            if len(ids) == 0:
+                self._fallback(row)
+                continue
+            mask[row] = float("-inf")
+            mask[row, ids.to(scores.device)] = 0
+        return scores + mask
+
+    def _step(self, row: int, state, token_id: int):
+        """Move a row's grammar state past one generated token."""
+        if state is None or token_id in self.finished_ids:
+            return None
+
+        text = self.vocabulary.texts.get(token_id)
+        state = (
+            None
+            if text is None
+            else self.vocabulary.walk(self.grammars[row], state, text)
+        )
+        if state is None:
+            self._count_fallback()
+        return state
+
+    def _fallback(self, row: int) -> None:
+        """Stop constraining a row that left its grammar."""
+        self._set_state(row, None)
+        self._count_fallback()
+
+    def _count_fallback(self) -> None:
+        """Record a row released from its grammar."""
+        if self.metrics is not None:
+            self.metrics.increment("decoding.grammar_fallbacks")
+
+
+@dataclass(frozen=True)
+class GenerationOptions:
+    """Per-request decoding options.
+
+    Attributes:
+        stage: Pipeline stage name used to label metrics.
+        grammar: Grammar the response is constrained to.
+        stop: Structural stop kind (one of STOP_KINDS).
+        targets: Number of detected targets the response should cover, used
+            to size the token budget.
+    """
+
+    stage: str | None = None
+    grammar: Grammar | None = None
+    stop: str | None = None
+    targets: int | None = None
+
+
+class _StopState:
+    """Running structure of one row's output for StructuralStop."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.content = False
+        self.generated = 0
+        self.done = False
+
+
+class StructuralStop(_TokenTracker, StoppingCriteria):
+    """Stop each row once its output is structurally complete.
+
+    `json` rows stop when a top-level JSON object closes (braces inside
+    strings are ignored). `list` rows stop at the first newline after any
+    content. Rows without a stop kind only end at EOS or the token budget.
+    """
+
+    def __init__(
+        self,
+        kinds: list[str | None],
+        texts: dict[int, str],
+        prompt_length: int = 0,
+    ) -> None:
+        """Initialize per-row state.
+
+        Args:
+            kinds: Stop kind for each batch row (None for no structural stop).
+            texts: Decoded text of each token id.
+            prompt_length: Length of the prompt in the checked sequences.
+        """
+        super().__init__([_StopState() for _ in kinds], prompt_length)
+        self.kinds = list(kinds)
+        self.texts = texts
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs
+    ) -> torch.BoolTensor:
+        """Consume each row's new tokens and report rows that are complete."""
+        self._sync(input_ids)
+        return torch.tensor(
+            [state.done for state in self.states], device=input_ids.device
+        )
+
+    @property
+    def stopped(self) -> dict[int, int]:
+        """Rows stopped early, mapped to their number of generated tokens."""
+        return {
+            row: state.generated for row, state in enumerate(self.states) if state.done
+        }
+
+    def _step(self, row: int, state: _StopState, token_id: int) -> _StopState:
+        """Return a row's structure after one more generated token."""
+        if state.done:
+            return state
+
+        state = copy.copy(state)
+        state.generated += 1
+        text = self.texts.get(token_id, "")
+        if self.kinds[row] == "json":
+            state.done = self._close_json(state, text)
+        elif self.kinds[row] == "list":
+            state.done = self._close_list(state, text)
+        return state
+
+    @staticmethod
+    def _close_json(state: _StopState, text: str) -> bool:
+        """Track brace depth and return whether the top-level object closed."""
+        for char in text:
+            if state.in_string:
+                if state.escape:
+                    state.escape = False
+                elif char == "\\":
+                    state.escape = True
+                elif char == '"':
+                    state.in_string = False
+            elif char == '"' and state.started:
+                state.in_string = True
+            elif char == "{":
+                state.started = True
+                state.depth += 1
+            elif char == "}" and state.started:
+                state.depth -= 1
+                if state.depth == 0:
+                    return True
+        return False
+
+    @staticmethod
+    def _close_list(state: _StopState, text: str) -> bool:
+        """Return whether a newline follows list content."""
+        for char in text:
+            if char == "\n" and state.content:
+                return True
+            if not char.isspace():
+                state.content = True
+        return False
+
+
+class TokenLimit(StoppingCriteria):
+    """Stop each row after its own number of new tokens.
+
+    `generate` only takes one `max_new_tokens` for the whole batch, so it is
+    set to the largest row limit and this criterion ends shorter rows.
+    """
+
+    def __init__(self, limits: list[int], prompt_length: int) -> None:
+        """Initialize the criterion.
+
+        Args:
+            limits: Maximum number of new tokens for each batch row.
+            prompt_length: Length of the prompt in the checked sequences.
+        """
+        self.limits = torch.tensor(limits)
+        self.prompt_length = prompt_length
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs
+    ) -> torch.BoolTensor:
+        """Report rows whose sequences have reached their limit."""
+        generated = input_ids.shape[1] - self.prompt_length
+        return (self.limits <= generated).to(input_ids.device)
+
+
+class TokenBudget:
+    """Per-request `max_new_tokens` limits learned from recent output lengths.
+
+    Requests that know how many targets they cover get a limit proportional
+    to `targets + 1` (the extra unit covers the JSON wrapper and the
+    `no_targets` answer). The per-target cost starts at a configured prior
+    and, once enough reports have finished, becomes a high quantile of the
+    observed tokens per target. Other requests get a high quantile of their
+    stage's recent output lengths, or the ceiling until enough have been
+    seen. Learned values are scaled by a safety margin, and limits are
+    clamped to `[min_tokens, ceiling]`.
+
+    Truncated outputs are recorded at their limit, so a stage that keeps
+    running out of budget raises its own quantile and the next limit grows
+    by the margin.
+    """
+
+    def __init__(
+        self,
+        ceiling: int,
+        window: int = 256,
+        min_samples: int = 16,
+        quantile: float = 0.95,
+        margin: float = 1.25,
+        min_tokens: int = 32,
+        per_target_tokens: int = 96,
+        metrics: RunMetrics | None = None,
+    ) -> None:
+        """Initialize empty length histories.
+
+        Args:
+            ceiling: Largest limit ever given (the static `max_new_tokens`).
+            window: Number of recent outputs kept per history.
+            min_samples: Outputs needed before a history is trusted.
+            quantile: Quantile of the history a limit is based on.
+            margin: Factor applied to the quantile.
+            min_tokens: Smallest limit ever given.
+            per_target_tokens: Prior tokens per target.
+            metrics: Optional metrics store for limits and truncations.
+        """
+        self.ceiling = ceiling
+        self.window = window
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self.margin = margin
+        self.min_tokens = min_tokens
+        self.per_target_tokens = per_target_tokens
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._history: dict[tuple[str, bool], deque[float]] = {}
+
+    def limit(self, options: GenerationOptions | None) -> int:
+        """Return the token limit for a request.
+
+        Args:
+            options: Decoding options of the request.
+
+        Returns:
+            Maximum number of new tokens.
+        """
+        stage, targets = self._key(options)
+        learned = self._learned(stage, targets is not None)
+
+        if targets is not None:
+            cost = self.per_target_tokens if learned is None else learned
+            tokens = cost * (targets + 1)
+        elif learned is not None:
+            tokens = learned
+        else:
+            return self.ceiling
+
+        return max(self.min_tokens, min(self.ceiling, math.ceil(tokens)))
+
+    def record(
+        self, options: GenerationOptions | None, generated: int, limit: int
+    ) -> None:
+        """Add a finished output to its stage history.
+
+        Args:
+            options: Decoding options of the request.
+            generated: Number of new tokens generated.
+            limit: Limit the request ran with.
+        """
+        stage, targets = self._key(options)
+        truncated = generated >= limit
+        sample = generated if targets is None else generated / (targets + 1)
+
+        with self._lock:
+            history = self._history.setdefault(
+                (stage, targets is not None), deque(maxlen=self.window)
+            )
+            history.append(sample)
+
+        if self.metrics is not None:
+            self.metrics.observe(f"decoding.token_limit.{stage}", limit)
+            if truncated:
+                self.metrics.increment(f"decoding.budget_exhausted.{stage}")
+
+    def _learned(self, stage: str, per_target: bool) -> float | None:
+        """Return the margin-scaled quantile of a history, if it is trusted."""
+        with self._lock:
+            history = sorted(self._history.get((stage, per_target), ()))
+        if len(history) < self.min_samples:
+            return None
+
+        index = min(len(history) - 1, round(self.quantile * (len(history) - 1)))
+        return history[index] * self.margin
+
+    @staticmethod
+    def _key(options: GenerationOptions | None) -> tuple[str, int | None]:
+        """Return the stage name and target count of a request."""
+        if options is None:
+            return "default", None
+        return options.stage or "default", options.targets
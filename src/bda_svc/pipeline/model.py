@@ -1,18 +1,59 @@
 """Object Detection and Vision-Language Model BDA pipeline."""
 
+import asyncio
+import copy
+import dataclasses
+import functools
+import hashlib
+import json
+import threading
+import time
 import warnings
+import weakref
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 import torch
 import transformers
 from huggingface_hub import snapshot_download
 from PIL import Image
-from transformers import BitsAndBytesConfig, pipeline
+from transformers import (
+    BitsAndBytesConfig,
+    DynamicCache,
+    LogitsProcessorList,
+    StoppingCriteriaList,
+    pipeline,
+)
 
+from bda_svc.metrics import RunMetrics
+from bda_svc.pipeline.cache import LRUCache, ResultCache, image_digest
+from bda_svc.pipeline.decoding import (
+    ChoiceGrammar,
+    ClassifyGrammar,
+    FirstTokenTimer,
+    ForwardCounter,
+    GenerationOptions,
+    GrammarConstraint,
+    ReportGrammar,
+    StructuralStop,
+    TokenBudget,
+    TokenLimit,
+    TokenVocabulary,
+)
+from bda_svc.pipeline.scheduler import MicroBatchScheduler
 from bda_svc.pipeline.utilities import (
     CONFIG_PATH,
     DOCTRINE_PATH,
+    doctrine_labels,
+    format_doctrine_index,
     format_pda_doctrine,
     load_yaml,
 )
@@ -24,6 +65,167 @@ warnings.filterwarnings(
     category=UserWarning,
 )
 
+# Prompt-template placeholder marking where the image goes in the user turn
+IMAGE_PLACEHOLDER = "{image}"
+
+# Pipeline modes: separate classify and report generations, one fused pass, or
+# the report as a second turn continuing the classify conversation
+PIPELINE_MODES = ("two-stage", "fused", "continuation")
+
+# Handling of images where classification finds nothing: run the report
+# anyway, answer no_targets directly, or first confirm with a yes/no check
+EMPTY_SCENE_MODES = ("report", "skip", "verify")
+
+# Canonical report for an image with no visible targets
+NO_TARGETS_RESPONSE = '{"no_targets": {"logic": "no visible targets in image"}}'
+
+# Image.info entry carrying a decoded image's result cache key
+RESULT_KEY_INFO = "bda_result_key"
+
+# Default on-disk result cache location
+DEFAULT_RESULT_CACHE = "~/.cache/bda-svc/results"
+
+# Detected category sets whose doctrine text and report options are memoized
+CATEGORY_SET_ENTRIES = 256
+
+
+class AnalysisCancelled(Exception):
+    """An analysis stopped because its async caller was cancelled or timed out."""
+
+
+def open_image(
+    source: str | Path | BinaryIO | Image.Image, max_pixels: int | None = None
+) -> Image.Image:
+    """Load an image as RGB, downscaling it to a pixel budget.
+
+    JPEG files are decoded in draft mode, letting the decoder downscale by
+    up to 8x in the DCT domain, and images are resized before the RGB
+    conversion, so a large frame is never held at full resolution in RGB.
+
+    Args:
+        source: Image file path, a binary stream of encoded image bytes, or an
+            already decoded image.
+        max_pixels: Optional pixel budget; larger images are downscaled to fit
+            it, keeping their aspect ratio.
+
+    Returns:
+        Decoded RGB image.
+    """
+    if isinstance(source, Image.Image):
+        return _fit_rgb(source, max_pixels)
+    if isinstance(source, str | Path):
+        source = Path(source)
+    with Image.open(source) as image:
+        target = _fit_size(image.size, max_pixels)
+        if target is not None and image.format == "JPEG":
+            image.draft("RGB", target)
+        image = _fit_rgb(image, max_pixels)
+        # Read pixels before the file closes (RGB images are not copied)
+        image.load()
+        return image
+
+
+def _fit_size(size: tuple[int, int], max_pixels: int | None) -> tuple[int, int] | None:
+    """Return the largest size within a pixel budget, or None if it already fits."""
+    width, height = size
+    if not max_pixels or width * height <= max_pixels:
+        return None
+    scale = (max_pixels / (width * height)) ** 0.5
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _fit_rgb(image: Image.Image, max_pixels: int | None) -> Image.Image:
+    """Resize an image to a pixel budget (if needed), then convert it to RGB."""
+    target = _fit_size(image.size, max_pixels)
+    if target is not None:
+        # Palette and bilevel images only resize with nearest-neighbor sampling
+        if image.mode in ("1", "P"):
+            image = image.convert("RGB")
+        image = image.resize(target, Image.Resampling.BICUBIC, reducing_gap=2.0)
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def pixel_budget(image_processor, margin: float = 1.0) -> int | None:
+    """Return the most pixels an image processor can use from one image.
+
+    InternVL-style processors resize each image onto a grid of at most
+    `max_patches` square tiles, so detail beyond that many tiles' worth of
+    pixels is discarded.
+
+    Args:
+        image_processor: Hugging Face image processor.
+        margin: Linear oversampling factor kept above the tile budget, so the
+            processor still downscales (rather than upscales) to its grid.
+
+    Returns:
+        Pixel budget, or None if the processor does not describe its tiling.
+    """
+    size = getattr(image_processor, "size", None)
+    max_patches = getattr(image_processor, "max_patches", None)
+    try:
+        tile = int(size["height"]) * int(size["width"])
+    except (KeyError, TypeError):
+        return None
+    if not max_patches:
+        return None
+    return int(max_patches * tile * margin**2)
+
+
+def config_fingerprint(config: dict, doctrine: dict) -> str:
+    """Return a digest of the configuration that determines analysis results.
+
+    Covers the model id, generation and quantization settings, prompts,
+    pipeline, decoding and decode settings, and the doctrine. Settings that
+    only affect speed (batching, caches, scheduler) are left out.
+
+    Args:
+        config: Pipeline configuration.
+        doctrine: Doctrinal definitions.
+
+    Returns:
+        Hex digest of the result-relevant configuration.
+    """
+    vlm_cfg = config.get("vlm", {})
+    relevant = {
+        "model-id": vlm_cfg.get("model-id"),
+        "pipeline-kwargs": vlm_cfg.get("pipeline-kwargs"),
+        "quantization-kwargs": vlm_cfg.get("quantization-kwargs"),
+        "prompts": config.get("prompts"),
+        "pipeline": config.get("pipeline"),
+        "decoding": config.get("decoding"),
+        "decode": config.get("decode"),
+        "doctrine": doctrine,
+    }
+    text = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _prefill_with_images(model: torch.nn.Module) -> torch.nn.Module:
+    """Let a VLM used as an assistant model see the image on its prefill.
+
+    Assisted generation prefills the assistant without flagging the first
+    iteration, which VLMs rely on to forward `pixel_values`, so a draft model
+    would otherwise decode blind to the image. The first iteration is
+    recognized by a cache position starting at zero instead.
+
+    Args:
+        model: Draft VLM.
+
+    Returns:
+        The same model, with input preparation wrapped.
+    """
+    prepare = model.prepare_inputs_for_generation
+
+    @functools.wraps(prepare)
+    def prepare_inputs_for_generation(input_ids, **kwargs):
+        cache_position = kwargs.get("cache_position")
+        if cache_position is not None and int(cache_position[0]) == 0:
+            kwargs["is_first_iteration"] = True
+        return prepare(input_ids, **kwargs)
+
+    model.prepare_inputs_for_generation = prepare_inputs_for_generation
+    return model
+
 
 @dataclass(frozen=True)
 class Detection:
@@ -43,6 +245,70 @@ class DetectorRunner:
         return []
 
 
+@dataclass(frozen=True)
+class VisionEncoding:
+    """Vision-tower output for one image, ready to splice into a prompt."""
+
+    num_patches: int
+    features: torch.Tensor
+
+
+@dataclass(frozen=True)
+class PrefixEntry:
+    """Prefilled KV cache for a constant prompt prefix."""
+
+    token_ids: list[int]
+    kv: DynamicCache
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the cached keys and values in bytes."""
+        return sum(
+            layer.keys.nbytes + layer.values.nbytes
+            for layer in self.kv.layers
+            if layer.is_initialized
+        )
+
+    def clone(self, batch_size: int = 1) -> DynamicCache:
+        """Return a private copy of the cache, repeated across the batch.
+
+        Args:
+            batch_size: Number of requests that will extend the prefix.
+
+        Returns:
+            Cache that generation may extend without touching this entry.
+        """
+        kv = copy.deepcopy(self.kv)
+        if batch_size > 1:
+            kv.batch_repeat_interleave(batch_size)
+        return kv
+
+
+@dataclass(frozen=True)
+class Conversation:
+    """Resumable chat state: the messages so far and the KV cache behind them.
+
+    Returned by `VLMRunner.start_conversation` and `continue_conversation`.
+    A handle is never modified, so it can be continued more than once.
+    """
+
+    messages: list[dict]
+    text: str
+    token_ids: torch.Tensor
+    attention_mask: torch.Tensor
+    prompt_length: int
+    kv: DynamicCache
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the cached keys and values in bytes."""
+        return sum(
+            layer.keys.nbytes + layer.values.nbytes
+            for layer in self.kv.layers
+            if layer.is_initialized
+        )
+
+
 class VLMRunner:
     """Wrapper around a Hugging Face VLM."""
 
@@ -51,6 +317,12 @@ class VLMRunner:
         model_id: str,
         pipeline_kwargs: dict | None = None,
         quantization_kwargs: dict | None = None,
+        batch_size: int = 1,
+        vision_cache_kwargs: dict | None = None,
+        prefix_cache_kwargs: dict | None = None,
+        metrics: RunMetrics | None = None,
+        token_budget: TokenBudget | None = None,
+        draft_model_id: str | None = None,
     ) -> None:
         """Initialize the VLM runner.
 
@@ -58,29 +330,120 @@ class VLMRunner:
             model_id: Hugging Face model identifier.
             pipeline_kwargs: VLM pipeline parameters.
             quantization_kwargs: VLM quantization parameters.
+            batch_size: Number of requests per padded batch in generate_batch.
+            vision_cache_kwargs: Vision-embedding cache parameters.
+            prefix_cache_kwargs: Prompt-prefix KV cache parameters.
+            metrics: Optional metrics store.
+            token_budget: Optional policy for per-request `max_new_tokens`
+                limits (the static limit applies to every request if None).
+            draft_model_id: Optional Hugging Face identifier of a smaller
+                model sharing the tokenizer, used to draft tokens for
+                assisted (speculative) decoding.
 
         Notes:
             Loads model artifacts from the `models/` directory.
             If local artifacts are missing or incomplete, downloads the
             snapshot into `models/` and retries local loading.
+
+            Assisted generation only supports one sequence at a time and
+            needs raw pixel inputs for the draft model, so with a draft model
+            requests run unbatched and without the vision/prefix caches.
+            Continuation turns decode without the draft model.
         """
         # Configuration blocks
         self.pipeline_kwargs = pipeline_kwargs or {}
         self.quantization_kwargs = quantization_kwargs or {}
+        self.vision_cache_kwargs = vision_cache_kwargs or {}
+        self.prefix_cache_kwargs = prefix_cache_kwargs or {}
+        self.batch_size = max(1, int(batch_size))
+        self.metrics = metrics or RunMetrics()
+        self.token_budget = token_budget
 
         # Load model, download if missing
+        self.pipeline = self._load_pipeline(
+            model_id, self.pipeline_kwargs, self.quantization_kwargs
+        )
+        self.pipeline.model.eval()
+        self.model = self.pipeline.model
+        self.processor = self.pipeline.processor
+
+        # Optional draft model for assisted generation (unquantized; it is small)
+        self.draft_model = None
+        self.draft_kwargs = {}
+        if draft_model_id:
+            draft = self._load_pipeline(draft_model_id, self.pipeline_kwargs, {})
+            draft.model.eval()
+            self.draft_model = _prefill_with_images(draft.model)
+            self.draft_kwargs = {"assistant_model": self.draft_model}
+            # Differently padded vocabularies need token translation
+            if (
+                self.model.config.get_text_config().vocab_size
+                != self.draft_model.config.get_text_config().vocab_size
+            ):
+                self.draft_kwargs["tokenizer"] = self.processor.tokenizer
+                self.draft_kwargs["assistant_tokenizer"] = draft.processor.tokenizer
+            self.batch_size = 1
+
+        # Decoder-only batching requires left padding
+        self.processor.tokenizer.padding_side = "left"
+        self.generate_kwargs = {
+            "max_new_tokens": self.pipeline_kwargs.get("max_new_tokens"),
+            "pad_token_id": self.processor.tokenizer.pad_token_id,
+        }
+        self._vocabulary: TokenVocabulary | None = None
+
+        # Vision-embedding and prefix caches (require InternVL-style image tokens,
+        # and raw inputs that a draft model can share)
+        placeholder_attrs = ("image_token", "start_image_token", "end_image_token")
+        supports_caching = self.draft_model is None and all(
+            hasattr(self.processor, a) for a in placeholder_attrs
+        )
+
+        self.vision_cache = None
+        if supports_caching and self.vision_cache_kwargs.get("enabled", False):
+            self.vision_cache = LRUCache(
+                max_entries=self.vision_cache_kwargs.get("max-entries", 16),
+                metrics=self.metrics,
+                name="vision_cache",
+            )
+
+        self.prefix_cache = None
+        if supports_caching and self.prefix_cache_kwargs.get("enabled", False):
+            max_mb = self.prefix_cache_kwargs.get("max-mb")
+            self.prefix_cache = LRUCache(
+                max_entries=self.prefix_cache_kwargs.get("max-entries", 8),
+                max_bytes=int(max_mb * 2**20) if max_mb is not None else None,
+                sizeof=lambda entry: entry.nbytes,
+                metrics=self.metrics,
+                name="prefix_cache",
+            )
+
+    @staticmethod
+    def _load_pipeline(
+        model_id: str, pipeline_kwargs: dict, quantization_kwargs: dict
+    ) -> transformers.Pipeline:
+        """Load an image-text-to-text pipeline from `models/`, downloading if needed.
+
+        Args:
+            model_id: Hugging Face model identifier.
+            pipeline_kwargs: VLM pipeline parameters.
+            quantization_kwargs: VLM quantization parameters.
+
+        Returns:
+            Loaded pipeline.
+        """
         repo_root = Path(__file__).resolve().parents[3]
         local_model_dir = repo_root / "models" / model_id.replace("/", "--")
         local_model_dir.mkdir(parents=True, exist_ok=True)
 
-        def _load_local() -> None:
+        def _load_local() -> transformers.Pipeline:
             model_kwargs = {}
             if quantization_kwargs.get("enabled", False):
                 model_kwargs["quantization_config"] = BitsAndBytesConfig(
                     load_in_8bit=bool(quantization_kwargs.get("load_in_8bit", False)),
                     load_in_4bit=bool(quantization_kwargs.get("load_in_4bit", False)),
                 )
-            self.pipeline = pipeline(
+            return pipeline(
                 task="image-text-to-text",
                 model=local_model_dir,
                 local_files_only=True,
@@ -90,18 +453,20 @@ class VLMRunner:
 
         try:
             # Load from local models directory
-            _load_local()
+            return _load_local()
         except (OSError, ValueError):
             # Download to local models directory, then load from there
             snapshot_download(model_id, local_dir=local_model_dir)
-            _load_local()
+            return _load_local()
 
-        self.pipeline.model.eval()
+    @staticmethod
+    def build_messages(
+        image: Image.Image, prompt: str, system_prompt: str | None
+    ) -> list[dict]:
+        """Build a chat-style prompt.
 
-    def generate(
-        self, image: Image.Image, prompt: str, system_prompt: str | None
-    ) -> str:
-        """Generate a response from the VLM.
+        The image goes before the prompt text unless the prompt contains an
+        `{image}` placeholder, in which case the image is placed there.
 
         Args:
             image: PIL image to analyze.
@@ -109,29 +474,684 @@ class VLMRunner:
             system_prompt: Optional system prompt.
 
         Returns:
-            Model response text.
+            Chat messages in the Hugging Face chat template format.
         """
-        # Build a chat-style prompt
         messages = []
         if system_prompt:
             messages.append(
                 {"role": "system", "content": [{"type": "text", "text": system_prompt}]}
             )
-        messages.append(
+
+        before, placeholder, after = prompt.partition(IMAGE_PLACEHOLDER)
+        if not placeholder:
+            before, after = "", prompt
+
+        content = [{"type": "image", "image": image}]
+        if before:
+            content.insert(0, {"type": "text", "text": before})
+        if after:
+            content.append({"type": "text", "text": after})
+
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    @property
+    def vocabulary(self) -> TokenVocabulary:
+        """Token strings indexed for constrained decoding (built on first use)."""
+        if self._vocabulary is None:
+            self._vocabulary = TokenVocabulary.from_tokenizer(self.processor.tokenizer)
+        return self._vocabulary
+
+    def generate(
+        self,
+        image: Image.Image,
+        prompt: str,
+        system_prompt: str | None,
+        options: GenerationOptions | None = None,
+    ) -> str:
+        """Generate a response from the VLM.
+
+        Args:
+            image: PIL image to analyze.
+            prompt: User prompt text.
+            system_prompt: Optional system prompt.
+            options: Optional per-request decoding options.
+
+        Returns:
+            Model response text.
+        """
+        return self.generate_batch([(image, prompt, system_prompt, options)])[0]
+
+    def generate_batch(self, items: list[tuple]) -> list[str]:
+        """Generate responses for many requests using padded batches.
+
+        Requests that share a prompt prefix (all text before the image) are
+        batched together so that each batch can reuse one prefix KV cache.
+
+        Args:
+            items: (image, prompt, system_prompt) tuples, optionally followed
+                by per-request GenerationOptions.
+
+        Returns:
+            Model response text for each item, in input order.
+        """
+        return [response for response, _ in self._generate_grouped(items)]
+
+    def start_conversation(
+        self, image: Image.Image, prompt: str, system_prompt: str | None
+    ) -> tuple[str, Conversation]:
+        """Generate a response and keep the conversation for later turns.
+
+        Args:
+            image: PIL image to analyze.
+            prompt: User prompt text.
+            system_prompt: Optional system prompt.
+
+        Returns:
+            Model response text and a resumable conversation handle.
+        """
+        return self.start_conversations([(image, prompt, system_prompt)])[0]
+
+    def start_conversations(self, items: list[tuple]) -> list[tuple[str, Conversation]]:
+        """Batched `start_conversation`, padded and prefix-cached like generate_batch.
+
+        Args:
+            items: (image, prompt, system_prompt) tuples, optionally followed
+                by per-request GenerationOptions.
+
+        Returns:
+            Model response text and conversation handle for each item, in
+            input order.
+        """
+        return self._generate_grouped(items, keep_state=True)
+
+    def continue_conversation(
+        self,
+        conversation: Conversation,
+        prompt: str,
+        options: GenerationOptions | None = None,
+    ) -> tuple[str, Conversation]:
+        """Add a user turn to a conversation and decode from its KV cache.
+
+        Only the tokens after the cached state are prefilled: the end of the
+        previous answer, the new user turn, and the generation prompt. The
+        image is already part of the conversation, so an `{image}` placeholder
+        in the prompt is dropped.
+
+        Args:
+            conversation: Handle from a previous turn.
+            prompt: User prompt text for the new turn.
+            options: Optional per-request decoding options.
+
+        Returns:
+            Model response text and a handle for the extended conversation.
+
+        Raises:
+            ValueError: If the chat template renders the conversation so that
+                the new turn does not extend the previous one.
+        """
+        timer = FirstTokenTimer()
+        tokenizer = self.processor.tokenizer
+
+        messages = conversation.messages + [
             {
                 "role": "user",
                 "content": [
-                    {"type": "image", "image": image},
-                    {"type": "text", "text": prompt},
+                    {"type": "text", "text": prompt.replace(IMAGE_PLACEHOLDER, "")}
                 ],
             }
+        ]
+        text = self.processor.apply_chat_template(
+            messages, add_generation_prompt=True, tokenize=False
+        )
+        if not text.startswith(conversation.text):
+            raise ValueError("Chat template does not extend the previous turn.")
+
+        device = conversation.token_ids.device
+        suffix_ids = tokenizer(
+            text[len(conversation.text) :],
+            add_special_tokens=False,
+            return_tensors="pt",
+        )["input_ids"][0].to(device)
+        input_ids = torch.cat(
+            [conversation.token_ids[: conversation.prompt_length], suffix_ids]
+        )
+
+        # Reuse the cache up to the first token that differs from the last turn
+        kv_length = conversation.kv.get_seq_length()
+        span = min(len(input_ids), kv_length)
+        mismatch = (input_ids[:span] != conversation.token_ids[:span]).nonzero()
+        reused = int(mismatch[0]) if len(mismatch) else span
+        reused = min(reused, len(input_ids) - 1)
+
+        kv = copy.deepcopy(conversation.kv)
+        kv.crop(reused)
+        attention_mask = torch.cat(
+            [
+                conversation.attention_mask[:reused],
+                torch.ones(
+                    len(input_ids) - reused,
+                    dtype=conversation.attention_mask.dtype,
+                    device=device,
+                ),
+            ]
+        )
+
+        generate_kwargs, stop, limits = self._generation_hooks(
+            timer, [options], len(input_ids)
+        )
+        started = time.perf_counter()
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                input_ids=input_ids.unsqueeze(0),
+                attention_mask=attention_mask.unsqueeze(0),
+                past_key_values=kv,
+                **generate_kwargs,
+                return_dict_in_generate=True,
+            )
+        self._record_generation(
+            outputs.sequences[:, len(input_ids) :],
+            stop,
+            [options],
+            limits,
+            time.perf_counter() - started,
+        )
+
+        if timer.ttft_ms is not None:
+            self.metrics.observe("vlm.ttft_ms.continuation", timer.ttft_ms)
+        self.metrics.increment("conversation.tokens_reused", reused)
+        self.metrics.increment("conversation.tokens_prefilled", len(input_ids) - reused)
+
+        sequence = outputs.sequences[0]
+        response = self.processor.decode(
+            sequence[len(input_ids) :], skip_special_tokens=True
+        )
+        return response, Conversation(
+            messages=messages + [self._assistant_message(response)],
+            text=text,
+            token_ids=sequence,
+            attention_mask=torch.cat(
+                [
+                    attention_mask,
+                    attention_mask.new_ones(len(sequence) - len(input_ids)),
+                ]
+            ),
+            prompt_length=len(input_ids),
+            kv=outputs.past_key_values,
+        )
+
+    @staticmethod
+    def _assistant_message(response: str) -> dict:
+        """Wrap a model response as an assistant chat message."""
+        return {"role": "assistant", "content": [{"type": "text", "text": response}]}
+
+    def _generation_hooks(
+        self,
+        timer: FirstTokenTimer,
+        options: list[GenerationOptions | None],
+        prompt_length: int,
+    ) -> tuple[dict, StructuralStop | None, list[int | None]]:
+        """Build `generate` keyword arguments for a batch.
+
+        Args:
+            timer: Time-to-first-token timer for the batch.
+            options: Decoding options for each row.
+            prompt_length: Padded prompt length of the batch.
+
+        Returns:
+            `generate` keyword arguments (limits, logits processors, and
+            stopping criteria), the structural stop criterion (None if no row
+            has a stop kind), and the token limit of each row.
+        """
+        options = [opts or GenerationOptions() for opts in options]
+        generate_kwargs = dict(self.generate_kwargs)
+
+        processors = LogitsProcessorList([timer])
+        grammars = [opts.grammar for opts in options]
+        if any(grammar is not None for grammar in grammars):
+            processors.append(
+                GrammarConstraint(
+                    grammars,
+                    self.vocabulary,
+                    metrics=self.metrics,
+                    pad_token_id=self.generate_kwargs["pad_token_id"],
+                    prompt_length=prompt_length,
+                )
+            )
+            self.metrics.increment(
+                "decoding.constrained_requests",
+                sum(grammar is not None for grammar in grammars),
+            )
+
+        criteria = StoppingCriteriaList()
+        stop = None
+        if any(opts.stop is not None for opts in options):
+            stop = StructuralStop(
+                [opts.stop for opts in options], self.vocabulary.texts, prompt_length
+            )
+            criteria.append(stop)
+
+        limits = [generate_kwargs.get("max_new_tokens")] * len(options)
+        if self.token_budget is not None:
+            limits = [self.token_budget.limit(opts) for opts in options]
+            generate_kwargs["max_new_tokens"] = max(limits)
+            if min(limits) < max(limits):
+                criteria.append(TokenLimit(limits, prompt_length))
+
+        generate_kwargs["logits_processor"] = processors
+        generate_kwargs["stopping_criteria"] = criteria
+        return generate_kwargs, stop, limits
+
+    def _record_generation(
+        self,
+        new_tokens: torch.Tensor,
+        stop: StructuralStop | None,
+        options: list[GenerationOptions | None],
+        limits: list[int | None],
+        elapsed: float,
+    ) -> list[int]:
+        """Record output lengths, decode speed, early stops, and tokens saved.
+
+        Args:
+            new_tokens: Generated token ids for each row (padded after the
+                row finished).
+            stop: Structural stop criterion used for the batch, if any.
+            options: Decoding options for each row.
+            limits: Token limit of each row.
+            elapsed: Wall-clock seconds spent in `generate`.
+
+        Returns:
+            Number of generated tokens for each row.
+        """
+        pad_token_id = self.generate_kwargs["pad_token_id"]
+        lengths = (
+            (new_tokens != pad_token_id).sum(dim=1).tolist()
+            if pad_token_id is not None
+            else [new_tokens.shape[1]] * len(options)
+        )
+        for opts, generated, limit in zip(options, lengths, limits, strict=True):
+            if elapsed > 0:
+                self.metrics.observe(
+                    f"vlm.tokens_per_s.{self._stage(opts)}", generated / elapsed
+                )
+            if self.token_budget is not None:
+                self.token_budget.record(opts, generated, limit)
+
+        if stop is None:
+            return lengths
+
+        for row, generated in stop.stopped.items():
+            stage = self._stage(options[row])
+            self.metrics.increment(f"decoding.early_stops.{stage}")
+            if limits[row]:
+                saved = max(0, limits[row] - generated)
+                self.metrics.observe(f"decoding.tokens_saved.{stage}", saved)
+                self.metrics.increment("decoding.tokens_saved", saved)
+        return lengths
+
+    def _record_speculation(
+        self,
+        options: GenerationOptions | None,
+        generated: int,
+        verified: int,
+        drafted: int,
+    ) -> None:
+        """Record how many drafted tokens the target model accepted.
+
+        Each verification pass of the target model accepts some drafted tokens
+        and adds one token of its own, so accepted = generated - passes.
+
+        Args:
+            options: Decoding options of the request.
+            generated: Number of generated tokens.
+            verified: Number of target-model forward passes.
+            drafted: Number of draft-model forward passes (drafted tokens).
+        """
+        stage = self._stage(options)
+        accepted = max(0, generated - verified)
+        self.metrics.increment(f"speculative.drafted.{stage}", drafted)
+        self.metrics.increment(f"speculative.accepted.{stage}", accepted)
+        if drafted:
+            self.metrics.observe(
+                f"speculative.acceptance_rate.{stage}", min(1.0, accepted / drafted)
+            )
+
+    @staticmethod
+    def _stage(options: GenerationOptions | None) -> str:
+        """Return the stage name used to label a request's metrics."""
+        return (options and options.stage) or "default"
+
+    def _generate_grouped(
+        self,
+        items: list[tuple],
+        keep_state: bool = False,
+    ) -> list[tuple[str, Conversation | None]]:
+        """Render, group by prompt prefix, and generate in padded batches."""
+        conversations = [self.build_messages(*item[:3]) for item in items]
+        texts = self.processor.apply_chat_template(
+            conversations, add_generation_prompt=True, tokenize=False
         )
 
-        # Return response
+        groups: dict[str, list[int]] = {}
+        for index, text in enumerate(texts):
+            groups.setdefault(self._prefix_text(text), []).append(index)
+
+        results: list[tuple[str, Conversation | None]] = [("", None)] * len(items)
+        for prefix_text, indices in groups.items():
+            for start in range(0, len(indices), self.batch_size):
+                batch = indices[start : start + self.batch_size]
+                outputs = self._generate_padded(
+                    [items[i] for i in batch],
+                    [texts[i] for i in batch],
+                    prefix_text,
+                    keep_state=keep_state,
+                )
+                for index, (response, state) in zip(batch, outputs, strict=True):
+                    if state is not None:
+                        state = Conversation(
+                            messages=conversations[index]
+                            + [self._assistant_message(response)],
+                            text=texts[index],
+                            **state,
+                        )
+                    results[index] = (response, state)
+
+        return results
+
+    def _generate_padded(
+        self,
+        items: list[tuple],
+        texts: list[str],
+        prefix_text: str,
+        keep_state: bool = False,
+    ) -> list[tuple[str, dict | None]]:
+        """Run one padded batch, reusing or recording the prefix KV cache.
+
+        With `keep_state`, each response comes with the fields of its
+        `Conversation` (token ids, attention mask, and a private KV cache).
+        """
+        timer = FirstTokenTimer()
+        options = [item[3] if len(item) > 3 else None for item in items]
+
+        entry = None
+        prefix_ids = None
+        if prefix_text:
+            entry = self.prefix_cache.get(prefix_text)
+            prefix_ids = (
+                entry.token_ids
+                if entry is not None
+                else self.processor.tokenizer(prefix_text, add_special_tokens=False)[
+                    "input_ids"
+                ]
+            )
+
         with torch.inference_mode():
-            response = self.pipeline(messages, return_full_text=False)
+            inputs, prefix_length = self.prepare_inputs(items, texts, prefix_ids)
+            reused = entry is not None and prefix_length > 0
+            if reused:
+                inputs["past_key_values"] = entry.clone(len(items))
+                if "inputs_embeds" in inputs:
+                    # Embeddings cover only the uncached tail of each row
+                    inputs["inputs_embeds"] = inputs["inputs_embeds"][:, prefix_length:]
+                    inputs["cache_position"] = torch.arange(
+                        prefix_length,
+                        inputs["input_ids"].shape[1],
+                        device=inputs["input_ids"].device,
+                    )
+
+            input_length = inputs["input_ids"].shape[1]
+            generate_kwargs, stop, limits = self._generation_hooks(
+                timer, options, input_length
+            )
+
+            started = time.perf_counter()
+            if self.draft_model is None:
+                outputs = self.model.generate(
+                    **inputs,
+                    **generate_kwargs,
+                    return_dict_in_generate=True,
+                )
+            else:
+                with (
+                    ForwardCounter(self.model) as verified,
+                    ForwardCounter(self.draft_model) as drafted,
+                ):
+                    outputs = self.model.generate(
+                        **inputs,
+                        **generate_kwargs,
+                        **self.draft_kwargs,
+                        return_dict_in_generate=True,
+                    )
+            elapsed = time.perf_counter() - started
+
+        new_tokens = outputs.sequences[:, input_length:]
+        lengths = self._record_generation(new_tokens, stop, options, limits, elapsed)
+        if self.draft_model is not None:
+            self._record_speculation(
+                options[0], lengths[0], verified.calls, drafted.calls
+            )
+        states = [None] * len(items)
+        if keep_state:
+            states = self._split_states(
+                outputs.sequences, inputs["attention_mask"], outputs.past_key_values
+            )
+            for state in states:
+                state["prompt_length"] = input_length
+
+        # Keep the prefix KV from a full prefill for later requests
+        if entry is None and prefix_length > 0:
+            kv = outputs.past_key_values
+            if isinstance(kv, DynamicCache):
+                kv.crop(prefix_length)
+                kv.batch_select_indices(torch.tensor([0]))
+                self.prefix_cache.put(prefix_text, PrefixEntry(prefix_ids, kv))
+
+        if timer.ttft_ms is not None:
+            prefill = "cached_prefix" if reused else "full_prefill"
+            self.metrics.observe(f"vlm.ttft_ms.{prefill}", timer.ttft_ms)
+        if reused:
+            self.metrics.increment(
+                "prefix_cache.tokens_reused", prefix_length * len(items)
+            )
+
+        responses = self.processor.batch_decode(new_tokens, skip_special_tokens=True)
+        return list(zip(responses, states, strict=True))
+
+    @staticmethod
+    def _split_states(
+        sequences: torch.Tensor, attention_mask: torch.Tensor, kv: DynamicCache
+    ) -> list[dict]:
+        """Copy each row of a batch's final decoding state into its own cache."""
+        new_length = sequences.shape[1] - attention_mask.shape[1]
+        attention_mask = torch.cat(
+            [attention_mask, attention_mask.new_ones(len(sequences), new_length)],
+            dim=1,
+        )
+        return [
+            {
+                "token_ids": sequences[i],
+                "attention_mask": attention_mask[i],
+                "kv": DynamicCache(
+                    [
+                        (layer.keys[i : i + 1].clone(), layer.values[i : i + 1].clone())
+                        for layer in kv.layers
+                    ]
+                ),
+            }
+            for i in range(len(sequences))
+        ]
+
+    def prepare_inputs(
+        self,
+        items: list[tuple],
+        texts: list[str],
+        prefix_ids: list[int] | None = None,
+    ) -> tuple[dict, int]:
+        """Tokenize rendered requests into padded model inputs.
+
+        With the vision cache enabled, images are encoded once and spliced in
+        as `inputs_embeds`, so repeated images skip preprocessing and the
+        vision tower. When `prefix_ids` is given and every request starts with
+        it, padding goes between the shared prefix and the rest of each
+        request so that all rows hold the prefix at the same positions.
+
+        Args:
+            items: (image, prompt, system_prompt) tuples.
+            texts: Chat-template text for each request.
+            prefix_ids: Optional token ids shared by the start of every request.
+
+        Returns:
+            Keyword arguments for `model.generate`, and the shared prefix
+            length (0 if the requests were left-padded instead).
+        """
+        images = [item[0] for item in items]
+
+        if self.vision_cache is None:
+            inputs = dict(
+                self.processor(
+                    images=images,
+                    text=texts,
+                    padding=True,
+                    add_special_tokens=False,
+                    return_tensors="pt",
+                ).to(self.model.device)
+            )
+            inputs["pixel_values"] = inputs["pixel_values"].to(self.model.dtype)
+        else:
+            encodings = self.encode_images(images)
+            texts = [
+                self._expand_image_tokens(text, [encoding])
+                for text, encoding in zip(texts, encodings, strict=True)
+            ]
+            inputs = dict(
+                self.processor.tokenizer(
+                    texts, padding=True, add_special_tokens=False, return_tensors="pt"
+                ).to(self.model.device)
+            )
+
+        prefix_length = 0
+        if prefix_ids:
+            aligned = self._align_prefix(
+                inputs["input_ids"], inputs["attention_mask"], prefix_ids
+            )
+            if aligned is not None:
+                inputs["input_ids"], inputs["attention_mask"] = aligned
+                prefix_length = len(prefix_ids)
+
+        if self.vision_cache is not None:
+            inputs_embeds = self.model.get_input_embeddings()(inputs["input_ids"])
+            features = torch.cat(
+                [e.features.reshape(-1, inputs_embeds.shape[-1]) for e in encodings]
+            ).to(inputs_embeds.device, inputs_embeds.dtype)
+            image_mask = inputs["input_ids"] == self.model.config.image_token_id
+            inputs["inputs_embeds"] = inputs_embeds.masked_scatter(
+                image_mask.unsqueeze(-1).expand_as(inputs_embeds), features
+            )
+
+        return inputs, prefix_length
+
+    def _prefix_text(self, text: str) -> str:
+        """Return the cacheable prompt prefix (text before the first image)."""
+        if self.prefix_cache is None:
+            return ""
+        return text.split(self.processor.image_token, 1)[0]
+
+    def _align_prefix(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        prefix_ids: list[int],
+    ) -> tuple[torch.Tensor, torch.Tensor] | None:
+        """Re-pad rows as [prefix][padding][rest], or None if a row lacks the prefix."""
+        prefix = torch.tensor(prefix_ids, device=input_ids.device)
+        prefix_length = len(prefix_ids)
+
+        rows = [
+            row[mask.bool()]
+            for row, mask in zip(input_ids, attention_mask, strict=True)
+        ]
+        if any(
+            len(row) <= prefix_length or not torch.equal(row[:prefix_length], prefix)
+            for row in rows
+        ):
+            return None
 
-        return response[0]["generated_text"]
+        width = max(len(row) for row in rows)
+        aligned_ids = torch.full(
+            (len(rows), width),
+            self.generate_kwargs["pad_token_id"],
+            dtype=input_ids.dtype,
+            device=input_ids.device,
+        )
+        aligned_mask = torch.zeros_like(aligned_ids)
+        for i, row in enumerate(rows):
+            rest = row[prefix_length:]
+            aligned_ids[i, :prefix_length] = prefix
+            aligned_ids[i, width - len(rest) :] = rest
+            aligned_mask[i, :prefix_length] = 1
+            aligned_mask[i, width - len(rest) :] = 1
+
+        return aligned_ids, aligned_mask
+
+    def encode_images(self, images: list[Image.Image]) -> list[VisionEncoding]:
+        """Return vision encodings, running the vision tower only on cache misses.
+
+        Args:
+            images: PIL images.
+
+        Returns:
+            One encoding per image, in input order.
+        """
+        keys = [image_digest(image) for image in images]
+        encodings = {key: self.vision_cache.get(key) for key in set(keys)}
+        misses = [key for key, encoding in encodings.items() if encoding is None]
+
+        if misses:
+            miss_images = [images[keys.index(key)] for key in misses]
+            image_inputs = self.processor.image_processor(
+                images=miss_images, crop_to_patches=True, return_tensors="pt"
+            )
+            pixel_values = image_inputs["pixel_values"].to(
+                self.model.device, self.model.dtype
+            )
+            with torch.inference_mode():
+                features = self.model.get_image_features(
+                    pixel_values=pixel_values,
+                    vision_feature_layer=self.model.config.vision_feature_layer,
+                    vision_feature_select_strategy=(
+                        self.model.config.vision_feature_select_strategy
+                    ),
+                    return_dict=True,
+                ).pooler_output
+
+            num_patches = [int(n) for n in image_inputs["num_patches"]]
+            for key, chunk, n in zip(
+                misses, features.split(num_patches), num_patches, strict=True
+            ):
+                encodings[key] = VisionEncoding(num_patches=n, features=chunk)
+                self.vision_cache.put(key, encodings[key])
+
+        return [encodings[key] for key in keys]
+
+    def _expand_image_tokens(self, text: str, encodings: list[VisionEncoding]) -> str:
+        """Replace each image placeholder with its full run of image tokens."""
+        parts = text.split(self.processor.image_token)
+        if len(parts) != len(encodings) + 1:
+            raise ValueError(
+                "Number of image placeholders in the prompt does not match "
+                "the number of images."
+            )
+
+        seq_length = self.processor.image_seq_length
+        expanded = [parts[0]]
+        for encoding, part in zip(encodings, parts[1:], strict=True):
+            expanded.append(
+                self.processor.start_image_token
+                + self.processor.image_token * seq_length * encoding.num_patches
+                + self.processor.end_image_token
+                + part
+            )
+        return "".join(expanded)
 
 
 class BDAPipeline:
@@ -156,20 +1176,329 @@ class BDAPipeline:
         )
 
         self.report_prompt = config["prompts"]["report"]
+        self.verify_prompt = config["prompts"]["verify"].replace(
+            "{categories}", ", ".join(self.categories)
+        )
+        self._doctrine_blocks = LRUCache(
+            max_entries=CATEGORY_SET_ENTRIES, name="doctrine_blocks"
+        )
+
+        # Per-stage decoding options (constraints and structural early stops)
+        decoding_cfg = config.get("decoding", {})
+        self.constrain_report = decoding_cfg.get("constrain-report", False)
+        self.early_stop = decoding_cfg.get("early-stop", False)
+        self._report_options = LRUCache(
+            max_entries=CATEGORY_SET_ENTRIES, name="report_options"
+        )
+
+        classify_grammar = None
+        if decoding_cfg.get("constrain-classify", False):
+            classify_grammar = ClassifyGrammar(
+                self.categories,
+                max_labels=decoding_cfg.get("classify-max-labels", 32),
+            )
+        self.classify_options = GenerationOptions(
+            stage="classify",
+            grammar=classify_grammar,
+            stop="list" if self.early_stop else None,
+        )
+        self.verify_options = GenerationOptions(
+            stage="verify", grammar=ChoiceGrammar(("yes", "no"))
+        )
+
+        # Pipeline mode
+        pipeline_cfg = config.get("pipeline", {})
+        self.mode = pipeline_cfg.get("mode", "two-stage")
+        if self.mode not in PIPELINE_MODES:
+            raise ValueError(
+                f"Unknown pipeline mode '{self.mode}'. "
+                f"Expected one of: {', '.join(PIPELINE_MODES)}."
+            )
+        self.fused_prompt = self.format_fused_prompt(
+            pipeline_cfg.get("fused-doctrine", "full")
+        )
+        self.empty_scenes = pipeline_cfg.get("empty-scenes", "report")
+        if self.empty_scenes not in EMPTY_SCENE_MODES:
+            raise ValueError(
+                f"Unknown empty-scenes mode '{self.empty_scenes}'. "
+                f"Expected one of: {', '.join(EMPTY_SCENE_MODES)}."
+            )
+
+        self.metrics = RunMetrics()
 
         # Load models
         vlm_cfg = config.get("vlm")
         vlm_id = vlm_cfg.get("model-id")
         pipeline_kwargs = vlm_cfg.get("pipeline-kwargs", {})
+
+        # Per-request token limits learned from recent output lengths
+        self.token_budget = None
+        budget_cfg = decoding_cfg.get("token-budget", {})
+        if budget_cfg.get("enabled", False):
+            self.token_budget = TokenBudget(
+                ceiling=pipeline_kwargs.get("max_new_tokens", 512),
+                window=budget_cfg.get("window", 256),
+                min_samples=budget_cfg.get("min-samples", 16),
+                quantile=budget_cfg.get("quantile", 0.95),
+                margin=budget_cfg.get("margin", 1.25),
+                min_tokens=budget_cfg.get("min-tokens", 32),
+                per_target_tokens=budget_cfg.get("per-target-tokens", 96),
+                metrics=self.metrics,
+            )
+
         quantization_kwargs = vlm_cfg.get("quantization-kwargs", {})
+        batch_size = vlm_cfg.get("batch-size", 1)
+        vision_cache_kwargs = vlm_cfg.get("vision-cache", {})
+        prefix_cache_kwargs = vlm_cfg.get("prefix-cache", {})
         self.vlm = VLMRunner(
             model_id=vlm_id,
             pipeline_kwargs=pipeline_kwargs,
             quantization_kwargs=quantization_kwargs,
+            batch_size=batch_size,
+            vision_cache_kwargs=vision_cache_kwargs,
+            prefix_cache_kwargs=prefix_cache_kwargs,
+            metrics=self.metrics,
+            token_budget=self.token_budget,
+            draft_model_id=vlm_cfg.get("draft-model-id"),
         )
 
         self.detector = detector
 
+        # Micro-batching scheduler shared by the classify and report stages
+        self.scheduler = None
+        scheduler_cfg = config.get("scheduler", {})
+        if scheduler_cfg.get("enabled", False):
+            self.scheduler = MicroBatchScheduler(
+                self.vlm.generate_batch,
+                max_batch_size=scheduler_cfg.get("max-batch-size", batch_size),
+                max_wait_ms=scheduler_cfg.get("max-wait-ms", 50),
+                metrics=self.metrics,
+            )
+
+        # Decode stage: JPEG draft mode and resize to the processor's budget
+        decode_cfg = config.get("decode", {})
+        self.max_pixels = None
+        if decode_cfg.get("pre-resize", False):
+            self.max_pixels = pixel_budget(
+                getattr(getattr(self.vlm, "processor", None), "image_processor", None),
+                margin=decode_cfg.get("resize-margin", 1.0),
+            )
+
+        # On-disk results keyed by image content and configuration
+        self.result_cache = None
+        cache_cfg = config.get("result-cache", {})
+        if cache_cfg.get("enabled", False):
+            max_mb = cache_cfg.get("max-mb")
+            self.result_cache = ResultCache(
+                Path(cache_cfg.get("directory", DEFAULT_RESULT_CACHE)).expanduser(),
+                fingerprint=config_fingerprint(config, doctrine),
+                max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+                hash_threads=cache_cfg.get("hash-threads", 4),
+                metrics=self.metrics,
+            )
+
+        # Asyncio API: dedicated executor, concurrency limit, default timeout
+        async_cfg = config.get("async", {})
+        self.max_concurrency = max(1, int(async_cfg.get("max-concurrency", 1)))
+        self.async_timeout = async_cfg.get("timeout-s")
+        self._executor: ThreadPoolExecutor | None = None
+        self._limits: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._cancel = threading.local()
+
+    def close(self) -> None:
+        """Flush and stop the micro-batching scheduler and async executor."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+    def decode(self, source: str | Path | BinaryIO | Image.Image) -> Image.Image:
+        """Decode an image for analysis, downscaled to the model's resolution.
+
+        Records decode time and the process's peak resident memory.
+
+        Args:
+            source: Image file path, stream of image bytes, or decoded image.
+
+        Returns:
+            Decoded RGB image.
+        """
+        started = time.perf_counter()
+        image = open_image(source, self.max_pixels)
+        self.metrics.observe("decode.ms", (time.perf_counter() - started) * 1000)
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.metrics.set_gauge("process.peak_rss_mb", peak_kb / 1024)
+        return image
+
+    async def analyze_async(
+        self,
+        image_path: str | Path | BinaryIO | Image.Image,
+        timeout: float | None = None,
+    ) -> str:
+        """Run `analyze` without blocking the event loop.
+
+        Analyses run on a dedicated executor, at most `max_concurrency` at a
+        time; further calls wait for a slot. Cancelling the awaiting task, or
+        exceeding the timeout, stops the analysis cooperatively: it ends
+        before its next generation starts.
+
+        Args:
+            image_path: Path to the image file (or a stream of image bytes, or
+                a decoded image).
+            timeout: Seconds before the analysis is abandoned, including the
+                wait for a slot (`async.timeout-s` if None; no limit if both
+                are None).
+
+        Returns:
+            Model-generated BDA assessment text for the full scene.
+
+        Raises:
+            TimeoutError: If the analysis does not finish within the timeout.
+            asyncio.CancelledError: If the awaiting task is cancelled.
+        """
+        timeout = self.async_timeout if timeout is None else timeout
+        cancelled = threading.Event()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout), self._concurrency_limit():
+                return await loop.run_in_executor(
+                    self._async_executor(), self._run_cancellable, cancelled, image_path
+                )
+        except TimeoutError:
+            cancelled.set()
+            self.metrics.increment("async.timeouts")
+            raise
+        except asyncio.CancelledError:
+            cancelled.set()
+            self.metrics.increment("async.cancelled")
+            raise
+        finally:
+            self.metrics.observe(
+                "async.latency_ms", (time.perf_counter() - started) * 1000
+            )
+
+    async def analyze_stream(
+        self,
+        image_paths: list[str | Path],
+        timeout: float | None = None,
+    ) -> AsyncIterator[tuple[str | Path, str]]:
+        """Analyze many images concurrently, yielding results as they finish.
+
+        At most `max_concurrency` analyses are in flight. Leaving the loop
+        early (or an analysis failing) cancels the analyses still pending.
+
+        Args:
+            image_paths: Paths to the image files to analyze.
+            timeout: Per-image timeout in seconds (see `analyze_async`).
+
+        Yields:
+            (image path, BDA assessment text) pairs in completion order.
+
+        Raises:
+            TimeoutError: If an analysis does not finish within the timeout.
+        """
+        remaining = iter(image_paths)
+        pending: dict[asyncio.Task, str | Path] = {}
+
+        def fill() -> None:
+            while len(pending) < self.max_concurrency:
+                image_path = next(remaining, None)
+                if image_path is None:
+                    return
+                task = asyncio.create_task(self.analyze_async(image_path, timeout))
+                pending[task] = image_path
+
+        try:
+            fill()
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield pending.pop(task), task.result()
+                fill()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _concurrency_limit(self) -> asyncio.Semaphore:
+        """Return the concurrency semaphore for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._limits:
+            self._limits[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._limits[loop]
+
+    def _async_executor(self) -> ThreadPoolExecutor:
+        """Return the executor for async analyses, creating it on first use."""
+        if self._executor is None:
+            # Concurrent analyses are only safe when every generation goes
+            # through the scheduler thread; otherwise they run one at a time
+            shared = self.scheduler is not None and not self.continued
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency if shared else 1,
+                thread_name_prefix="bda-async",
+            )
+        return self._executor
+
+    def _run_cancellable(
+        self,
+        cancelled: threading.Event,
+        image_path: str | Path | BinaryIO | Image.Image,
+    ) -> str:
+        """Run `analyze` on an executor thread, honoring a cancellation flag."""
+        self._cancel.event = cancelled
+        try:
+            self._check_cancelled()
+            return self.analyze(image_path)
+        finally:
+            self._cancel.event = None
+
+    def _check_cancelled(self) -> None:
+        """Stop the current thread's analysis if its async caller gave up.
+
+        Raises:
+            AnalysisCancelled: If the analysis was cancelled or timed out.
+        """
+        event = getattr(self._cancel, "event", None)
+        if event is not None and event.is_set():
+            raise AnalysisCancelled("Analysis was cancelled.")
+
+    def generate(
+        self,
+        image: Image.Image,
+        prompt: str,
+        options: GenerationOptions | None = None,
+    ) -> str:
+        """Generate a VLM response, through the scheduler when enabled.
+
+        Args:
+            image: PIL image to analyze.
+            prompt: User prompt text.
+            options: Optional per-request decoding options.
+
+        Returns:
+            Model response text.
+
+        Raises:
+            AnalysisCancelled: If the calling async analysis was cancelled.
+        """
+        self._check_cancelled()
+        if self.scheduler is not None:
+            return self.scheduler.submit(
+                image, prompt, self.system_prompt, options
+            ).result()
+        return self.vlm.generate(
+            image=image,
+            prompt=prompt,
+            system_prompt=self.system_prompt,
+            options=options,
+        )
+
     def detect_objects(self, image: Image.Image) -> list[Detection]:
         """Return detected objects from detector or VLM.
 
@@ -184,12 +1513,19 @@ class BDAPipeline:
             return self.detector.detect(image)
 
         # Else use VLM with the classify prompt
-        response = self.vlm.generate(
-            image=image,
-            prompt=self.classify_prompt,
-            system_prompt=self.system_prompt,
-        )
+        response = self.generate(image, self.classify_prompt, self.classify_options)
+
+        return self.parse_detections(response)
 
+    def parse_detections(self, response: str) -> list[Detection]:
+        """Parse a classify-stage response into detections.
+
+        Args:
+            response: Model response to the classify prompt.
+
+        Returns:
+            List of detections with valid doctrine category labels.
+        """
         # Normalize and keep only valid doctrine categories
         if not response or not response.strip():
             return []
@@ -202,6 +1538,27 @@ class BDAPipeline:
 
         return [Detection(label=label) for label in labels]
 
+    def doctrine_block(self, categories: frozenset[str]) -> str:
+        """Return the doctrine text for a set of categories.
+
+        The text depends only on the category set (in doctrine order), so the
+        report prompt up to the image, and its prefix KV cache, is shared by
+        every image with the same set of detected categories.
+
+        Args:
+            categories: Detected doctrine category keys.
+
+        Returns:
+            Formatted doctrine text.
+        """
+        block = self._doctrine_blocks.get(categories)
+        if block is None:
+            block = format_pda_doctrine(
+                [key for key in self.categories if key in categories]
+            )
+            self._doctrine_blocks.put(categories, block)
+        return block
+
     def format_report_prompt(self, detections: list[Detection]) -> str:
         """Format report prompt with doctrine for detected labels.
 
@@ -212,7 +1569,7 @@ class BDAPipeline:
             Report prompt with `categories` and `doctrine` populated.
         """
         categories = [det.label for det in detections if det.label]
-        doctrine = format_pda_doctrine(list(set(categories)))
+        doctrine = self.doctrine_block(frozenset(categories))
 
         categories_text = ", ".join(categories) if categories else "NONE"
         output = self.report_prompt.replace("{categories}", categories_text)
@@ -220,21 +1577,433 @@ class BDAPipeline:
 
         return output
 
-    def analyze(self, image_path: str | Path) -> str:
+    def classify_request(self, image: Image.Image) -> tuple:
+        """Build the classify-stage generation request for an image.
+
+        Args:
+            image: PIL image to analyze.
+
+        Returns:
+            (image, prompt, system_prompt, options) request tuple.
+        """
+        return (image, self.classify_prompt, self.system_prompt, self.classify_options)
+
+    def report_options(self, categories: frozenset[str]) -> GenerationOptions:
+        """Return the report-stage decoding options for a set of categories.
+
+        With constrained reports, `target_type` is limited to the detected
+        categories, `damage_category` to each category's doctrinal labels, and
+        `confidence_level` to the levels in the confidence guidance.
+
+        Args:
+            categories: Detected doctrine category keys.
+
+        Returns:
+            Memoized decoding options.
+        """
+        options = self._report_options.get(categories)
+        if options is None:
+            grammar = None
+            if self.constrain_report:
+                grammar = ReportGrammar(
+                    doctrine_labels(
+                        [key for key in self.categories if key in categories]
+                    )
+                )
+            options = GenerationOptions(
+                stage="report",
+                grammar=grammar,
+                stop="json" if self.early_stop else None,
+            )
+            self._report_options.put(categories, options)
+        return options
+
+    def report_request(self, image: Image.Image, detections: list[Detection]) -> tuple:
+        """Build the report-stage generation request for an image.
+
+        Args:
+            image: PIL image to analyze.
+            detections: Detections from the classify stage.
+
+        Returns:
+            (image, prompt, system_prompt, options) request tuple. The options
+            carry the number of detections for the token budget.
+        """
+        categories = frozenset(det.label for det in detections if det.label)
+        return (
+            image,
+            self.format_report_prompt(detections),
+            self.system_prompt,
+            dataclasses.replace(
+                self.report_options(categories), targets=len(detections)
+            ),
+        )
+
+    def fused_request(self, image: Image.Image) -> tuple:
+        """Build the fused-mode generation request for an image.
+
+        Args:
+            image: PIL image to analyze.
+
+        Returns:
+            (image, prompt, system_prompt, options) request tuple.
+        """
+        return (
+            image,
+            self.fused_prompt,
+            self.system_prompt,
+            self.report_options(frozenset(self.categories)),
+        )
+
+    def verify_request(self, image: Image.Image) -> tuple:
+        """Build the yes/no request checking an image for any target category.
+
+        Args:
+            image: PIL image to analyze.
+
+        Returns:
+            (image, prompt, system_prompt, options) request tuple.
+        """
+        return (image, self.verify_prompt, self.system_prompt, self.verify_options)
+
+    def report_requests(
+        self, images: list[Image.Image], detections: list[list[Detection]]
+    ) -> list[tuple | None]:
+        """Build report requests, short-circuiting images with no detections.
+
+        Depending on `empty_scenes`, an image with no detections is reported
+        as usual (`report`), answered with NO_TARGETS_RESPONSE without a
+        report generation (`skip`), or first checked with a constrained yes/no
+        generation and only reported, over every category, if it confirms
+        targets (`verify`).
+
+        Args:
+            images: PIL images to analyze.
+            detections: Detections from the classify stage for each image.
+
+        Returns:
+            Report request for each image, or None where the answer is
+            NO_TARGETS_RESPONSE.
+        """
+        requests = [
+            self.report_request(image, dets)
+            if dets or self.empty_scenes == "report"
+            else None
+            for image, dets in zip(images, detections, strict=True)
+        ]
+
+        empty = [index for index, request in enumerate(requests) if request is None]
+        answers = [None] * len(empty)
+        if empty and self.empty_scenes == "verify":
+            answers = self._generate_many(
+                [self.verify_request(images[index]) for index in empty]
+            )
+        for index, answer in zip(empty, answers, strict=True):
+            requests[index] = self._empty_scene_request(images[index], answer)
+
+        return requests
+
+    def _empty_scene_request(
+        self, image: Image.Image, answer: str | None
+    ) -> tuple | None:
+        """Resolve an image where classification found nothing.
+
+        Args:
+            image: PIL image to analyze.
+            answer: Response to the verify prompt, or None when not verifying.
+
+        Returns:
+            A report request covering every category if the verify check
+            found targets, or None to answer NO_TARGETS_RESPONSE.
+        """
+        if answer is not None and answer.strip().lower().startswith("yes"):
+            self.metrics.increment("empty_scenes.confirmed")
+            return self.fused_request(image)
+        self.metrics.increment("empty_scenes.skipped")
+        return None
+
+    def format_fused_prompt(self, doctrine: str = "full") -> str:
+        """Format the single-pass report prompt covering every category.
+
+        The model classifies and assesses in one response, so the prompt lists
+        all categories as valid target types. It is the same for every image,
+        so its prefix is always served from the prefix KV cache.
+
+        Args:
+            doctrine: `full` for every category's doctrine, or `index` for a
+                compact list of damage labels per category.
+
+        Returns:
+            Report prompt with `categories` and `doctrine` populated.
+
+        Raises:
+            ValueError: If `doctrine` is not a known option.
+        """
+        if doctrine == "full":
+            block = self.doctrine_block(frozenset(self.categories))
+        elif doctrine == "index":
+            block = format_doctrine_index(self.categories)
+        else:
+            raise ValueError(
+                f"Unknown fused doctrine '{doctrine}'. Expected 'full' or 'index'."
+            )
+
+        output = self.report_prompt.replace("{categories}", ", ".join(self.categories))
+        output = output.replace("{doctrine}", block)
+
+        return output
+
+    @property
+    def fused(self) -> bool:
+        """Whether reports are generated in one pass without a classify stage.
+
+        An external detector replaces the classify generation on its own, so
+        fused mode only applies when the VLM would otherwise classify.
+        """
+        return self.mode == "fused" and self.detector is None
+
+    @property
+    def continued(self) -> bool:
+        """Whether the report continues the classify conversation's KV cache.
+
+        Only applies when the VLM classifies (no external detector).
+        """
+        return self.mode == "continuation" and self.detector is None
+
+    def analyze(self, image_path: str | Path | BinaryIO | Image.Image) -> str:
         """Run the full BDA pipeline and return a scene-wide assessment.
 
+        Results are looked up in (and added to) the result cache, if enabled.
+
         Args:
-            image_path: Path to the image file to analyze.
+            image_path: Path to the image file (or a stream of image bytes, or
+                a decoded image).
 
         Returns:
             Model-generated BDA assessment text for the full scene.
         """
-        with Image.open(Path(image_path)) as image:
-            image = image.convert("RGB")
-            detections = self.detect_objects(image)
-            prompt = self.format_report_prompt(detections)
-            return self.vlm.generate(
-                image=image,
-                prompt=prompt,
-                system_prompt=self.system_prompt,
+        key = self._result_key(image_path)
+        if key is not None and (cached := self.result_cache.get(key)) is not None:
+            return cached
+
+        result = self._analyze_image(self.decode(image_path))
+        if key is not None:
+            self.result_cache.put(key, result)
+        return result
+
+    def analyze_batch(
+        self, image_paths: list[str | Path | BinaryIO | Image.Image]
+    ) -> list[str]:
+        """Run the BDA pipeline over many images using batched generation.
+
+        Cached results (if the result cache is enabled) are returned without
+        decoding; only the remaining images are analyzed. The classify stage
+        runs as one batched pass across all images, then the report stage runs
+        as a second batched pass. With the scheduler enabled, each image's
+        report request is queued as soon as its classify result arrives, so
+        the two stages share micro-batches. In fused mode each image gets a
+        single report generation. In continuation mode the classify stage is
+        batched and each report continues its image's classify conversation.
+
+        Args:
+            image_paths: Paths to the image files (or streams of image bytes,
+                or decoded images).
+
+        Returns:
+            Model-generated BDA assessment text for each image, in input order.
+        """
+        keys = self._result_keys(image_paths)
+        results = [
+            self.result_cache.get(key) if key is not None else None for key in keys
+        ]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses:
+            return results
+
+        images = [self.decode(image_paths[i]) for i in misses]
+        for i, result in zip(misses, self._analyze_images(images), strict=True):
+            results[i] = result
+            if keys[i] is not None:
+                self.result_cache.put(keys[i], result)
+        return results
+
+    def prepare(
+        self, image_path: str | Path | BinaryIO | Image.Image
+    ) -> str | Image.Image:
+        """Return an image's cached result, or the image decoded for analysis.
+
+        Meant for decode threads feeding `analyze_batch`: the content hash is
+        computed here (in parallel) and carried on the decoded image, so it
+        is not recomputed.
+
+        Args:
+            image_path: Path to the image file (or a stream of image bytes).
+
+        Returns:
+            Cached BDA assessment text, or the decoded RGB image.
+        """
+        key = self._result_key(image_path)
+        if key is not None and (cached := self.result_cache.get(key)) is not None:
+            return cached
+
+        image = self.decode(image_path)
+        if key is not None:
+            image.info[RESULT_KEY_INFO] = key
+        return image
+
+    def _result_key(self, image_path) -> str | None:
+        """Return the result cache key for an image (None if caching is off)."""
+        if self.result_cache is None:
+            return None
+        if isinstance(image_path, Image.Image) and RESULT_KEY_INFO in image_path.info:
+            return image_path.info[RESULT_KEY_INFO]
+        return self.result_cache.key(image_path, self._result_settings())
+
+    def _result_keys(self, image_paths: list) -> list[str | None]:
+        """Return result cache keys for many images, hashing in parallel."""
+        if self.result_cache is None:
+            return [None] * len(image_paths)
+        keys = [
+            path.info.get(RESULT_KEY_INFO) if isinstance(path, Image.Image) else None
+            for path in image_paths
+        ]
+        unkeyed = [i for i, key in enumerate(keys) if key is None]
+        hashed = self.result_cache.keys(
+            [image_paths[i] for i in unkeyed], self._result_settings()
+        )
+        for i, key in zip(unkeyed, hashed, strict=True):
+            keys[i] = key
+        return keys
+
+    def _result_settings(self) -> str:
+        """Return the settings that can change after the cache fingerprint."""
+        detector = type(self.detector).__name__ if self.detector is not None else ""
+        return f"{self.mode}:{detector}"
+
+    def _analyze_image(self, image: Image.Image) -> str:
+        """Run the pipeline stages over one decoded image."""
+        if self.fused:
+            _, prompt, _, options = self.fused_request(image)
+        elif self.continued:
+            return self._analyze_continued([image])[0]
+        else:
+            request = self.report_requests([image], [self.detect_objects(image)])
+            if request[0] is None:
+                return NO_TARGETS_RESPONSE
+            _, prompt, _, options = request[0]
+        return self.generate(image, prompt, options)
+
+    def _analyze_images(self, images: list[Image.Image]) -> list[str]:
+        """Run the pipeline stages over decoded images."""
+        if self.fused:
+            return self._generate_many([self.fused_request(image) for image in images])
+
+        if self.continued:
+            return self._analyze_continued(images)
+
+        if self.scheduler is not None:
+            return self._analyze_scheduled(images)
+
+        # Classify stage
+        if self.detector is not None:
+            detections = [self.detector.detect(image) for image in images]
+        else:
+            responses = self.vlm.generate_batch(
+                [self.classify_request(image) for image in images]
             )
+            detections = [self.parse_detections(response) for response in responses]
+
+        # Report stage (images without detections may skip it)
+        requests = self.report_requests(images, detections)
+        pending = [request for request in requests if request is not None]
+        responses = iter(self.vlm.generate_batch(pending) if pending else [])
+        return [
+            next(responses) if request is not None else NO_TARGETS_RESPONSE
+            for request in requests
+        ]
+
+    def _generate_many(self, items: list[tuple]) -> list[str]:
+        """Answer independent requests through the scheduler or one batch call."""
+        if self.scheduler is not None:
+            futures = [self.scheduler.submit(*item) for item in items]
+            return [future.result() for future in futures]
+        return self.vlm.generate_batch(items)
+
+    def _analyze_continued(self, images: list[Image.Image]) -> list[str]:
+        """Run the report as a second turn of each image's classify conversation.
+
+        The report turn reuses the KV cache of the system prompt, image, and
+        classify exchange, so only the report text is prefilled. Conversations
+        have different lengths, so report turns run one image at a time and
+        bypass the scheduler.
+        """
+        self._check_cancelled()
+        started = self.vlm.start_conversations(
+            [self.classify_request(image) for image in images]
+        )
+
+        responses = []
+        for image, (response, conversation) in zip(images, started, strict=True):
+            detections = self.parse_detections(response)
+            if detections or self.empty_scenes == "report":
+                request = self.report_request(image, detections)
+            else:
+                answer = None
+                if self.empty_scenes == "verify":
+                    answer, _ = self.vlm.continue_conversation(
+                        conversation, self.verify_prompt, self.verify_options
+                    )
+                request = self._empty_scene_request(image, answer)
+
+            if request is None:
+                responses.append(NO_TARGETS_RESPONSE)
+                continue
+            _, prompt, _, options = request
+            self._check_cancelled()
+            report, _ = self.vlm.continue_conversation(conversation, prompt, options)
+            responses.append(report)
+        return responses
+
+    def _analyze_scheduled(self, images: list[Image.Image]) -> list[str]:
+        """Run both stages for many images through the micro-batching scheduler."""
+        scheduler = self.scheduler
+
+        # Queue every classify request up front
+        classify_futures = [
+            None
+            if self.detector is not None
+            else scheduler.submit(*self.classify_request(image))
+            for image in images
+        ]
+
+        # Queue each report (or verify check) as soon as its detections are known
+        report_futures = []
+        verify_futures = {}
+        for index, (image, future) in enumerate(
+            zip(images, classify_futures, strict=True)
+        ):
+            if future is None:
+                detections = self.detector.detect(image)
+            else:
+                detections = self.parse_detections(future.result())
+
+            if detections or self.empty_scenes == "report":
+                report_futures.append(
+                    scheduler.submit(*self.report_request(image, detections))
+                )
+                continue
+            report_futures.append(None)
+            if self.empty_scenes == "verify":
+                verify_futures[index] = scheduler.submit(*self.verify_request(image))
+            else:
+                self._empty_scene_request(image, None)
+
+        for index, future in verify_futures.items():
+            request = self._empty_scene_request(images[index], future.result())
+            if request is not None:
+                report_futures[index] = scheduler.submit(*request)
+
+        return [
+            future.result() if future is not None else NO_TARGETS_RESPONSE
+            for future in report_futures
+        ]
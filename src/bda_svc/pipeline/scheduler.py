@@ -0,0 +1,156 @@
+"""Dynamic micro-batching in front of the VLM."""
+
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from bda_svc.metrics import RunMetrics
+
+
+@dataclass
+class _Request:
+    """A pending generation request."""
+
+    item: tuple
+    future: Future = field(default_factory=Future)
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class MicroBatchScheduler:
+    """Gather generation requests into micro-batches for the VLM.
+
+    A batch is dispatched when it reaches `max_batch_size` requests or when
+    the oldest request in it has waited `max_wait_ms`, whichever comes first.
+    Requests from any stage or image share the same queue.
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[[list[tuple]], list[str]],
+        max_batch_size: int = 4,
+        max_wait_ms: float = 50.0,
+        metrics: RunMetrics | None = None,
+    ) -> None:
+        """Initialize the scheduler and start its dispatch thread.
+
+        Args:
+            generate_batch: Function that answers a list of request tuples.
+            max_batch_size: Maximum number of requests per batch.
+            max_wait_ms: Maximum time the oldest request waits for a batch to fill.
+            metrics: Optional metrics store for queue depth, batch sizes, and waits.
+        """
+        self.generate_batch = generate_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.metrics = metrics or RunMetrics()
+
+        self._queue: queue.Queue[_Request | None] = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="bda-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, *item) -> Future:
+        """Queue a request for the next micro-batch.
+
+        Args:
+            *item: Request arguments forwarded to `generate_batch` as a tuple.
+
+        Returns:
+            Future resolving to the response for this request.
+
+        Raises:
+            RuntimeError: If the scheduler has been closed.
+        """
+        if self._closed:
+            raise RuntimeError("Scheduler is closed.")
+
+        request = _Request(item=item)
+        self._queue.put(request)
+        self.metrics.set_gauge("scheduler.queue_depth", self._queue.qsize())
+        return request.future
+
+    def close(self) -> None:
+        """Stop accepting requests and wait for queued requests to finish."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self) -> "MicroBatchScheduler":
+        """Return the running scheduler."""
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Close the scheduler on context exit."""
+        self.close()
+
+    def _collect(self, first: _Request) -> tuple[list[_Request], bool]:
+        """Gather requests into a batch until it is full or the deadline passes."""
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                request = (
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+
+        return batch, False
+
+    def _dispatch(self, batch: list[_Request]) -> None:
+        """Run one batch and resolve its futures."""
+        started = time.monotonic()
+        self.metrics.set_gauge("scheduler.queue_depth", self._queue.qsize())
+        self.metrics.count("scheduler.batch_size", len(batch))
+        self.metrics.increment("scheduler.batches")
+        for request in batch:
+            self.metrics.observe(
+                "scheduler.wait_ms", (started - request.enqueued) * 1000
+            )
+
+        try:
+            responses = self.generate_batch([request.item for request in batch])
+            if len(responses) != len(batch):
+                raise RuntimeError(
+                    f"Expected {len(batch)} responses, got {len(responses)}."
+                )
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, response in zip(batch, responses, strict=True):
+            request.future.set_result(response)
+
+    def _run(self) -> None:
+        """Dispatch loop executed on the scheduler thread."""
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._dispatch(batch)
+
+        # Drain anything submitted before close()
+        leftover = []
+        while not self._queue.empty():
+            request = self._queue.get_nowait()
+            if request is not None:
+                leftover.append(request)
+        for start in range(0, len(leftover), self.max_batch_size):
+            self._dispatch(leftover[start : start + self.max_batch_size])
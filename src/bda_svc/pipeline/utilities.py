@@ -1,5 +1,6 @@
 """A collection of model utility functions."""
 
+import re
 from pathlib import Path
 
 import torch
@@ -9,6 +10,9 @@ import yaml
 CONFIG_PATH = Path(__file__).parent / "config.yaml"
 DOCTRINE_PATH = Path(__file__).parent / "doctrine.yaml"
 
+# Doctrinal label at the start of a definition line, e.g. "LIGHT DAMAGE — ..."
+_LABEL_PATTERN = re.compile(r"^\s*(.+?)\s*(?:—|–| - )")
+
 
 def test_gpu() -> None:
     """Verify hardware acceleration and library versions."""
@@ -71,3 +75,54 @@ def format_pda_doctrine(categories: list[str]) -> str:
             output.append(str(section_entry).strip())
 
     return "\n".join(output).strip() if output else "NO TARGET DOCTRINE AVAILABLE."
+
+
+def doctrine_labels(categories: list[str]) -> dict[str, list[str]]:
+    """Extract the doctrinal damage labels for selected target categories.
+
+    Labels are read from the start of each physical damage definition line,
+    with any parenthetical qualifier removed (e.g., "LIGHT-MODERATE DAMAGE
+    (aboveground tanks)" becomes "LIGHT-MODERATE DAMAGE").
+
+    Args:
+        categories: A list of doctrinal BDA target categories.
+
+    Returns:
+        Mapping of category key to its damage labels, in doctrine order.
+    """
+    doctrine = load_yaml(DOCTRINE_PATH)
+    output = {}
+
+    for key in categories:
+        entry = doctrine.get(key)
+        if not isinstance(entry, dict):
+            continue
+
+        labels = []
+        for line in str(entry.get("physical_damage_definitions", "")).splitlines():
+            match = _LABEL_PATTERN.match(line)
+            if match is None:
+                continue
+            label = re.sub(r"\s*\(.*$", "", match.group(1)).strip()
+            if label and label not in labels:
+                labels.append(label)
+        output[key] = labels
+
+    return output
+
+
+def format_doctrine_index(categories: list[str]) -> str:
+    """Format a compact doctrine index of damage labels per category.
+
+    Args:
+        categories: A list of doctrinal BDA target categories.
+
+    Returns:
+        One line per category in the format `category_key: LABEL | LABEL | ...`.
+    """
+    output = [
+        f"{key}: {' | '.join(labels)}"
+        for key, labels in doctrine_labels(categories).items()
+        if labels
+    ]
+    return "\n".join(output) if output else "NO TARGET DOCTRINE AVAILABLE."
@@ -0,0 +1,214 @@
+"""Resident BDA service over a Unix domain socket.
+
+`bda-svc serve` loads the pipeline once and answers jobs from
+`bda-svc submit` clients, so a small job does not pay for loading and
+quantizing the model. Each connection carries one newline-terminated JSON
+request, `{"input": path, "output": path}`, and receives one JSON reply,
+`{"status": "ok", "outputs": [...]}` or `{"status": "error", "error": msg}`.
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from os import environ
+from pathlib import Path
+
+from bda_svc import app, constants, inputs
+
+
+def get_socket_path(cmdline_path: str | None) -> Path:
+    """Return the server socket path.
+
+    Args:
+        cmdline_path: Optional path from command-line arguments.
+
+    Returns:
+        Socket path from the command line, the BDA_SOCKET environment
+        variable, or the default.
+    """
+    return Path(
+        cmdline_path
+        or environ.get(constants.ENV_SOCKET_NAME, constants.DEFAULT_SOCKET_PATH)
+    )
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Answer one analysis request on a client connection."""
+
+    def handle(self) -> None:
+        """Read a request, run the job, and write the reply."""
+        line = self.rfile.readline()
+        if not line:
+            # Connection probe (see remove_stale_socket)
+            return
+
+        try:
+            request = json.loads(line)
+            reply = self.server.run_job(request["input"], request.get("output"))
+        except (ValueError, KeyError, TypeError) as e:
+            reply = {"status": "error", "error": f"Invalid request: {e}"}
+
+        self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class BDAServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server holding one resident BDAPipeline.
+
+    Connections are accepted concurrently, but jobs run one at a time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str | Path, model) -> None:
+        """Bind the socket (owner-only permissions).
+
+        Args:
+            socket_path: Path of the Unix domain socket.
+            model: Loaded BDAPipeline.
+
+        Raises:
+            SystemExit: If another server is already listening on the socket.
+        """
+        self.socket_path = Path(socket_path)
+        self.model = model
+        self._job_lock = threading.Lock()
+
+        remove_stale_socket(self.socket_path)
+        super().__init__(str(self.socket_path), JobHandler)
+        os.chmod(self.socket_path, 0o600)
+
+    def run_job(self, input_path: str, output_path: str | None) -> dict:
+        """Analyze an image or folder and export the results.
+
+        Args:
+            input_path: Absolute path to an input image file or folder.
+            output_path: Absolute path of the output folder (default if None).
+
+        Returns:
+            Reply with the exported file paths, or an error message.
+        """
+        started = time.perf_counter()
+        try:
+            input_paths = inputs.get_input_paths(Path(input_path))
+        except SystemExit as e:
+            return {"status": "error", "error": str(e.code).strip()}
+
+        # The resident server analyzes images only; videos need a full run
+        input_paths = inputs.image_paths(input_paths)
+        if not input_paths:
+            return {"status": "error", "error": f"No images found in {input_path}."}
+
+        with self._job_lock:
+            try:
+                exported = app.analyze_paths(self.model, input_paths, output_path)
+            except Exception as e:
+                return {"status": "error", "error": f"Analysis failed: {e}"}
+
+        self.model.metrics.observe(
+            "server.job_ms", (time.perf_counter() - started) * 1000
+        )
+        return {"status": "ok", "outputs": [str(path) for path in exported]}
+
+    def server_close(self) -> None:
+        """Close the socket and remove its file."""
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+def remove_stale_socket(socket_path: Path) -> None:
+    """Remove a socket file left behind by a server that is no longer running.
+
+    Args:
+        socket_path: Path of the Unix domain socket.
+
+    Raises:
+        SystemExit: If a server is listening on the socket.
+    """
+    if not socket_path.exists():
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(str(socket_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            socket_path.unlink(missing_ok=True)
+            return
+
+    sys.exit(f"\nA bda-svc server is already listening on {socket_path}. Exiting.\n")
+
+
+def serve(socket_path: str | None, model=None) -> None:
+    """Load the pipeline and serve jobs until interrupted.
+
+    Args:
+        socket_path: Optional socket path from command-line arguments.
+        model: Optional loaded BDAPipeline (loaded from config if None).
+    """
+    if model is None:
+        model = app.load_pipeline()
+
+    server = BDAServer(get_socket_path(socket_path), model)
+    # Shut down cleanly (removing the socket file) on SIGTERM as well as Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f"[*] Serving on {server.socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        model.close()
+        app.print_summary(model.metrics.summary())
+
+
+def submit(
+    cmdline_input: str | None, cmdline_output: str | None, socket_path: str | None
+) -> list[Path]:
+    """Send an analysis job to a running server and wait for the results.
+
+    Paths are resolved on the client side, since the server runs in its own
+    working directory.
+
+    Args:
+        cmdline_input: Optional input path from command-line arguments.
+        cmdline_output: Optional output path from command-line arguments.
+        socket_path: Optional socket path from command-line arguments.
+
+    Returns:
+        Paths of the exported JSON files.
+
+    Raises:
+        SystemExit: If no server is listening or the job fails.
+    """
+    input_folder = inputs.get_input_folder(cmdline_input)
+    output_folder = Path(cmdline_output or constants.DEFAULT_OUTPUT_PATH)
+    request = {
+        "input": str(input_folder.resolve()),
+        "output": str(output_folder.resolve()),
+    }
+
+    path = get_socket_path(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            sys.exit(
+                f"\nNo bda-svc server is listening on {path}. "
+                f"Start one with `bda-svc serve`. Exiting.\n"
+            )
+        client.sendall((json.dumps(request) + "\n").encode())
+        reply = json.loads(client.makefile("rb").readline() or b"{}")
+
+    if reply.get("status") != "ok":
+        sys.exit(f"\n{reply.get('error', 'The server closed the connection.')}\n")
+
+    exported = [Path(output) for output in reply["outputs"]]
+    for output in exported:
+        print(f"[*] Exported: {output}")
+    return exported
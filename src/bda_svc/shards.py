@@ -0,0 +1,168 @@
+"""Static sharding of input folders across machines.
+
+Each image belongs to the shard given by a hash of its path relative to the
+input folder, so every node selects the same subset no matter where the
+folder is mounted, and existing images keep their shard when files are
+added. Each node writes a shard manifest next to its results; merging the
+manifests confirms that every image was analyzed exactly once.
+"""
+
+import datetime
+import hashlib
+import json
+import socket
+import sys
+from pathlib import Path
+
+
+def shard_of(relative_path: str, shard_count: int) -> int:
+    """Return the shard an image belongs to.
+
+    Args:
+        relative_path: Image path relative to the input folder (POSIX form).
+        shard_count: Total number of shards.
+
+    Returns:
+        Shard index in [0, shard_count).
+    """
+    digest = hashlib.sha256(relative_path.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def validate(shard_index: int, shard_count: int) -> None:
+    """Check that a shard selection is valid.
+
+    Args:
+        shard_index: Index of this node's shard.
+        shard_count: Total number of shards.
+
+    Raises:
+        SystemExit: If the count is not positive or the index is out of range.
+    """
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        sys.exit(
+            f"\nInvalid shard {shard_index} of {shard_count}: the index must be "
+            f"in [0, shard-count). Exiting.\n"
+        )
+
+
+def relative_name(path: Path, input_folder: Path) -> str:
+    """Return an image path relative to its input folder, in POSIX form.
+
+    Args:
+        path: Image path.
+        input_folder: Input folder (or the image itself for a single file).
+
+    Returns:
+        Relative path used for shard hashing and manifests.
+    """
+    if input_folder.is_file():
+        return path.name
+    return path.relative_to(input_folder).as_posix()
+
+
+def manifest_path(output_path: str | Path, shard_index: int, shard_count: int) -> Path:
+    """Return the manifest file path for a shard.
+
+    Args:
+        output_path: Path of the output folder.
+        shard_index: Index of the shard.
+        shard_count: Total number of shards.
+
+    Returns:
+        Path of the shard manifest.
+    """
+    return Path(output_path) / f"shard_{shard_index}_of_{shard_count}.json"
+
+
+def write_manifest(
+    input_folder: Path,
+    input_paths: list[Path],
+    exported: list[Path],
+    output_path: str | Path,
+    shard_index: int,
+    shard_count: int,
+) -> Path:
+    """Record which images a shard analyzed and where their results are.
+
+    Args:
+        input_folder: Input folder the shard was selected from.
+        input_paths: Image paths in this shard.
+        exported: Exported JSON file for each image, in the same order.
+        output_path: Path of the output folder.
+        shard_index: Index of this node's shard.
+        shard_count: Total number of shards.
+
+    Returns:
+        Path of the written manifest.
+    """
+    path = manifest_path(output_path, shard_index, shard_count)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    manifest = {
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+        "input_folder": str(input_folder.resolve()),
+        "host": socket.gethostname(),
+        "finished": datetime.datetime.now(datetime.UTC).isoformat(),
+        "images": {
+            relative_name(image, input_folder): output.name
+            for image, output in zip(input_paths, exported, strict=True)
+        },
+    }
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    print(f"[*] Shard manifest: {path}")
+    return path
+
+
+def merge_manifests(
+    manifest_paths: list[Path], expected: list[str] | None = None
+) -> dict:
+    """Check that shard manifests cover every image exactly once.
+
+    Args:
+        manifest_paths: Shard manifest files from every node.
+        expected: Optional relative paths of all images that should be covered
+            (e.g., a fresh listing of the input folder).
+
+    Returns:
+        Dictionary with `images` (number covered), `shard_count`,
+        `mixed_shard_counts`, `missing_shards`, `duplicate_shards`,
+        `duplicates` (images in more than one manifest), `missing` (expected
+        images in no manifest), and `ok`.
+    """
+    manifests = []
+    for path in manifest_paths:
+        with Path(path).open(encoding="utf-8") as f:
+            manifests.append(json.load(f))
+
+    counts = {manifest["shard_count"] for manifest in manifests}
+    shard_count = max(counts, default=0)
+    indices = [manifest["shard_index"] for manifest in manifests]
+
+    seen: dict[str, int] = {}
+    for manifest in manifests:
+        for image in manifest["images"]:
+            seen[image] = seen.get(image, 0) + 1
+
+    missing = sorted(set(expected) - seen.keys()) if expected is not None else []
+
+    report = {
+        "images": len(seen),
+        "shard_count": shard_count,
+        "mixed_shard_counts": len(counts) > 1,
+        "missing_shards": sorted(set(range(shard_count)) - set(indices)),
+        "duplicate_shards": sorted({i for i in indices if indices.count(i) > 1}),
+        "duplicates": sorted(image for image, n in seen.items() if n > 1),
+        "missing": missing,
+    }
+    report["ok"] = not (
+        report["mixed_shard_counts"]
+        or report["missing_shards"]
+        or report["duplicate_shards"]
+        or report["duplicates"]
+        or report["missing"]
+    )
+    return report
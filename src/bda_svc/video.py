@@ -0,0 +1,271 @@
+"""Streaming video input.
+
+Video files are decoded as a stream with PyAV (the optional `video` extra);
+sampled frames go straight to the pipeline as in-memory images, so no frame
+is ever written to disk. Frames are sampled every Nth frame, at a fixed rate
+(one frame per 1/fps seconds of video time), or on scene changes (when the
+frame's dHash differs from the last sampled frame by more than a Hamming
+threshold). Each frame's result is exported with its source video, frame
+index, and timestamp, and each video gets an index file listing its frames.
+"""
+
+import json
+import queue
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from bda_svc import constants, dedupe, export
+
+# Frame sampling modes
+SAMPLING_MODES = ("every", "fps", "scene")
+
+
+class FrameSampler:
+    """Decide which decoded frames of a video are analyzed."""
+
+    def __init__(
+        self,
+        mode: str = constants.VIDEO_SAMPLING,
+        every: int = constants.VIDEO_EVERY,
+        fps: float = constants.VIDEO_FPS,
+        scene_threshold: int = constants.VIDEO_SCENE_THRESHOLD,
+    ) -> None:
+        """Configure the sampling mode.
+
+        Args:
+            mode: `every` (every Nth frame), `fps` (fixed rate), or `scene`
+                (scene changes).
+            every: Frame interval for `every`.
+            fps: Sampled frames per second of video for `fps`.
+            scene_threshold: Minimum dHash Hamming distance (of 64 bits) from
+                the last sampled frame for `scene`.
+
+        Raises:
+            ValueError: If the mode or its setting is invalid.
+        """
+        if mode not in SAMPLING_MODES:
+            expected = ", ".join(SAMPLING_MODES)
+            raise ValueError(f"Unknown sampling mode '{mode}'. Expected: {expected}.")
+        if every < 1 or fps <= 0 or scene_threshold < 0:
+            raise ValueError("Sampling interval, rate, and threshold must be positive.")
+        self.mode = mode
+        self.every = every
+        self.fps = fps
+        self.scene_threshold = scene_threshold
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new video."""
+        self._last_slot: int | None = None
+        self._last_hash: np.uint64 | None = None
+
+    def select(
+        self, index: int, timestamp: float, thumbnail: Callable[[], np.ndarray]
+    ) -> bool:
+        """Return whether a frame is sampled.
+
+        Args:
+            index: Frame index within the video.
+            timestamp: Frame presentation time in seconds.
+            thumbnail: Returns the frame as an 8x9 grayscale array (only
+                called in `scene` mode).
+
+        Returns:
+            True if the frame should be analyzed.
+        """
+        if self.mode == "every":
+            return index % self.every == 0
+
+        if self.mode == "fps":
+            # One frame per 1/fps slot of video time
+            slot = int(timestamp * self.fps + 1e-6)
+            if slot == self._last_slot:
+                return False
+            self._last_slot = slot
+            return True
+
+        frame_hash = dedupe.dhash(np.asarray(thumbnail(), dtype=np.float32)[None])[0]
+        if self._last_hash is not None and (
+            np.bitwise_count(frame_hash ^ self._last_hash) <= self.scene_threshold
+        ):
+            return False
+        self._last_hash = frame_hash
+        return True
+
+
+@dataclass
+class VideoFrame:
+    """A sampled frame, decoded in memory."""
+
+    index: int
+    timestamp: float
+    image: Image.Image
+
+
+def require_pyav():
+    """Import PyAV (the optional `video` extra).
+
+    Returns:
+        The `av` module.
+
+    Raises:
+        SystemExit: If PyAV is not installed.
+    """
+    try:
+        # Lazy load heavy packages
+        import av
+    except ImportError:
+        sys.exit(
+            "\nVideo input requires PyAV. Install it with "
+            "`uv sync --extra video`. Exiting.\n"
+        )
+    return av
+
+
+def iter_frames(video_path: Path, sampler: FrameSampler) -> Iterator[VideoFrame]:
+    """Decode a video as a stream and yield its sampled frames.
+
+    Only sampled frames are converted to RGB images.
+
+    Args:
+        video_path: Video file path.
+        sampler: Frame sampler (reset for this video).
+
+    Yields:
+        Sampled frames, in presentation order.
+
+    Raises:
+        SystemExit: If PyAV is not installed.
+    """
+    av = require_pyav()
+    sampler.reset()
+    with av.open(str(video_path)) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        rate = float(stream.average_rate or stream.guessed_rate or 0) or None
+
+        for index, frame in enumerate(container.decode(stream)):
+            timestamp = frame.time
+            if timestamp is None:
+                timestamp = index / rate if rate else 0.0
+
+            def thumbnail(frame=frame):
+                return frame.reformat(width=9, height=8, format="gray").to_ndarray()
+
+            if sampler.select(index, timestamp, thumbnail):
+                yield VideoFrame(index, timestamp, frame.to_image())
+
+
+def analyze_video(
+    model,
+    video_path: Path,
+    output_path: str | Path | None,
+    sampler: FrameSampler,
+    prefetch: int = constants.PREFETCH_IMAGES,
+) -> Path:
+    """Analyze the sampled frames of a video and export each result.
+
+    A decoding thread stays up to `prefetch` frames ahead of the model, so
+    decoding overlaps inference.
+
+    Args:
+        model: Loaded BDAPipeline.
+        video_path: Video file path.
+        output_path: Path of output folder. Uses default if None/empty.
+        sampler: Frame sampler.
+        prefetch: Number of sampled frames decoded ahead of the model.
+
+    Returns:
+        Path of the video's index file, listing each frame's exported JSON.
+    """
+    frames: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Give up once the model side has stopped, instead of blocking forever
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode() -> None:
+        try:
+            for frame in iter_frames(video_path, sampler):
+                if not put(frame):
+                    return
+        except BaseException as e:
+            put(e)
+        else:
+            put(None)
+
+    decoder = threading.Thread(target=decode, name="bda-video", daemon=True)
+    decoder.start()
+
+    exported = []
+    batch_size = max(1, model.vlm.batch_size)
+    try:
+        finished = False
+        while not finished:
+            batch = []
+            while len(batch) < batch_size:
+                item = frames.get()
+                if isinstance(item, BaseException):
+                    raise item
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            if not batch:
+                break
+
+            for frame in batch:
+                print(
+                    f"\nProcessing: {video_path} @ {frame.timestamp:.3f}s "
+                    f"(frame {frame.index})\n{'-' * 80}"
+                )
+            results = model.analyze_batch([frame.image for frame in batch])
+            for frame, result in zip(batch, results, strict=True):
+                exported.append(
+                    (
+                        frame,
+                        export.save_json(
+                            result,
+                            video_path.with_name(
+                                f"{video_path.stem}_frame{frame.index:06d}"
+                            ),
+                            output_path,
+                            extra={
+                                "source_video": str(video_path),
+                                "frame_index": frame.index,
+                                "timestamp_s": round(frame.timestamp, 6),
+                            },
+                        ),
+                    )
+                )
+            model.metrics.increment("video.frames", len(batch))
+    finally:
+        stop.set()
+        decoder.join()
+
+    index = {
+        "source_video": str(video_path),
+        "sampling": sampler.mode,
+        "frames": [
+            {
+                "frame_index": frame.index,
+                "timestamp_s": round(frame.timestamp, 6),
+                "output": json_path.name,
+            }
+            for frame, json_path in exported
+        ],
+    }
+    return export.save_json(json.dumps(index), video_path, output_path)
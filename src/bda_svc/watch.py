@@ -0,0 +1,362 @@
+"""Watch-folder streaming ingestion.
+
+`bda-svc --watch` keeps the pipeline resident and analyzes images as they
+land in the input folder. New files are noticed with Linux inotify (through
+libc, watching every subfolder) or, where inotify is unavailable, by
+periodically rescanning the folder. A file is only analyzed once its size
+and modification time have stayed unchanged for the debounce interval, so
+partially written files are never decoded. Arrival-to-result latency (from
+first noticing a file to its exported result) is reported per image and in
+the run summary.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import threading
+import time
+from pathlib import Path
+
+from bda_svc import app, constants, inputs
+from bda_svc.journal import RunJournal
+
+# inotify event flags (from <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event header: wd, mask, cookie, len (followed by the name)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Report files created, written, or moved into a folder tree (inotify)."""
+
+    def __init__(self, folder: Path) -> None:
+        """Watch a folder and all of its subfolders.
+
+        Args:
+            folder: Folder to watch.
+
+        Raises:
+            OSError: If inotify is unavailable on this platform.
+        """
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (AttributeError, OSError, TypeError) as e:
+            raise OSError(f"inotify is unavailable: {e}") from e
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.folder = folder
+        self._folders: dict[int, Path] = {}
+        self._add_tree(folder)
+
+    def _add_tree(self, folder: Path) -> list[Path]:
+        """Watch a folder and its subfolders; return the files already there."""
+        files = []
+        for root, _, names in os.walk(folder):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd >= 0:
+                self._folders[wd] = Path(root)
+            files.extend(Path(root) / name for name in names)
+        return files
+
+    def wait(self, timeout: float) -> set[Path]:
+        """Wait up to `timeout` seconds for events.
+
+        Args:
+            timeout: Maximum seconds to wait.
+
+        Returns:
+            Paths of files that appeared or were written.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed: set[Path] = set()
+        buffer = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: fall back to one full rescan
+                changed.update(path for path in self.folder.rglob("*"))
+            elif wd in self._folders and name:
+                path = self._folders[wd] / os.fsdecode(name)
+                if mask & IN_ISDIR:
+                    # New subfolder: watch it and pick up files already inside
+                    changed.update(self._add_tree(path))
+                else:
+                    changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        """Release the inotify file descriptor."""
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Report new or changed files by rescanning a folder tree."""
+
+    def __init__(self, folder: Path) -> None:
+        """Take the initial snapshot of a folder.
+
+        Args:
+            folder: Folder to watch.
+        """
+        self.folder = folder
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        """Return the (size, mtime) signature of every file in the folder."""
+        snapshot = {}
+        for path in self.folder.rglob("*"):
+            signature = _signature(path)
+            if signature is not None:
+                snapshot[path] = signature
+        return snapshot
+
+    def wait(self, timeout: float) -> set[Path]:
+        """Sleep for `timeout` seconds, then rescan.
+
+        Args:
+            timeout: Seconds to wait before rescanning.
+
+        Returns:
+            Paths of files that are new or changed since the last scan.
+        """
+        time.sleep(timeout)
+        snapshot = self._scan()
+        changed = {
+            path
+            for path, signature in snapshot.items()
+            if self._snapshot.get(path) != signature
+        }
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+class ArrivalTracker:
+    """Debounce arriving files until they are fully written."""
+
+    def __init__(self, debounce_s: float) -> None:
+        """Start with no pending files.
+
+        Args:
+            debounce_s: Seconds a file's size and mtime must stay unchanged.
+        """
+        self.debounce_s = debounce_s
+        # Path -> [arrival time, (size, mtime), time of last change]
+        self._pending: dict[Path, list] = {}
+        # Signature of each file already handed out, to ignore repeat events
+        self._handled: dict[Path, tuple[int, int]] = {}
+
+    def mark_handled(self, path: Path) -> None:
+        """Ignore a file unless it changes (e.g., completed by a previous run)."""
+        signature = _signature(path)
+        if signature is not None:
+            self._handled[path] = signature
+
+    def observe(self, paths: set[Path] | list[Path], now: float) -> None:
+        """Register files that appeared or changed.
+
+        Args:
+            paths: Candidate file paths.
+            now: Current `time.monotonic()`.
+        """
+        for path in paths:
+            signature = _signature(path)
+            if signature is None or self._handled.get(path) == signature:
+                continue
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = [now, signature, now]
+            elif entry[1] != signature:
+                entry[1:] = [signature, now]
+
+    def ready(self, now: float) -> list[tuple[Path, float]]:
+        """Return files that have stayed unchanged for the debounce interval.
+
+        Args:
+            now: Current `time.monotonic()`.
+
+        Returns:
+            (path, arrival time) of each settled file, in arrival order.
+        """
+        settled = []
+        for path, entry in list(self._pending.items()):
+            signature = _signature(path)
+            if signature is None:
+                # Removed (or renamed) before it settled
+                del self._pending[path]
+            elif signature != entry[1]:
+                entry[1:] = [signature, now]
+            elif now - entry[2] >= self.debounce_s:
+                del self._pending[path]
+                self._handled[path] = signature
+                settled.append((path, entry[0]))
+        return sorted(settled, key=lambda item: item[1])
+
+    def next_deadline(self) -> float | None:
+        """Return the earliest time a pending file could settle (or None)."""
+        if not self._pending:
+            return None
+        return min(entry[2] for entry in self._pending.values()) + self.debounce_s
+
+
+def _signature(path: Path) -> tuple[int, int] | None:
+    """Return a regular file's (size, mtime_ns), or None if it is not one."""
+    try:
+        info = path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(info.st_mode):
+        return None
+    return info.st_size, info.st_mtime_ns
+
+
+def make_watcher(folder: Path, use_inotify: bool = True):
+    """Return an inotify watcher, or a polling watcher if inotify is unavailable.
+
+    Args:
+        folder: Folder to watch.
+        use_inotify: Try inotify first.
+
+    Returns:
+        `InotifyWatcher` or `PollingWatcher`.
+    """
+    if use_inotify:
+        try:
+            return InotifyWatcher(folder)
+        except OSError as e:
+            print(f"[!] {e}; polling the input folder instead")
+    return PollingWatcher(folder)
+
+
+def watch_folder(
+    model,
+    input_folder: Path,
+    output_path: str | Path | None,
+    debounce_s: float = constants.WATCH_DEBOUNCE_S,
+    poll_interval_s: float = constants.WATCH_POLL_INTERVAL_S,
+    run_journal: RunJournal | None = None,
+    resume: bool = False,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    use_inotify: bool = True,
+    stop: threading.Event | None = None,
+) -> None:
+    """Analyze images as they arrive in a folder until stopped.
+
+    Images already in the folder are analyzed first (minus, when resuming,
+    those the run journal marks as completed).
+
+    Args:
+        model: Loaded BDAPipeline (kept resident between arrivals).
+        input_folder: Folder to watch.
+        output_path: Path of output folder. Uses default if None/empty.
+        debounce_s: Seconds a new file must stay unchanged before analysis.
+        poll_interval_s: Rescan interval when polling.
+        run_journal: Optional run manifest that records each exported image.
+        resume: Skip existing images the run journal marks as completed.
+        shard_index: Index of the shard to analyze.
+        shard_count: Total number of shards.
+        use_inotify: Use inotify when available (else always poll).
+        stop: Optional event that ends the loop (runs until interrupted if None).
+    """
+    stop = stop or threading.Event()
+    watcher = make_watcher(input_folder, use_inotify)
+    tracker = ArrivalTracker(debounce_s)
+
+    def accept(path: Path) -> bool:
+        return path.suffix.lower() in constants.IMAGE_EXTENSIONS and inputs.in_shard(
+            path, input_folder, shard_index, shard_count
+        )
+
+    existing = sorted(path for path in input_folder.rglob("*") if accept(path))
+    if resume and run_journal is not None:
+        for path in run_journal.completed(existing):
+            tracker.mark_handled(path)
+    tracker.observe(existing, time.monotonic())
+
+    kind = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+    print(f"[*] Watching {input_folder.resolve()} ({kind}); press Ctrl+C to stop")
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            deadline = tracker.next_deadline()
+            timeout = poll_interval_s if deadline is None else deadline - now
+            changed = watcher.wait(max(0.01, min(timeout, poll_interval_s)))
+            tracker.observe(
+                {path for path in changed if accept(path)}, time.monotonic()
+            )
+
+            ready = tracker.ready(time.monotonic())
+            if not ready:
+                continue
+            analyzed = _analyze_arrivals(model, ready, output_path, run_journal)
+
+            finished = time.monotonic()
+            for path, arrived in analyzed:
+                latency_ms = (finished - arrived) * 1000
+                model.metrics.observe("watch.latency_ms", latency_ms)
+                print(f"[*] Result for {path.name} {latency_ms:.0f} ms after arrival")
+    finally:
+        watcher.close()
+
+
+def _analyze_arrivals(
+    model,
+    ready: list[tuple[Path, float]],
+    output_path: str | Path | None,
+    run_journal: RunJournal | None,
+) -> list[tuple[Path, float]]:
+    """Analyze settled files, isolating any that fail.
+
+    If the batch fails (e.g., a truncated or corrupt upload), the images it
+    did not finish are retried one at a time; those that fail again are
+    reported and journaled as failed. The tracker already counts them as
+    handled, so they are only retried if the file changes.
+
+    Returns:
+        (path, arrival time) of each analyzed file.
+    """
+    paths = [path for path, _ in ready]
+    try:
+        app.analyze_paths(model, paths, output_path, run_journal=run_journal)
+        return ready
+    except Exception as e:
+        print(f"[!] Analysis failed ({e}); retrying images one at a time")
+
+    analyzed = []
+    for path, arrived in ready:
+        if run_journal is not None and run_journal.lookup(path) is not None:
+            # Exported before the batch failed
+            analyzed.append((path, arrived))
+            continue
+        try:
+            app.analyze_paths(model, [path], output_path, run_journal=run_journal)
+        except Exception as e:
+            print(f"[!] Skipping {path}: {e}")
+            model.metrics.increment("watch.failed")
+            if run_journal is not None:
+                run_journal.record(path, "failed")
+        else:
+            analyzed.append((path, arrived))
+    return analyzed
@@ -0,0 +1,263 @@
+"""Multi-process data-parallel analysis.
+
+`bda-svc --workers N` starts N worker processes, each loading its own
+BDAPipeline on its own GPU (round-robin over the visible GPUs) or, on CPU-only
+hosts, its own set of CPU cores. Workers pull image paths from a shared queue
+in batches of the VLM batch size and send the model responses back to the
+parent, which exports results and reports progress.
+"""
+
+import multiprocessing
+import os
+import queue
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from bda_svc import app, export
+from bda_svc.journal import RunJournal
+
+# How often the parent checks that workers are still alive while waiting
+POLL_INTERVAL_S = 1.0
+
+
+@dataclass(frozen=True)
+class WorkerDevice:
+    """Hardware assigned to one worker process."""
+
+    gpu: int | None
+    cpus: tuple[int, ...]
+
+
+def plan_devices(workers: int, gpu_count: int, cpus: list[int]) -> list[WorkerDevice]:
+    """Assign each worker a GPU and a set of CPU cores.
+
+    GPUs are shared round-robin when there are more workers than GPUs. CPU
+    cores are split into contiguous, disjoint sets (shared round-robin when
+    there are more workers than cores).
+
+    Args:
+        workers: Number of worker processes.
+        gpu_count: Number of visible GPUs (0 on CPU-only hosts).
+        cpus: CPU cores available to this process.
+
+    Returns:
+        Device assignment for each worker.
+    """
+    devices = []
+    for worker in range(workers):
+        if len(cpus) >= workers:
+            share, extra = divmod(len(cpus), workers)
+            start = worker * share + min(worker, extra)
+            worker_cpus = cpus[start : start + share + (worker < extra)]
+        else:
+            worker_cpus = [cpus[worker % len(cpus)]] if cpus else []
+        devices.append(
+            WorkerDevice(
+                gpu=worker % gpu_count if gpu_count else None,
+                cpus=tuple(worker_cpus),
+            )
+        )
+    return devices
+
+
+def visible_gpu(index: int, mask: str | None) -> str:
+    """Return the `CUDA_VISIBLE_DEVICES` entry of a visible GPU.
+
+    Args:
+        index: GPU index among the GPUs visible to the parent.
+        mask: The parent's `CUDA_VISIBLE_DEVICES` (None or empty if unset).
+
+    Returns:
+        The mask entry at `index` (a device number or UUID), or the index
+        itself when no mask is set.
+    """
+    entries = [entry.strip() for entry in (mask or "").split(",") if entry.strip()]
+    return entries[index] if index < len(entries) else str(index)
+
+
+def _visible_devices() -> tuple[int, list[int]]:
+    """Return the visible GPU count and the CPU cores available to this process."""
+    # Lazy load heavy packages
+    import torch
+
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    return torch.cuda.device_count(), cpus
+
+
+def _pin_device(device: WorkerDevice) -> None:
+    """Restrict the current process to its GPU and CPU cores.
+
+    Must run before torch is imported so that the environment takes effect.
+    GPU indices count the GPUs visible to the parent, so they are mapped
+    through an inherited `CUDA_VISIBLE_DEVICES` mask.
+    """
+    if device.gpu is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = visible_gpu(
+            device.gpu, os.environ.get("CUDA_VISIBLE_DEVICES")
+        )
+    if device.cpus:
+        os.environ["OMP_NUM_THREADS"] = str(len(device.cpus))
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, device.cpus)
+
+
+def _worker_main(
+    worker_id: int,
+    device: WorkerDevice,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    model_factory: Callable | None,
+) -> None:
+    """Analyze batches of (index, path) tasks until a None sentinel arrives.
+
+    Messages sent to the parent:
+        ("result", index, worker_id, response)
+        ("failed", index, worker_id, error)
+        ("done", worker_id, metrics summary)
+        ("crashed", worker_id, error) if the pipeline cannot be loaded
+    """
+    _pin_device(device)
+    try:
+        model = (model_factory or app.load_pipeline)()
+    except Exception as e:
+        results.put(("crashed", worker_id, f"Pipeline failed to load: {e}"))
+        return
+
+    batch_size = max(1, model.vlm.batch_size)
+    finished = False
+    while not finished:
+        batch = []
+        while len(batch) < batch_size:
+            try:
+                # Block for the first task only; send partial batches onward
+                task = tasks.get() if not batch else tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                finished = True
+                break
+            batch.append(task)
+        if not batch:
+            continue
+
+        indices = [index for index, _ in batch]
+        try:
+            responses = model.analyze_batch([path for _, path in batch])
+        except Exception as e:
+            for index in indices:
+                results.put(("failed", index, worker_id, str(e)))
+        else:
+            for index, response in zip(indices, responses, strict=True):
+                results.put(("result", index, worker_id, response))
+
+    model.close()
+    results.put(("done", worker_id, model.metrics.summary()))
+
+
+def analyze_parallel(
+    input_paths: list[Path],
+    output_path: str | Path | None,
+    workers: int,
+    model_factory: Callable | None = None,
+    run_journal: RunJournal | None = None,
+) -> list[Path]:
+    """Analyze images across worker processes and export each result.
+
+    Args:
+        input_paths: Image paths to analyze.
+        output_path: Path of output folder. Uses default if None/empty.
+        workers: Number of worker processes.
+        model_factory: Picklable callable that builds a pipeline in each
+            worker (loads BDAPipeline from config if None).
+        run_journal: Optional run manifest that records each exported or
+            failed image.
+
+    Returns:
+        Paths of the exported JSON files, in input order.
+
+    Raises:
+        SystemExit: If any image could not be analyzed.
+    """
+    workers = max(1, min(workers, len(input_paths)))
+    if model_factory is None:
+        gpu_count, cpus = _visible_devices()
+    else:
+        gpu_count, cpus = 0, []
+
+    # Spawn (not fork) so that each worker initializes CUDA independently
+    context = multiprocessing.get_context("spawn")
+    tasks, results = context.Queue(), context.Queue()
+    for task in enumerate(map(str, input_paths)):
+        tasks.put(task)
+    for _ in range(workers):
+        tasks.put(None)
+
+    processes = [
+        context.Process(
+            target=_worker_main,
+            args=(worker_id, device, tasks, results, model_factory),
+            name=f"bda-worker-{worker_id}",
+            daemon=True,
+        )
+        for worker_id, device in enumerate(plan_devices(workers, gpu_count, cpus))
+    ]
+    for process in processes:
+        process.start()
+
+    exported: dict[int, Path] = {}
+    errors: dict[int, str] = {}
+    summaries: dict[int, str] = {}
+    running = set(range(workers))
+    try:
+        # Each worker reports "done" after its last result, so draining until
+        # every worker has reported (or died) collects all results
+        while running:
+            try:
+                kind, *payload = results.get(timeout=POLL_INTERVAL_S)
+            except queue.Empty:
+                running &= {i for i, p in enumerate(processes) if p.is_alive()}
+                continue
+
+            if kind in ("result", "failed"):
+                index, worker_id, value = payload
+                done = len(exported) + len(errors) + 1
+                print(
+                    f"\nProcessed ({done}/{len(input_paths)}, worker {worker_id}): "
+                    f"{input_paths[index]}\n{'-' * 80}"
+                )
+                if kind == "result":
+                    exported[index] = export.save_json(
+                        value, input_paths[index], output_path
+                    )
+                else:
+                    errors[index] = value
+                    print(f"[!] Analysis failed: {value}")
+                if run_journal is not None:
+                    run_journal.record(
+                        input_paths[index],
+                        "done" if kind == "result" else "failed",
+                        exported.get(index),
+                    )
+            elif kind == "done":
+                worker_id, summaries[worker_id] = payload
+                running.discard(worker_id)
+            else:
+                worker_id, error = payload
+                print(f"[!] Worker {worker_id}: {error}")
+                running.discard(worker_id)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    for worker_id, summary in sorted(summaries.items()):
+        app.print_summary(summary, f"Worker {worker_id} summary")
+
+    missing = len(input_paths) - len(exported)
+    if missing:
+        sys.exit(f"\n{missing} of {len(input_paths)} images were not analyzed.\n")
+
+    return [exported[index] for index in range(len(input_paths))]
@@ -0,0 +1,76 @@
+"""Shared test fixtures."""
+
+import json
+import os
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from bda_svc.metrics import RunMetrics
+
+
+class FakePipeline:
+    """Stand-in for BDAPipeline that answers with each image's size.
+
+    Images may be paths, streams, or decoded images; each answer holds the
+    image's width and height and the id of the process that analyzed it.
+    """
+
+    def __init__(self, batch_size: int = 2, fail_on: str | None = None) -> None:
+        """Start with empty metrics and records.
+
+        Args:
+            batch_size: Reported VLM batch size.
+            fail_on: File name of an image whose batch raises.
+        """
+        self.vlm = SimpleNamespace(batch_size=batch_size)
+        self.metrics = RunMetrics()
+        self.fail_on = fail_on
+        self.prepared: list[Path] = []
+        # Number of prepared images when each batch started
+        self.prepared_at_batch: list[int] = []
+        self.batches: list[list] = []
+        # Analysis blocks until `release` is set (it starts set)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def prepare(self, image_path: Path) -> Image.Image:
+        """Decode an image as RGB."""
+        self.prepared.append(image_path)
+        with Image.open(image_path) as image:
+            return image.convert("RGB")
+
+    def analyze_batch(self, images: list) -> list[str]:
+        """Answer a batch of images."""
+        self.started.set()
+        self.release.wait(timeout=5)
+        self.metrics.count("batch_size", len(images))
+        self.prepared_at_batch.append(len(self.prepared))
+        self.batches.append(list(images))
+        if any(
+            isinstance(image, str | Path) and Path(image).name == self.fail_on
+            for image in images
+        ):
+            raise RuntimeError("out of memory")
+        return [json.dumps({**_size(image), "pid": os.getpid()}) for image in images]
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+def _size(image) -> dict:
+    """Return the width and height of an image, path, or stream."""
+    if isinstance(image, Image.Image):
+        return {"width": image.width, "height": image.height}
+    with Image.open(image) as opened:
+        return {"width": opened.width, "height": opened.height}
+
+
+@pytest.fixture
+def fake_pipeline() -> type[FakePipeline]:
+    """Return the fake pipeline class (call it to build a pipeline)."""
+    return FakePipeline
@@ -0,0 +1,201 @@
+"""HTTP inference API test suite (runs on localhost against a fake pipeline)."""
+
+import asyncio
+import io
+import json
+
+from PIL import Image
+
+from bda_svc import api, constants
+from bda_svc.api import AnalysisService
+
+
+def png(width: int = 8, height: int = 8) -> bytes:
+    """Encode a small PNG image."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def request(
+    port: int, method: str, path: str, body: bytes = b""
+) -> tuple[int, dict]:
+    """Send one HTTP request to the local service and parse the JSON reply."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+async def wait_for_result(port: int, job_id: str) -> dict:
+    """Poll a job until it finishes."""
+    for _ in range(200):
+        _, reply = await request(port, "GET", f"/results/{job_id}")
+        if reply["status"] in ("done", "error"):
+            return reply
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def run_service(scenario, model, **kwargs):
+    """Run a scenario coroutine against a service on a free local port."""
+
+    async def main():
+        service = AnalysisService(model, **kwargs)
+        await service.start("127.0.0.1", 0)
+        try:
+            return await scenario(service)
+        finally:
+            model.release.set()
+            await service.close()
+
+    return asyncio.run(main())
+
+
+# ---------------------------------------------------------------------------
+# Test: Jobs (POST /analyze, GET /results)
+# ---------------------------------------------------------------------------
+
+
+def test_analyze_returns_result_by_id(fake_pipeline):
+    """An accepted image is analyzed and its result is served by job id."""
+
+    async def scenario(service):
+        status, job = await request(service.port, "POST", "/analyze", png(5, 3))
+        result = await wait_for_result(service.port, job["id"])
+        return status, job, result
+
+    status, job, result = run_service(scenario, fake_pipeline())
+
+    assert status == 202 and job["status"] == "queued"
+    assert result["id"] == job["id"] and result["status"] == "done"
+    assert (result["result"]["width"], result["result"]["height"]) == (5, 3)
+
+
+def test_concurrent_requests_share_a_batch(fake_pipeline):
+    """Images arriving together are analyzed in one batch."""
+    model = fake_pipeline(batch_size=3)
+
+    async def scenario(service):
+        replies = await asyncio.gather(
+            *(request(service.port, "POST", "/analyze", png()) for _ in range(3))
+        )
+        return [await wait_for_result(service.port, job["id"]) for _, job in replies]
+
+    results = run_service(scenario, model, max_wait_ms=2000)
+
+    assert [result["status"] for result in results] == ["done"] * 3
+    assert [len(batch) for batch in model.batches] == [3]
+
+
+def test_a_failing_image_fails_only_its_own_job(fake_pipeline):
+    """When a batch fails, its jobs are retried alone; only the bad one errors."""
+    model = fake_pipeline(batch_size=3)
+    analyze_batch = model.analyze_batch
+
+    def fail_on_width_7(streams):
+        if any(Image.open(stream).width == 7 for stream in streams):
+            raise OSError("image file is truncated")
+        for stream in streams:
+            stream.seek(0)
+        return analyze_batch(streams)
+
+    model.analyze_batch = fail_on_width_7
+
+    async def scenario(service):
+        replies = await asyncio.gather(
+            *(
+                request(service.port, "POST", "/analyze", png(width))
+                for width in (5, 7, 9)
+            )
+        )
+        return [await wait_for_result(service.port, job["id"]) for _, job in replies]
+
+    results = run_service(scenario, model, max_wait_ms=2000)
+
+    assert [result["status"] for result in results] == ["done", "error", "done"]
+    assert "truncated" in results[1]["error"]
+    assert model.metrics.snapshot()["counters"]["api.failed"] == 1
+
+
+def test_invalid_requests_are_rejected(fake_pipeline):
+    """Bad images, unknown ids, routes, and methods get error statuses."""
+
+    async def scenario(service):
+        return [
+            (await request(service.port, *args))[0]
+            for args in [
+                ("POST", "/analyze", b"not an image"),
+                ("GET", "/results/missing"),
+                ("GET", "/analyze"),
+                ("GET", "/unknown"),
+            ]
+        ]
+
+    assert run_service(scenario, fake_pipeline()) == [400, 404, 405, 404]
+
+
+# ---------------------------------------------------------------------------
+# Test: Backpressure and metrics (GET /metrics)
+# ---------------------------------------------------------------------------
+
+
+def test_full_queue_rejects_requests_and_reports_metrics(fake_pipeline):
+    """Requests beyond the queue capacity get 503 and are counted."""
+    model = fake_pipeline(batch_size=1)
+    model.release.clear()
+
+    async def scenario(service):
+        # First image occupies the worker, second fills the queue
+        _, first = await request(service.port, "POST", "/analyze", png())
+        await asyncio.to_thread(model.started.wait, 5)
+        _, second = await request(service.port, "POST", "/analyze", png())
+        rejected, _ = await request(service.port, "POST", "/analyze", png())
+        _, busy = await request(service.port, "GET", "/metrics")
+
+        model.release.set()
+        for job in (first, second):
+            await wait_for_result(service.port, job["id"])
+        _, idle = await request(service.port, "GET", "/metrics")
+        return rejected, busy, idle
+
+    rejected, busy, idle = run_service(scenario, model, queue_size=1)
+
+    assert rejected == 503
+    assert busy["queue"] == {"depth": 1, "capacity": 1, "rejected": 1}
+    assert idle["queue"]["depth"] == 0
+    assert idle["samples"]["api.latency_ms"]["count"] == 2
+    assert {"p50", "p95"} <= idle["samples"]["api.latency_ms"].keys()
+
+
+# ---------------------------------------------------------------------------
+# Test: Command-line settings (serve_http)
+# ---------------------------------------------------------------------------
+
+
+def test_explicit_port_zero_is_not_replaced_by_the_default(fake_pipeline, monkeypatch):
+    """`--port 0` asks for a free port rather than the default 8080."""
+    started = []
+
+    async def start(self, host, port):
+        started.append((host, port, self.queue_size))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(AnalysisService, "start", start)
+    model = fake_pipeline()
+
+    api.serve_http(None, 0, None, model=model)
+    api.serve_http("0.0.0.0", None, 3, model=model)
+
+    assert started == [
+        (constants.DEFAULT_HTTP_HOST, 0, constants.DEFAULT_HTTP_QUEUE_SIZE),
+        ("0.0.0.0", constants.DEFAULT_HTTP_PORT, 3),
+    ]
@@ -1,8 +1,11 @@
 """Main test suite."""
 
+import json
+
 import pytest
+from PIL import Image
 
-from bda_svc import inputs
+from bda_svc import app, cli, inputs, journal
 
 # ---------------------------------------------------------------------------
 # Test: Input Folder Validation (get_input_folder)
@@ -45,6 +48,38 @@ def test_exits_if_folder_missing():
         inputs.get_input_folder(bad_path)
 
 
+# ---------------------------------------------------------------------------
+# Test: Command Line (get_args)
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    ("argv", "expected"),
+    [
+        (["-i", "in", "-o", "out", "submit"], ("in", "out")),
+        (["submit", "-i", "in", "-o", "out"], ("in", "out")),
+        (["-i", "in", "submit", "-o", "out"], ("in", "out")),
+        (["submit"], (None, None)),
+    ],
+)
+def test_submit_paths_may_come_before_or_after_the_subcommand(
+    monkeypatch, argv, expected
+):
+    """`-i`/`-o` given before `submit` are not reset by the subcommand."""
+    monkeypatch.setattr("sys.argv", ["bda-svc", *argv])
+
+    args = cli.get_args()
+
+    assert (args.input, args.output) == expected
+
+
+def test_merge_shards_keeps_an_input_given_first(monkeypatch):
+    """`bda-svc -i X merge-shards ...` still checks folder X."""
+    monkeypatch.setattr("sys.argv", ["bda-svc", "-i", "in", "merge-shards", "m.json"])
+
+    assert cli.get_args().input == "in"
+
+
 # ---------------------------------------------------------------------------
 # Test: File Discovery (get_input_paths)
 # ---------------------------------------------------------------------------
@@ -68,8 +103,118 @@ def test_get_input_paths_finds_images(tmp_path):
     assert "image2.jpg" in filenames
 
 
+def test_get_input_paths_finds_videos(tmp_path):
+    """Video files are inputs too (decoded later as streams of frames)."""
+    (tmp_path / "clip.MP4").touch()
+    (tmp_path / "image.png").touch()
+
+    files = inputs.get_input_paths(tmp_path)
+
+    assert [f.name for f in files] == ["clip.MP4", "image.png"]
+
+
 def test_get_input_paths_empty_exits(tmp_path):
     """It should SystemExit if the folder has no valid images."""
     # Folder exists but is empty
     with pytest.raises(SystemExit):
         inputs.get_input_paths(tmp_path)
+
+
+# ---------------------------------------------------------------------------
+# Test: Overlapped analysis (analyze_paths)
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """Seven grayscale images of increasing width."""
+    paths = []
+    for i in range(7):
+        path = tmp_path / f"image{i}.png"
+        Image.new("L", (i + 1, 4)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_analyze_paths_exports_in_input_order(fake_pipeline, image_paths, tmp_path):
+    """Decoded images reach the model and results are written in order."""
+    model = fake_pipeline()
+
+    exported = app.analyze_paths(model, image_paths, tmp_path / "out", prefetch=2)
+
+    widths = [json.loads(path.read_text())["width"] for path in exported]
+    assert widths == list(range(1, 8))
+    assert [path.name.split("_")[0] for path in exported] == [
+        path.stem for path in image_paths
+    ]
+    assert all(image.mode == "RGB" for batch in model.batches for image in batch)
+    assert model.metrics.snapshot()["samples"]["io.decode_wait_ms"]["count"] == 4
+
+
+def test_analyze_paths_bounds_decode_ahead(fake_pipeline, image_paths, tmp_path):
+    """No more than one batch plus `prefetch` images are decoded ahead."""
+    model = fake_pipeline()
+
+    app.analyze_paths(model, image_paths, tmp_path / "out", prefetch=2)
+
+    # Decoded counts when each batch (of 2) starts: at most 2 * (i + 1) + 2
+    assert all(
+        count <= 2 * (i + 1) + 2 for i, count in enumerate(model.prepared_at_batch)
+    )
+
+
+def test_analyze_paths_raises_write_errors(fake_pipeline, image_paths, tmp_path):
+    """A failed export surfaces after the run instead of hanging the model."""
+    blocked = tmp_path / "not_a_folder"
+    blocked.touch()
+
+    with pytest.raises(FileExistsError):
+        app.analyze_paths(fake_pipeline(), image_paths, blocked)
+
+
+def test_analyze_paths_exports_cached_results_without_analysis(
+    fake_pipeline, image_paths, tmp_path
+):
+    """Prepared items that are cached results skip the model."""
+    model = fake_pipeline()
+    prepare = model.prepare
+    model.prepare = lambda path: "{}" if path.stem.endswith("0") else prepare(path)
+
+    exported = app.analyze_paths(model, image_paths[:2], tmp_path / "out")
+
+    assert json.loads(exported[0].read_text()) == {}
+    assert json.loads(exported[1].read_text())["width"] == 2
+    assert model.prepared == [image_paths[1]]
+
+
+def test_same_named_images_in_different_folders_keep_their_results(
+    fake_pipeline, tmp_path
+):
+    """Images sharing a file name are exported to distinct files."""
+    paths = []
+    for width, site in enumerate(["site_a", "site_b"], start=1):
+        (tmp_path / site).mkdir()
+        Image.new("L", (width, 4)).save(tmp_path / site / "image.png")
+        paths.append(tmp_path / site / "image.png")
+
+    exported = app.analyze_paths(fake_pipeline(), paths, tmp_path / "out")
+
+    assert len(set(exported)) == 2
+    assert [json.loads(path.read_text())["width"] for path in exported] == [1, 2]
+    assert len(list((tmp_path / "out").iterdir())) == 2
+
+
+def test_analyze_paths_records_exports_in_run_journal(
+    fake_pipeline, image_paths, tmp_path
+):
+    """Each exported image is journaled, so a resumed run skips it."""
+    output = tmp_path / "out"
+    run_journal = journal.RunJournal(output)
+
+    exported = app.analyze_paths(
+        fake_pipeline(), image_paths[:3], output, run_journal=run_journal
+    )
+    run_journal.close()
+
+    resumed = journal.RunJournal(output).completed(image_paths)
+    assert resumed == dict(zip(image_paths[:3], exported, strict=True))
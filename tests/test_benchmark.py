@@ -0,0 +1,87 @@
+"""Benchmark and doctrine utility test suite."""
+
+import pytest
+
+from bda_svc import benchmark
+from bda_svc.pipeline import utilities
+
+# ---------------------------------------------------------------------------
+# Test: Doctrine labels (doctrine_labels / format_doctrine_index)
+# ---------------------------------------------------------------------------
+
+
+def test_doctrine_labels_handle_separator_variants():
+    """Labels before spaced hyphens, em dashes, and qualifiers are extracted."""
+    labels = utilities.doctrine_labels(
+        ["bridges", "petroleum_oil_lubricants_storage_tanks"]
+    )
+
+    assert labels["bridges"][0] == "NO DAMAGE"
+    assert labels["bridges"][-1] == "DESTROYED"
+    assert labels["petroleum_oil_lubricants_storage_tanks"] == [
+        "NO DAMAGE",
+        "LIGHT-MODERATE DAMAGE",
+        "DESTROYED",
+    ]
+
+
+def test_doctrine_index_skips_unknown_categories():
+    """Unknown categories are ignored and an empty index has a fallback."""
+    index = utilities.format_doctrine_index(["roads", "not_a_category"])
+
+    assert index == "roads: NO DAMAGE | CRATERED | CUT"
+    assert utilities.format_doctrine_index([]) == "NO TARGET DOCTRINE AVAILABLE."
+
+
+# ---------------------------------------------------------------------------
+# Test: Output agreement (agreement)
+# ---------------------------------------------------------------------------
+
+
+def _report(*targets):
+    """Format (target_type, damage_category) pairs as a BDA JSON response."""
+    entries = ", ".join(
+        f'"target_{i}": {{"target_type": "{t}", "damage_category": "{d}"}}'
+        for i, (t, d) in enumerate(targets, start=1)
+    )
+    return f"{{{entries}}}"
+
+
+def test_agreement_identical_reports():
+    """Identical reports agree fully regardless of target order."""
+    a = _report(("roads", "CUT"), ("buildings", "DESTROYED"))
+    b = _report(("buildings", "destroyed"), ("Roads", "cut"))
+
+    score = benchmark.agreement(a, b)
+
+    assert score["parsed"] and score["count_match"]
+    assert score["target_type_f1"] == score["assessment_f1"] == 1.0
+
+
+def test_agreement_partial_match():
+    """Matching types with different damage only count toward target_type_f1."""
+    a = _report(("roads", "CUT"), ("roads", "CRATERED"))
+    b = _report(("roads", "CUT"))
+
+    score = benchmark.agreement(a, b)
+
+    assert not score["count_match"]
+    assert score["target_type_f1"] == pytest.approx(2 / 3)
+    assert score["assessment_f1"] == pytest.approx(2 / 3)
+
+
+def test_agreement_no_targets_on_both_sides():
+    """Two no-target responses agree."""
+    no_targets = '{"no_targets": {"logic": "no visible targets in image"}}'
+
+    score = benchmark.agreement(no_targets, no_targets)
+
+    assert score["assessment_f1"] == 1.0
+
+
+def test_agreement_unparseable_response():
+    """A response that is not a JSON object scores zero."""
+    score = benchmark.agreement(_report(("roads", "CUT")), "[1, 2]")
+
+    assert not score["parsed"]
+    assert score["assessment_f1"] == 0.0
@@ -0,0 +1,126 @@
+"""Model-side cache test suite."""
+
+import io
+
+from PIL import Image
+
+from bda_svc.metrics import RunMetrics
+from bda_svc.pipeline.cache import LRUCache, ResultCache, image_digest
+
+# ---------------------------------------------------------------------------
+# Test: LRU eviction (LRUCache)
+# ---------------------------------------------------------------------------
+
+
+def test_evicts_least_recently_used_entry():
+    """Reading an entry protects it from the next eviction."""
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_evicts_by_total_bytes():
+    """Entries are evicted until the byte budget is met."""
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "yyyy")
+    cache.put("c", "zzzz")
+
+    assert "a" not in cache
+    assert cache.nbytes == 8
+
+
+def test_skips_values_larger_than_budget():
+    """A value that can never fit is not cached and evicts nothing."""
+    cache = LRUCache(max_bytes=4, sizeof=len)
+    cache.put("a", "xx")
+    cache.put("big", "x" * 10)
+
+    assert "big" not in cache
+    assert cache.get("a") == "xx"
+
+
+def test_records_hits_misses_and_evictions():
+    """Cache events are counted under the cache name."""
+    metrics = RunMetrics()
+    cache = LRUCache(max_entries=1, metrics=metrics, name="test_cache")
+    cache.get("a")
+    cache.put("a", 1)
+    cache.get("a")
+    cache.put("b", 2)
+
+    counters = metrics.snapshot()["counters"]
+    assert counters == {
+        "test_cache.misses": 1,
+        "test_cache.hits": 1,
+        "test_cache.evictions": 1,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Test: Image identity (image_digest)
+# ---------------------------------------------------------------------------
+
+
+def test_image_digest_tracks_pixel_content():
+    """Identical pixels share a digest; different pixels do not."""
+    red = Image.new("RGB", (4, 4), "red")
+
+    assert image_digest(red) == image_digest(red.copy())
+    assert image_digest(red) != image_digest(Image.new("RGB", (4, 4), "blue"))
+    assert image_digest(red) != image_digest(Image.new("RGB", (2, 8), "red"))
+
+
+# ---------------------------------------------------------------------------
+# Test: On-disk results (ResultCache)
+# ---------------------------------------------------------------------------
+
+
+def test_result_cache_persists_across_instances(tmp_path):
+    """Entries written by one run are found by the next."""
+    ResultCache(tmp_path, "config").put("key", '{"no_targets": {}}')
+
+    cache = ResultCache(tmp_path, "config")
+
+    assert len(cache) == 1
+    assert cache.get("key") == '{"no_targets": {}}'
+    assert cache.get("other") is None
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    """Past the size cap the least recently used entry file is removed."""
+    cache = ResultCache(tmp_path, "config", max_bytes=60)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.get("a")
+
+    cache.put("c", "x" * 10)
+
+    assert not (tmp_path / "b.json").exists()
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.nbytes <= 60
+    assert cache.metrics.snapshot()["counters"]["result_cache.evictions"] == 1
+
+
+def test_result_keys_follow_content_and_fingerprint(tmp_path):
+    """Keys match for equal bytes in any form and change with the config."""
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"image{i}.png")
+        Image.new("RGB", (8, 8), (i, 0, 0)).save(paths[-1])
+    cache = ResultCache(tmp_path / "cache", "config", hash_threads=3)
+
+    keys = cache.keys(paths)
+
+    assert keys == [cache.key(path) for path in paths]
+    assert len(set(keys)) == 3
+    assert cache.key(io.BytesIO(paths[0].read_bytes())) == keys[0]
+    assert ResultCache(tmp_path / "cache", "other").key(paths[0]) != keys[0]
+    assert cache.key(paths[0], extra="fused") != keys[0]
@@ -0,0 +1,334 @@
+"""Constrained decoding test suite."""
+
+import json
+import string
+
+import pytest
+import torch
+
+from bda_svc.metrics import RunMetrics
+from bda_svc.pipeline.decoding import (
+    ChoiceGrammar,
+    ClassifyGrammar,
+    GenerationOptions,
+    Grammar,
+    GrammarConstraint,
+    ReportGrammar,
+    StructuralStop,
+    TokenBudget,
+    TokenLimit,
+    TokenVocabulary,
+)
+
+LABELS = {
+    "roads": ["NO DAMAGE", "CRATERED", "CUT"],
+    "buildings": ["NO DAMAGE", "DESTROYED"],
+}
+
+
+def accepts(grammar, text):
+    """Return whether a grammar accepts a complete output."""
+    state = grammar.initial()
+    for char in text:
+        state = grammar.advance(state, char)
+        if state is None:
+            return False
+    return grammar.accepts(state)
+
+
+def report(*targets):
+    """Format (target_type, damage_category) pairs as a pretty-printed report."""
+    return json.dumps(
+        {
+            f"target_{i}": {
+                "target_type": target_type,
+                "damage_category": damage,
+                "confidence_level": "probable",
+                "logic": 'Visible "crater" in roadway.',
+            }
+            for i, (target_type, damage) in enumerate(targets, start=1)
+        },
+        indent=4,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Test: Report schema (ReportGrammar)
+# ---------------------------------------------------------------------------
+
+
+def test_grammar_accepts_schema_outputs():
+    """Numbered targets and the canonical no-targets answer are accepted."""
+    grammar = ReportGrammar(LABELS)
+
+    assert accepts(grammar, report(("roads", "CUT"), ("buildings", "DESTROYED")))
+    assert accepts(
+        grammar, '{"no_targets": {"logic": "no visible targets in image"}}\n'
+    )
+
+
+def test_grammar_rejects_off_schema_outputs():
+    """Wrong labels, numbering, fences, and trailing text are rejected."""
+    grammar = ReportGrammar(LABELS)
+
+    assert not accepts(grammar, report(("roads", "DESTROYED")))
+    assert not accepts(grammar, report(("bridges", "NO DAMAGE")))
+    assert not accepts(grammar, report(("roads", "CUT")).replace("_1", "_2"))
+    assert not accepts(grammar, "```json\n" + report(("roads", "CUT")))
+    assert not accepts(grammar, report(("roads", "CUT")) + " Done.")
+    assert not accepts(grammar, report(("roads", "CUT"))[:-1])
+
+
+def test_grammar_without_categories_only_allows_no_targets():
+    """With nothing detected the only valid answer is no_targets."""
+    grammar = ReportGrammar({})
+
+    assert not accepts(grammar, report(("roads", "CUT")))
+    assert accepts(grammar, '{"no_targets": {"logic": "none"}}')
+
+
+# ---------------------------------------------------------------------------
+# Test: Label list (ClassifyGrammar)
+# ---------------------------------------------------------------------------
+
+
+def test_classify_grammar_accepts_label_lists():
+    """Comma-separated keys, with or without spaces, and empty answers pass."""
+    grammar = ClassifyGrammar(["roads", "buildings"])
+
+    assert accepts(grammar, "roads, buildings,roads")
+    assert accepts(grammar, "")
+    assert accepts(grammar, '""')
+
+
+def test_classify_grammar_rejects_other_text():
+    """Unknown keys, dangling commas, and extra text are rejected."""
+    grammar = ClassifyGrammar(["roads", "buildings"])
+
+    assert not accepts(grammar, "roads, bridges")
+    assert not accepts(grammar, "roads,")
+    assert not accepts(grammar, "roads\n")
+    assert not accepts(grammar, "Roads")
+    assert not accepts(grammar, '"roads"')
+
+
+def test_classify_grammar_caps_list_length():
+    """After max_labels labels only end-of-sequence is allowed."""
+    grammar = ClassifyGrammar(["roads"], max_labels=2)
+    vocabulary = TokenVocabulary(["roads", ",", " ", "<eos>"], 3, excluded_ids={3})
+
+    state = vocabulary.walk(grammar, grammar.initial(), "roads, roads")
+
+    assert vocabulary.allowed(grammar, state).tolist() == [3]
+    assert not accepts(grammar, "roads, roads, roads")
+
+
+# ---------------------------------------------------------------------------
+# Test: Token masks (TokenVocabulary)
+# ---------------------------------------------------------------------------
+
+
+def test_masks_are_not_shared_between_short_lived_grammars():
+    """A new grammar never reuses the masks of one that has been freed."""
+    vocabulary = TokenVocabulary(["yes", "no", "<eos>"], 2, excluded_ids={2})
+
+    for choice, token_id in [("yes", 0), ("no", 1)] * 3:
+        # Each grammar is dropped right away, so its id() is free for reuse
+        ids = vocabulary.allowed(ChoiceGrammar((choice,)), "")
+        assert ids.tolist() == [token_id]
+
+
+def test_grammars_must_implement_the_automaton():
+    """A grammar missing part of the automaton cannot be instantiated."""
+
+    class Partial(Grammar):
+        def initial(self):
+            return ""
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+# ---------------------------------------------------------------------------
+# Test: Logits masking (GrammarConstraint)
+# ---------------------------------------------------------------------------
+
+
+def test_constraint_forces_valid_json_from_random_scores():
+    """Greedy decoding over random scores still yields a schema-valid report."""
+    pieces = list('{}":, \n_' + string.ascii_letters + string.digits)
+    pieces += ['"target_', "target_type", "damage_category", "confidence_level"]
+    pieces += ["logic", "no_targets", " DAMAGE", "roads", '": "', '",', '"}']
+    eos = len(pieces)
+    vocabulary = TokenVocabulary(pieces + ["<eos>"], eos, excluded_ids={eos})
+    grammar = ReportGrammar(LABELS)
+    torch.manual_seed(0)
+
+    for _ in range(10):
+        constraint = GrammarConstraint([grammar, None], vocabulary)
+        input_ids = torch.zeros(2, 3, dtype=torch.long)
+        output = ""
+        # Favor short strings so that outputs finish within the step budget
+        bias = torch.zeros(len(pieces) + 1)
+        bias[[pieces.index('"'), pieces.index('",'), pieces.index('"}'), eos]] = 4
+
+        for _ in range(500):
+            scores = constraint(input_ids, torch.randn(2, len(pieces) + 1) + bias)
+            next_ids = scores.argmax(dim=-1)
+            input_ids = torch.cat([input_ids, next_ids[:, None]], dim=1)
+            if next_ids[0] == eos:
+                break
+            output += pieces[next_ids[0]]
+
+        assert accepts(grammar, output)
+        parsed = json.loads(output)
+        for entry in parsed.values():
+            if "target_type" in entry:
+                assert entry["damage_category"] in LABELS[entry["target_type"]]
+
+
+def test_constraint_falls_back_when_row_leaves_grammar():
+    """A row that emits a rejected token is released from the constraint."""
+    pieces = ["{", "x"]
+    vocabulary = TokenVocabulary(pieces + ["<eos>"], 2, excluded_ids={2})
+    metrics = RunMetrics()
+    constraint = GrammarConstraint([ReportGrammar(LABELS)], vocabulary, metrics)
+
+    scores = constraint(torch.zeros(1, 1, dtype=torch.long), torch.zeros(1, 3))
+    assert scores[0, 1] == float("-inf")
+
+    scores = constraint(torch.tensor([[0, 1]]), torch.zeros(1, 3))
+    assert torch.all(scores == 0)
+    assert metrics.snapshot()["counters"]["decoding.grammar_fallbacks"] == 1
+
+
+def test_constraint_follows_rejected_draft_tokens():
+    """Scoring draft candidates, then a rewound sequence, keeps states exact."""
+    pieces = ["roads", ",", " ", "x"]
+    vocabulary = TokenVocabulary(pieces + ["<eos>"], 4, excluded_ids={4})
+    prompt = [3, 3]
+    constraint = GrammarConstraint(
+        [ClassifyGrammar(["roads"])], vocabulary, prompt_length=len(prompt)
+    )
+
+    # Candidate "roads, " is scored, then only "roads" is accepted
+    constraint(torch.tensor([prompt + [0, 1, 2]]), torch.zeros(1, 5))
+    scores = constraint(torch.tensor([prompt + [0]]), torch.zeros(1, 5))
+
+    assert torch.isfinite(scores[0]).tolist() == [False, True, False, False, True]
+
+
+def test_constraint_treats_padding_as_finished():
+    """Rows padded after an early stop are not counted as fallbacks."""
+    vocabulary = TokenVocabulary(["<pad>", "{", "<eos>"], 2, excluded_ids={0, 2})
+    metrics = RunMetrics()
+    constraint = GrammarConstraint(
+        [ReportGrammar(LABELS)], vocabulary, metrics, pad_token_id=0
+    )
+
+    constraint(torch.zeros(1, 1, dtype=torch.long), torch.zeros(1, 3))
+    constraint(torch.tensor([[0, 0]]), torch.zeros(1, 3))
+
+    assert "decoding.grammar_fallbacks" not in metrics.snapshot()["counters"]
+
+
+# ---------------------------------------------------------------------------
+# Test: Structural early stop (StructuralStop)
+# ---------------------------------------------------------------------------
+
+
+def run_stop(kinds, rows):
+    """Feed token rows through StructuralStop and return per-step results."""
+    texts = dict(enumerate(sorted({piece for row in rows for piece in row})))
+    ids = {text: i for i, text in texts.items()}
+    stop = StructuralStop(kinds, texts)
+    steps = []
+    for step in range(1, len(rows[0]) + 1):
+        input_ids = torch.tensor([[ids[piece] for piece in row[:step]] for row in rows])
+        steps.append(stop(input_ids, None).tolist())
+    return stop, steps
+
+
+def test_stop_after_top_level_json_object():
+    """Braces inside strings do not close the object."""
+    row = ['{"a": ', '"}{', '"', "}", "\n", "extra"]
+
+    stop, steps = run_stop(["json"], [row])
+
+    assert [done for (done,) in steps] == [False, False, False, True, True, True]
+    assert stop.stopped == {0: 4}
+
+
+def test_stop_consumes_several_tokens_per_call():
+    """Assisted generation can add many tokens between checks."""
+    texts = {0: "<p>", 1: "{", 2: "}", 3: "x"}
+    stop = StructuralStop(["json"], texts, prompt_length=1)
+
+    assert stop(torch.tensor([[0, 3, 1, 3, 3]]), None).tolist() == [False]
+    assert stop(torch.tensor([[0, 3, 1, 2, 3]]), None).tolist() == [True]
+    assert stop.stopped == {0: 3}
+
+
+def test_stop_list_at_first_newline_after_content():
+    """Leading newlines are ignored; rows without a kind never stop."""
+    row = ["\n", "roads", ",", " buildings", "\n", "Note"]
+
+    stop, steps = run_stop(["list", None], [row, row])
+
+    assert [done for done, _ in steps] == [False, False, False, False, True, True]
+    assert not any(other for _, other in steps)
+    assert stop.stopped == {0: 5}
+
+
+# ---------------------------------------------------------------------------
+# Test: Token budgets (TokenBudget, TokenLimit)
+# ---------------------------------------------------------------------------
+
+
+def test_budget_scales_reports_with_detections():
+    """Reports start from the per-target prior, then learn the observed cost."""
+    budget = TokenBudget(ceiling=512, min_samples=4, margin=1.0, per_target_tokens=50)
+    report = GenerationOptions(stage="report", targets=2)
+
+    assert budget.limit(GenerationOptions(stage="report", targets=0)) == 50
+    assert budget.limit(report) == 150
+    assert budget.limit(GenerationOptions(stage="report", targets=20)) == 512
+
+    for targets in range(4):
+        budget.record(GenerationOptions(stage="report", targets=targets), 0, 512)
+        budget.record(GenerationOptions(stage="report", targets=targets), 0, 512)
+    assert budget.limit(report) == 32
+
+    for _ in range(8):
+        budget.record(report, 60, 150)
+    assert budget.limit(report) == 60
+
+
+def test_budget_learns_stage_lengths_and_recovers_from_truncation():
+    """Stages use the ceiling until learned; truncations grow the limit."""
+    metrics = RunMetrics()
+    budget = TokenBudget(
+        ceiling=512, min_samples=4, quantile=1.0, margin=1.5, metrics=metrics
+    )
+    classify = GenerationOptions(stage="classify")
+
+    assert budget.limit(classify) == 512
+    for _ in range(4):
+        budget.record(classify, 40, 512)
+    assert budget.limit(classify) == 60
+
+    budget.record(classify, 60, 60)
+    assert budget.limit(classify) == 90
+    assert metrics.snapshot()["counters"]["decoding.budget_exhausted.classify"] == 1
+
+
+def test_token_limit_stops_rows_independently():
+    """Each row stops once it reaches its own limit."""
+    limit = TokenLimit([1, 3], prompt_length=4)
+
+    steps = [
+        limit(torch.zeros(2, 4 + step, dtype=torch.long), None).tolist()
+        for step in range(1, 4)
+    ]
+
+    assert steps == [[True, False], [True, False], [True, True]]
@@ -0,0 +1,146 @@
+"""Near-duplicate suppression test suite."""
+
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from bda_svc import dedupe, export
+
+
+def make_scene(seed: int, size: int = 96) -> Image.Image:
+    """Create a random blocky RGB image (a distinct scene per seed)."""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (6, 6, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((size, size), Image.Resampling.NEAREST)
+
+
+@pytest.fixture
+def frames(tmp_path):
+    """Two scenes, each followed by a near-duplicate frame, then a third scene."""
+    noise = np.random.default_rng(0).integers(-4, 5, (96, 96, 3))
+    paths = []
+    for name, image in [
+        ("frame0.png", make_scene(1)),
+        ("frame1.jpg", make_scene(1)),
+        ("frame2.png", make_scene(2)),
+        ("frame3.png", make_scene(1).resize((120, 120))),
+        ("frame4.png", make_scene(2)),
+        ("frame5.png", make_scene(3)),
+    ]:
+        if name == "frame4.png":
+            pixels = np.asarray(image, dtype=np.int64) + noise
+            image = Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+        path = tmp_path / name
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Test: Perceptual hashes (dhash, phash)
+# ---------------------------------------------------------------------------
+
+
+def test_hashes_are_vectorized_and_robust_to_resizing():
+    """One 64-bit hash per frame; a resized copy hashes (nearly) the same."""
+    scenes = [make_scene(1), make_scene(1, size=200), make_scene(2)]
+    small = np.stack([np.asarray(s.convert("L").resize((9, 8)), float) for s in scenes])
+    large = np.stack(
+        [np.asarray(s.convert("L").resize((32, 32)), float) for s in scenes]
+    )
+
+    for hashes in (dedupe.dhash(small), dedupe.phash(large)):
+        distances = np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+        assert hashes.shape == (3,) and hashes.dtype == np.uint64
+        assert distances[0, 1] <= 4
+        assert distances[0, 2] > 10
+
+
+# ---------------------------------------------------------------------------
+# Test: Grouping (group_frames)
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("method", dedupe.HASH_METHODS)
+def test_near_duplicates_share_a_representative(frames, method):
+    """Re-encoded, resized, and noisy copies join their scene's group."""
+    groups = dedupe.group_frames(frames, threshold=8, method=method)
+
+    assert [group.representative.name for group in groups] == [
+        "frame0.png",
+        "frame2.png",
+        "frame5.png",
+    ]
+    assert [[path.name for path, _ in group.members] for group in groups] == [
+        ["frame1.jpg", "frame3.png"],
+        ["frame4.png"],
+        [],
+    ]
+
+
+def test_zero_threshold_keeps_distinct_frames(frames):
+    """Only exact hash matches are grouped at threshold 0."""
+    groups = dedupe.group_frames(frames, threshold=0, method="phash")
+
+    assert all(distance == 0 for group in groups for _, distance in group.members)
+    assert len(groups) >= 3
+
+
+def test_unreadable_frames_form_their_own_groups(frames, tmp_path):
+    """A corrupt frame is kept apart instead of aborting the whole grouping."""
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"\x89PNG truncated")
+    paths = [frames[0], broken, *frames[1:]]
+
+    groups = dedupe.group_frames(paths, threshold=8)
+
+    assert [group.representative.name for group in groups] == [
+        "frame0.png",
+        "broken.png",
+        "frame2.png",
+        "frame5.png",
+    ]
+    assert groups[1].members == []
+    assert [path.name for path, _ in groups[0].members] == ["frame1.jpg", "frame3.png"]
+
+
+def test_unknown_hash_method_is_rejected(frames):
+    """Hash methods are validated before any image is decoded."""
+    with pytest.raises(ValueError, match="Unknown hash method"):
+        dedupe.group_frames(frames, threshold=4, method="ahash")
+
+
+# ---------------------------------------------------------------------------
+# Test: Result propagation (propagate)
+# ---------------------------------------------------------------------------
+
+
+def test_results_are_propagated_with_provenance(frames, tmp_path):
+    """Members receive the representative's result and record where it came from."""
+    output = tmp_path / "out"
+    groups = dedupe.group_frames(frames, threshold=8)
+    exported = [
+        export.save_json(json.dumps({"scene": i}), group.representative, output)
+        for i, group in enumerate(groups)
+    ]
+
+    all_exported = dedupe.propagate(groups, frames, exported, output)
+
+    results = [json.loads(path.read_text()) for path in all_exported]
+    assert [result["scene"] for result in results] == [0, 0, 1, 0, 1, 2]
+    assert [result["dedupe"]["status"] for result in results] == [
+        "inferred",
+        "propagated",
+        "inferred",
+        "propagated",
+        "propagated",
+        "inferred",
+    ]
+    assert results[0]["dedupe"]["propagated_to"] == [
+        str(frames[1]),
+        str(frames[3]),
+    ]
+    assert results[4]["dedupe"]["source"] == str(frames[2])
+    assert results[4]["dedupe"]["hamming_distance"] <= 8
@@ -0,0 +1,102 @@
+"""Run manifest (resumable runs) test suite."""
+
+import json
+import os
+
+import pytest
+
+from bda_svc import journal
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Three image files with distinct contents."""
+    paths = []
+    for i in range(3):
+        path = tmp_path / "images" / f"image{i}.png"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(bytes([i]) * (i + 1))
+        paths.append(path)
+    return paths
+
+
+def export(output, image):
+    """Write a stand-in result file for an image."""
+    output.mkdir(exist_ok=True)
+    path = output / f"{image.stem}.json"
+    path.write_text("{}")
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Test: Recording and resuming (record, completed)
+# ---------------------------------------------------------------------------
+
+
+def test_completed_images_are_skipped_on_resume(images, tmp_path):
+    """Done entries survive a restart; failed and unrecorded images do not."""
+    output = tmp_path / "out"
+    run_journal = journal.RunJournal(output)
+    run_journal.record(images[0], "done", export(output, images[0]))
+    run_journal.record(images[1], "failed")
+    run_journal.close()
+
+    completed = journal.RunJournal(output).completed(images)
+
+    assert completed == {images[0]: output / "image0.json"}
+
+
+def test_changed_inputs_and_missing_outputs_are_redone(images, tmp_path):
+    """Size/mtime changes and deleted result files invalidate an entry."""
+    output = tmp_path / "out"
+    run_journal = journal.RunJournal(output)
+    for image in images:
+        run_journal.record(image, "done", export(output, image))
+    run_journal.close()
+
+    stat = images[0].stat()
+    os.utime(images[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    images[1].write_bytes(b"different size")
+    (output / "image2.json").unlink()
+
+    assert journal.RunJournal(output).completed(images) == {}
+
+
+def test_manifest_is_append_only_and_tolerates_a_torn_line(images, tmp_path):
+    """Later entries win, and a partial line from a crash is ignored."""
+    output = tmp_path / "out"
+    run_journal = journal.RunJournal(output)
+    run_journal.record(images[0], "failed")
+    run_journal.record(images[0], "done", export(output, images[0]))
+    run_journal.close()
+    with (output / journal.MANIFEST_NAME).open("a") as f:
+        f.write('{"path": "trunc')
+
+    lines = (output / journal.MANIFEST_NAME).read_text().splitlines()
+    entry = json.loads(lines[1])
+
+    assert len(lines) == 3
+    assert entry["status"] == "done" and entry["output"] == "image0.json"
+    assert entry["size"] == 1 and entry["path"] == str(images[0])
+    assert images[0] in journal.RunJournal(output).completed(images)
+
+
+def test_entries_after_a_torn_line_survive_the_next_resume(images, tmp_path):
+    """The torn tail is cut off before appending, so new entries stay intact."""
+    output = tmp_path / "out"
+    run_journal = journal.RunJournal(output)
+    run_journal.record(images[0], "done", export(output, images[0]))
+    run_journal.close()
+    with (output / journal.MANIFEST_NAME).open("a") as f:
+        f.write('{"path": "trunc')
+
+    resumed = journal.RunJournal(output)
+    resumed.record(images[1], "done", export(output, images[1]))
+    resumed.close()
+
+    lines = (output / journal.MANIFEST_NAME).read_text().splitlines()
+    assert [json.loads(line)["path"] for line in lines] == [
+        str(images[0]),
+        str(images[1]),
+    ]
+    assert set(journal.RunJournal(output).completed(images)) == set(images[:2])
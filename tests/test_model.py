@@ -0,0 +1,508 @@
+"""Pipeline test suite (runs against a fake VLM, no model weights needed)."""
+
+import asyncio
+import io
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from bda_svc.pipeline import model
+from bda_svc.pipeline.cache import ResultCache
+
+
+class FakeVLM:
+    """Stand-in for VLMRunner that records calls and returns canned text."""
+
+    def __init__(self, *args, batch_size: int = 1, **kwargs) -> None:
+        """Accept VLMRunner's constructor arguments without loading a model."""
+        self.batch_size = batch_size
+        self.calls: list[list[tuple]] = []
+        self.classify_response = "buildings, roads, not_a_category"
+        self.verify_response = "no"
+
+    def respond(self, prompt: str) -> str:
+        """Return a classify list, yes/no, or a JSON report depending on the prompt."""
+        if "comma-separated list of keys" in prompt:
+            return self.classify_response
+        if "yes or no" in prompt:
+            return self.verify_response
+        return '{"target_1": {"target_type": "buildings"}}'
+
+    def generate(self, image, prompt, system_prompt, options=None):
+        """Answer a single request."""
+        self.calls.append([(image, prompt, system_prompt, options)])
+        return self.respond(prompt)
+
+    def generate_batch(self, items):
+        """Answer a batch of requests."""
+        self.calls.append(list(items))
+        return [self.respond(item[1]) for item in items]
+
+    def start_conversations(self, items):
+        """Answer a batch of requests, returning the prompts as handles."""
+        return [
+            (response, [item[1]])
+            for response, item in zip(self.generate_batch(items), items, strict=True)
+        ]
+
+    def continue_conversation(self, conversation, prompt, options=None):
+        """Answer a follow-up turn, extending the handle."""
+        self.calls.append([(None, prompt, None, options)])
+        return self.respond(prompt), conversation + [prompt]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """BDAPipeline wired to a FakeVLM (without the on-disk result cache)."""
+    monkeypatch.setattr(model, "VLMRunner", FakeVLM)
+    pipeline = model.BDAPipeline()
+    pipeline.result_cache = None
+    return pipeline
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """Three small solid-color images on disk."""
+    paths = []
+    for i, color in enumerate(["red", "green", "blue"]):
+        path = tmp_path / f"image{i}.png"
+        Image.new("RGB", (8, 8), color).save(path)
+        paths.append(path)
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Test: Prompt layout (VLMRunner.build_messages)
+# ---------------------------------------------------------------------------
+
+
+def test_build_messages_places_image_first_by_default():
+    """Without a placeholder the image precedes the prompt text."""
+    image = Image.new("RGB", (8, 8))
+    messages = model.VLMRunner.build_messages(image, "describe", "system")
+
+    assert messages[0]["role"] == "system"
+    assert [c["type"] for c in messages[1]["content"]] == ["image", "text"]
+
+
+def test_build_messages_honors_image_placeholder():
+    """Text before {image} goes before the image so it can share a KV prefix."""
+    image = Image.new("RGB", (8, 8))
+    messages = model.VLMRunner.build_messages(image, "static {image} tail", None)
+
+    content = messages[0]["content"]
+    assert [c["type"] for c in content] == ["text", "image", "text"]
+    assert content[0]["text"] == "static "
+    assert content[2]["text"] == " tail"
+
+
+# ---------------------------------------------------------------------------
+# Test: Classify parsing (parse_detections)
+# ---------------------------------------------------------------------------
+
+
+def test_parse_detections_keeps_valid_categories(pipeline):
+    """Unknown labels are dropped, repeats and order are kept."""
+    detections = pipeline.parse_detections("Buildings, 'roads'\nbuildings, tanks")
+
+    assert [det.label for det in detections] == ["buildings", "roads", "buildings"]
+
+
+def test_parse_detections_empty_response(pipeline):
+    """An empty classify response yields no detections."""
+    assert pipeline.parse_detections("  ") == []
+
+
+# ---------------------------------------------------------------------------
+# Test: Report prompt (format_report_prompt)
+# ---------------------------------------------------------------------------
+
+
+def test_report_prompt_prefix_depends_only_on_category_set(pipeline):
+    """Doctrine before the image is shared by any detections with the same set."""
+    a = pipeline.format_report_prompt(
+        [model.Detection("roads"), model.Detection("buildings")]
+    )
+    b = pipeline.format_report_prompt(
+        [
+            model.Detection("buildings"),
+            model.Detection("buildings"),
+            model.Detection("roads"),
+        ]
+    )
+
+    prefix_a, _, tail_a = a.partition(model.IMAGE_PLACEHOLDER)
+    prefix_b, _, tail_b = b.partition(model.IMAGE_PLACEHOLDER)
+    assert prefix_a == prefix_b
+    assert "BUILDINGS" in prefix_a and "ROADS" in prefix_a
+    assert "roads, buildings" in tail_a
+    assert "buildings, buildings, roads" in tail_b
+
+
+def test_report_prompt_without_detections(pipeline):
+    """No detections yield the NONE category list and fallback doctrine."""
+    prompt = pipeline.format_report_prompt([])
+
+    assert "NO TARGET DOCTRINE AVAILABLE." in prompt
+    assert "NONE" in prompt
+
+
+def test_category_set_memos_are_bounded(pipeline):
+    """Doctrine text and report options are kept for recent category sets only."""
+    assert pipeline._doctrine_blocks.max_entries == model.CATEGORY_SET_ENTRIES
+    pipeline._doctrine_blocks.max_entries = 2
+    pipeline._report_options.max_entries = 2
+    sets = [frozenset({"roads"}), frozenset({"buildings"}), frozenset()]
+
+    for categories in sets:
+        pipeline.doctrine_block(categories)
+        pipeline.report_options(categories)
+
+    assert len(pipeline._doctrine_blocks) == len(pipeline._report_options) == 2
+    assert sets[0] not in pipeline._report_options
+    assert pipeline.report_options(sets[2]) is pipeline.report_options(sets[2])
+
+
+# ---------------------------------------------------------------------------
+# Test: Decode stage (open_image, pixel_budget, decode)
+# ---------------------------------------------------------------------------
+
+
+def test_pixel_budget_follows_processor_tiling():
+    """The budget is max_patches tiles, scaled by the margin squared."""
+    processor = SimpleNamespace(size={"height": 448, "width": 448}, max_patches=12)
+
+    assert model.pixel_budget(processor) == 12 * 448 * 448
+    assert model.pixel_budget(processor, margin=2.0) == 4 * 12 * 448 * 448
+    assert model.pixel_budget(SimpleNamespace()) is None
+
+
+@pytest.mark.parametrize("fmt, mode", [("JPEG", "RGB"), ("PNG", "P")])
+def test_open_image_downscales_to_budget(tmp_path, fmt, mode):
+    """Large images are reduced to the budget, keeping their aspect ratio."""
+    path = tmp_path / f"large.{fmt.lower()}"
+    Image.new(mode, (1600, 1200), 1).save(path, format=fmt)
+
+    image = model.open_image(path, max_pixels=120_000)
+
+    assert image.mode == "RGB"
+    assert image.width * image.height <= 120_000
+    assert image.size == (400, 300)
+    full = model.open_image(path)
+    assert full.size == (1600, 1200) and full.getpixel((0, 0)) is not None
+
+
+def test_decode_records_time_and_peak_rss(pipeline, image_paths):
+    """Decoding reports its latency and the process's peak memory."""
+    pipeline.decode(image_paths[0])
+
+    snapshot = pipeline.metrics.snapshot()
+    assert snapshot["samples"]["decode.ms"]["count"] == 1
+    assert snapshot["gauges"]["process.peak_rss_mb"]["peak"] > 0
+
+
+# ---------------------------------------------------------------------------
+# Test: Batched analysis (analyze_batch)
+# ---------------------------------------------------------------------------
+
+
+def test_analyze_batch_runs_two_batched_stages(pipeline, image_paths):
+    """Classify and report each run as one batch across all images."""
+    pipeline.close()
+    pipeline.scheduler = None
+
+    results = pipeline.analyze_batch(image_paths)
+
+    assert len(results) == len(image_paths)
+    assert len(pipeline.vlm.calls) == 2
+    classify_batch, report_batch = pipeline.vlm.calls
+    assert [item[1] for item in classify_batch] == [pipeline.classify_prompt] * len(
+        image_paths
+    )
+    assert all("buildings, roads" in item[1] for item in report_batch)
+
+
+def test_analyze_batch_matches_analyze(pipeline, image_paths):
+    """Batched results match per-image results in input order."""
+    batched = pipeline.analyze_batch(image_paths)
+    single = [pipeline.analyze(path) for path in image_paths]
+
+    assert batched == single
+
+
+def test_analyze_batch_accepts_image_streams(pipeline, image_paths):
+    """Encoded image bytes (e.g., HTTP uploads) analyze like files."""
+    streams = [io.BytesIO(Path(path).read_bytes()) for path in image_paths]
+
+    assert pipeline.analyze_batch(streams) == pipeline.analyze_batch(image_paths)
+
+
+def test_analyze_batch_through_scheduler(pipeline, image_paths):
+    """Scheduled analysis batches requests and records scheduler metrics."""
+    assert pipeline.scheduler is not None
+
+    results = pipeline.analyze_batch(image_paths)
+    pipeline.close()
+
+    assert results == [pipeline.vlm.respond("report")] * len(image_paths)
+    snapshot = pipeline.metrics.snapshot()
+    assert sum(snapshot["histograms"]["scheduler.batch_size"].values()) == len(
+        pipeline.vlm.calls
+    )
+    assert snapshot["samples"]["scheduler.wait_ms"]["count"] == 2 * len(image_paths)
+
+
+def test_result_cache_skips_unchanged_images(pipeline, image_paths, tmp_path):
+    """A rerun returns cached results without decoding or generating."""
+    pipeline.result_cache = ResultCache(
+        tmp_path / "cache", "config", metrics=pipeline.metrics
+    )
+    first = pipeline.analyze_batch(image_paths)
+    calls = len(pipeline.vlm.calls)
+
+    assert pipeline.analyze_batch(image_paths) == first
+    assert pipeline.analyze(image_paths[0]) == first[0]
+    assert len(pipeline.vlm.calls) == calls
+    assert pipeline.metrics.snapshot()["samples"]["decode.ms"]["count"] == 3
+
+    pipeline.mode = "fused"
+    pipeline.analyze(image_paths[0])
+    assert len(pipeline.vlm.calls) == calls + 1
+
+
+def test_prepare_returns_cached_result_or_keyed_image(pipeline, image_paths, tmp_path):
+    """Prepared images carry their key, so analyze_batch does not rehash them."""
+    pipeline.result_cache = ResultCache(
+        tmp_path / "cache", "config", metrics=pipeline.metrics
+    )
+
+    image = pipeline.prepare(image_paths[0])
+    result = pipeline.analyze_batch([image])[0]
+
+    assert pipeline.prepare(image_paths[0]) == result
+    assert pipeline.metrics.snapshot()["samples"]["result_cache.hash_ms"]["count"] == 2
+
+
+# ---------------------------------------------------------------------------
+# Test: Fused mode (format_fused_prompt)
+# ---------------------------------------------------------------------------
+
+
+def test_fused_prompt_covers_every_category(pipeline):
+    """The fused prompt lists all categories and their doctrine."""
+    full = pipeline.format_fused_prompt("full")
+    index = pipeline.format_fused_prompt("index")
+
+    for category in pipeline.categories:
+        assert category in full.partition(model.IMAGE_PLACEHOLDER)[2]
+        assert f"{category}: " in index
+    assert "PHYSICAL DAMAGE DEFINITIONS" in full
+    assert len(index) < len(full)
+
+
+def test_fused_prompt_rejects_unknown_doctrine(pipeline):
+    """An unknown doctrine option fails fast."""
+    with pytest.raises(ValueError):
+        pipeline.format_fused_prompt("summary")
+
+
+def test_fused_mode_makes_one_generation_per_image(pipeline, image_paths):
+    """Fused analysis skips the classify stage."""
+    pipeline.close()
+    pipeline.scheduler = None
+    pipeline.mode = "fused"
+
+    results = pipeline.analyze_batch(image_paths)
+
+    assert len(results) == len(image_paths)
+    assert len(pipeline.vlm.calls) == 1
+    assert [item[1] for item in pipeline.vlm.calls[0]] == [pipeline.fused_prompt] * len(
+        image_paths
+    )
+    assert pipeline.analyze(image_paths[0]) == results[0]
+
+
+# ---------------------------------------------------------------------------
+# Test: Continuation mode (_analyze_continued)
+# ---------------------------------------------------------------------------
+
+
+def test_continuation_mode_reports_as_second_turn(pipeline, image_paths):
+    """Classify runs batched, then each report continues its conversation."""
+    pipeline.mode = "continuation"
+
+    results = pipeline.analyze_batch(image_paths)
+
+    classify_batch, *report_turns = pipeline.vlm.calls
+    assert len(classify_batch) == len(image_paths)
+    assert len(report_turns) == len(image_paths)
+    assert all("buildings, roads" in turn[0][1] for turn in report_turns)
+    assert results == [pipeline.vlm.respond("report")] * len(image_paths)
+    assert pipeline.analyze(image_paths[0]) == results[0]
+
+
+def test_continuation_mode_defers_to_detector(pipeline):
+    """With an external detector there is no classify turn to continue."""
+    pipeline.mode = "continuation"
+    pipeline.detector = model.DetectorRunner()
+
+    assert not pipeline.continued
+
+
+# ---------------------------------------------------------------------------
+# Test: Empty scenes (report_requests)
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("mode", model.PIPELINE_MODES[::2])
+def test_empty_scenes_skip_the_report(pipeline, image_paths, mode):
+    """With nothing detected, the canonical answer replaces the report."""
+    pipeline.mode = mode
+    pipeline.empty_scenes = "skip"
+    pipeline.vlm.classify_response = ""
+
+    results = pipeline.analyze_batch(image_paths)
+    single = pipeline.analyze(image_paths[0])
+    pipeline.close()
+
+    assert results == [model.NO_TARGETS_RESPONSE] * len(image_paths)
+    assert single == model.NO_TARGETS_RESPONSE
+    prompts = [item[1] for call in pipeline.vlm.calls for item in call]
+    assert prompts == [pipeline.classify_prompt] * (len(image_paths) + 1)
+    counters = pipeline.metrics.snapshot()["counters"]
+    assert counters["empty_scenes.skipped"] == len(image_paths) + 1
+
+
+def test_empty_scenes_verify_before_reporting(pipeline, image_paths):
+    """A "yes" from the verify check runs a report over every category."""
+    pipeline.close()
+    pipeline.scheduler = None
+    pipeline.empty_scenes = "verify"
+    pipeline.vlm.classify_response = ""
+
+    assert pipeline.analyze_batch(image_paths) == [model.NO_TARGETS_RESPONSE] * 3
+    assert [item[3].stage for item in pipeline.vlm.calls[-1]] == ["verify"] * 3
+
+    pipeline.vlm.verify_response = "yes"
+    results = pipeline.analyze_batch(image_paths)
+
+    assert results == [pipeline.vlm.respond("report")] * len(image_paths)
+    assert [item[1] for item in pipeline.vlm.calls[-1]] == [pipeline.fused_prompt] * 3
+    assert pipeline.metrics.snapshot()["counters"]["empty_scenes.confirmed"] == 3
+
+
+def test_empty_scenes_report_mode_keeps_report(pipeline, image_paths):
+    """In report mode an empty classify result still gets a report generation."""
+    pipeline.close()
+    pipeline.scheduler = None
+    pipeline.empty_scenes = "report"
+    pipeline.vlm.classify_response = ""
+
+    pipeline.analyze_batch(image_paths)
+
+    _, report_batch = pipeline.vlm.calls
+    assert all("NONE" in item[1] for item in report_batch)
+
+
+def test_verify_grammar_allows_only_yes_or_no(pipeline):
+    """The verify check is constrained to a one-word answer."""
+    grammar = pipeline.verify_options.grammar
+    state = grammar.initial()
+    for char in "ye":
+        state = grammar.advance(state, char)
+
+    assert grammar.advance(state, "s") == "yes"
+    assert grammar.advance(grammar.initial(), "m") is None
+    assert not grammar.accepts(state)
+
+
+# ---------------------------------------------------------------------------
+# Test: Constrained reports (report_grammar)
+# ---------------------------------------------------------------------------
+
+
+def test_requests_carry_stage_grammars(pipeline, image_paths):
+    """Classify uses the label grammar; reports are limited to detected labels."""
+    pipeline.close()
+    pipeline.scheduler = None
+    pipeline.constrain_report = True
+
+    pipeline.analyze_batch(image_paths)
+
+    classify_batch, report_batch = pipeline.vlm.calls
+    assert all(item[3] is pipeline.classify_options for item in classify_batch)
+    options = {item[3] for item in report_batch}
+    assert len(options) == 1
+    options = options.pop()
+    assert options.stage == "report"
+    assert options.targets == 2
+    assert set(options.grammar.damage_labels) == {"buildings", "roads"}
+
+
+def test_report_grammar_disabled(pipeline):
+    """Without constrain-report, report requests are unconstrained."""
+    pipeline.constrain_report = False
+
+    assert pipeline.report_options(frozenset({"roads"})).grammar is None
+
+
+# ---------------------------------------------------------------------------
+# Test: Asyncio API (analyze_async, analyze_stream)
+# ---------------------------------------------------------------------------
+
+
+def test_analyze_async_matches_analyze(pipeline, image_paths):
+    """The async wrapper returns the same assessment as analyze."""
+    result = asyncio.run(pipeline.analyze_async(image_paths[0]))
+
+    assert result == pipeline.analyze(image_paths[0])
+
+
+def test_analyze_stream_respects_concurrency_limit(pipeline, tmp_path):
+    """Every image is yielded once, with at most max_concurrency in flight."""
+    pipeline.max_concurrency = 2
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def slow_analyze(image_path):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return str(image_path)
+
+    pipeline.analyze = slow_analyze
+    paths = [tmp_path / f"image{i}.png" for i in range(5)]
+
+    async def collect():
+        return [item async for item in pipeline.analyze_stream(paths)]
+
+    results = asyncio.run(collect())
+
+    assert sorted(results) == sorted((path, str(path)) for path in paths)
+    assert peak[0] == 2
+
+
+def test_timeout_stops_analysis_before_next_generation(pipeline, image_paths):
+    """A timed-out analysis raises and never starts its report generation."""
+    generate_batch = pipeline.vlm.generate_batch
+
+    def slow_generate_batch(items):
+        time.sleep(0.3)
+        return generate_batch(items)
+
+    pipeline.vlm.generate_batch = slow_generate_batch
+    pipeline.scheduler.generate_batch = slow_generate_batch
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(pipeline.analyze_async(image_paths[0], timeout=0.05))
+    pipeline.close()
+
+    prompts = [item[1] for call in pipeline.vlm.calls for item in call]
+    assert prompts == [pipeline.classify_prompt]
+    assert pipeline.metrics.snapshot()["counters"]["async.timeouts"] == 1
@@ -0,0 +1,154 @@
+"""Micro-batching scheduler and run metrics test suite."""
+
+import threading
+import time
+
+import pytest
+
+from bda_svc import metrics as metrics_module
+from bda_svc.metrics import RunMetrics, summarize
+from bda_svc.pipeline.scheduler import MicroBatchScheduler
+
+
+class RecordingBackend:
+    """Batch function that records each batch it receives."""
+
+    def __init__(self) -> None:
+        """Start with no recorded batches."""
+        self.batches: list[list[tuple]] = []
+
+    def __call__(self, items: list[tuple]) -> list[str]:
+        """Echo each request's first argument."""
+        self.batches.append(list(items))
+        return [f"out:{item[0]}" for item in items]
+
+
+# ---------------------------------------------------------------------------
+# Test: Dispatch rules (MicroBatchScheduler)
+# ---------------------------------------------------------------------------
+
+
+def test_dispatches_when_batch_is_full():
+    """A full batch goes out without waiting for the deadline."""
+    backend = RecordingBackend()
+    with MicroBatchScheduler(backend, max_batch_size=2, max_wait_ms=10_000) as sched:
+        start = time.monotonic()
+        futures = [sched.submit(i) for i in range(2)]
+        results = [f.result(timeout=5) for f in futures]
+
+    assert time.monotonic() - start < 5
+    assert results == ["out:0", "out:1"]
+    assert backend.batches == [[(0,), (1,)]]
+
+
+def test_dispatches_partial_batch_after_max_wait():
+    """A lone request is sent once max_wait_ms runs out."""
+    backend = RecordingBackend()
+    with MicroBatchScheduler(backend, max_batch_size=8, max_wait_ms=20) as sched:
+        assert sched.submit("a").result(timeout=5) == "out:a"
+
+    assert backend.batches == [[("a",)]]
+
+
+def test_gathers_requests_from_many_threads():
+    """Concurrent submitters share micro-batches."""
+    backend = RecordingBackend()
+    results = {}
+
+    with MicroBatchScheduler(backend, max_batch_size=4, max_wait_ms=200) as sched:
+
+        def worker(i):
+            results[i] = sched.submit(i).result(timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert results == {i: f"out:{i}" for i in range(8)}
+    assert all(len(batch) <= 4 for batch in backend.batches)
+    assert len(backend.batches) < 8
+
+
+def test_backend_errors_propagate_to_futures():
+    """A failing batch fails every request in it."""
+
+    def failing(items):
+        raise RuntimeError("boom")
+
+    with MicroBatchScheduler(failing, max_batch_size=2, max_wait_ms=10) as sched:
+        future = sched.submit("x")
+        with pytest.raises(RuntimeError, match="boom"):
+            future.result(timeout=5)
+
+
+def test_close_flushes_queue_and_rejects_new_requests():
+    """Requests queued before close still complete."""
+    backend = RecordingBackend()
+    sched = MicroBatchScheduler(backend, max_batch_size=64, max_wait_ms=10_000)
+    futures = [sched.submit(i) for i in range(3)]
+    sched.close()
+
+    assert [f.result(timeout=5) for f in futures] == ["out:0", "out:1", "out:2"]
+    with pytest.raises(RuntimeError):
+        sched.submit("late")
+
+
+def test_records_scheduler_metrics():
+    """Batch sizes, waits, and queue depth are recorded."""
+    metrics = RunMetrics()
+    backend = RecordingBackend()
+    with MicroBatchScheduler(
+        backend, max_batch_size=2, max_wait_ms=10_000, metrics=metrics
+    ) as sched:
+        for f in [sched.submit(i) for i in range(4)]:
+            f.result(timeout=5)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["histograms"]["scheduler.batch_size"] == {2: 2}
+    assert snapshot["samples"]["scheduler.wait_ms"]["count"] == 4
+    assert snapshot["gauges"]["scheduler.queue_depth"]["peak"] >= 1
+
+
+# ---------------------------------------------------------------------------
+# Test: Metrics (RunMetrics)
+# ---------------------------------------------------------------------------
+
+
+def test_summarize_statistics():
+    """Summary statistics cover count, mean, median, p95, and max."""
+    stats = summarize([float(v) for v in range(1, 101)])
+
+    assert stats["count"] == 100
+    assert stats["mean"] == pytest.approx(50.5)
+    assert stats["p50"] == pytest.approx(50.5)
+    assert stats["p95"] == 95
+    assert stats["max"] == 100
+
+
+def test_summary_lists_every_metric():
+    """The run summary mentions each recorded metric."""
+    metrics = RunMetrics()
+    metrics.increment("images")
+    metrics.set_gauge("depth", 3)
+    metrics.observe("latency_ms", 12.0)
+    metrics.count("batch_size", 4)
+
+    summary = metrics.summary()
+
+    for name in ["images", "depth", "latency_ms", "batch_size"]:
+        assert name in summary
+
+
+def test_samples_keep_a_bounded_recent_window(monkeypatch):
+    """Old samples are dropped once the window is full; the count stays total."""
+    monkeypatch.setattr(metrics_module, "SAMPLE_WINDOW", 10)
+    metrics = RunMetrics()
+
+    for value in range(100):
+        metrics.observe("latency_ms", float(value))
+
+    stats = metrics.snapshot()["samples"]["latency_ms"]
+    assert stats["count"] == 100
+    assert stats["p50"] == pytest.approx(94.5)
@@ -0,0 +1,107 @@
+"""Resident server test suite (runs against a fake pipeline)."""
+
+import json
+import threading
+
+import pytest
+from PIL import Image
+
+from bda_svc import server
+
+
+@pytest.fixture
+def running_server(fake_pipeline, tmp_path):
+    """BDAServer on a temporary socket, serving from a background thread."""
+    bda_server = server.BDAServer(tmp_path / "bda.sock", fake_pipeline())
+    thread = threading.Thread(target=bda_server.serve_forever, daemon=True)
+    thread.start()
+    yield bda_server
+    bda_server.shutdown()
+    bda_server.server_close()
+
+
+@pytest.fixture
+def image_folder(tmp_path):
+    """Folder with three small images."""
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for i in range(3):
+        Image.new("RGB", (8, 8)).save(folder / f"image{i}.png")
+    return folder
+
+
+# ---------------------------------------------------------------------------
+# Test: Jobs (submit, BDAServer)
+# ---------------------------------------------------------------------------
+
+
+def test_submit_runs_job_on_resident_pipeline(running_server, image_folder, tmp_path):
+    """Jobs reuse one pipeline and export a JSON file per image."""
+    socket_path = str(running_server.socket_path)
+    output = tmp_path / "out"
+
+    first = server.submit(str(image_folder), str(output), socket_path)
+    second = server.submit(str(image_folder / "image0.png"), str(output), socket_path)
+
+    assert len(first) == 3 and len(second) == 1
+    assert all(path.parent == output for path in first + second)
+    assert json.loads(first[0].read_text())["width"] == 8
+    assert [len(batch) for batch in running_server.model.batches] == [2, 1, 1]
+
+
+def test_submit_reports_server_errors(running_server, tmp_path):
+    """A job without images fails on the client with the server's message."""
+    empty = tmp_path / "empty"
+    empty.mkdir()
+
+    with pytest.raises(SystemExit, match="does not contain valid input data"):
+        server.submit(str(empty), None, str(running_server.socket_path))
+
+
+def test_videos_in_submitted_folders_are_skipped(
+    running_server, image_folder, tmp_path
+):
+    """Only the images of a mixed image/video folder reach the pipeline."""
+    (image_folder / "clip.mp4").write_bytes(b"not an image")
+    socket_path = str(running_server.socket_path)
+
+    exported = server.submit(str(image_folder), str(tmp_path / "out"), socket_path)
+
+    analyzed = [path.name for path in running_server.model.prepared]
+    assert len(exported) == 3
+    assert analyzed == [f"image{i}.png" for i in range(3)]
+
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    (videos / "clip.mp4").write_bytes(b"not an image")
+    with pytest.raises(SystemExit, match="No images found"):
+        server.submit(str(videos), None, socket_path)
+
+
+def test_submit_without_server_exits(image_folder, tmp_path):
+    """Submitting with no server listening fails fast."""
+    with pytest.raises(SystemExit, match="No bda-svc server"):
+        server.submit(str(image_folder), None, str(tmp_path / "missing.sock"))
+
+
+# ---------------------------------------------------------------------------
+# Test: Socket lifecycle (remove_stale_socket)
+# ---------------------------------------------------------------------------
+
+
+def test_stale_socket_is_replaced(fake_pipeline, tmp_path):
+    """A socket file left by a dead server does not block a new one."""
+    socket_path = tmp_path / "bda.sock"
+    first = server.BDAServer(socket_path, fake_pipeline())
+    first.socket.close()
+
+    second = server.BDAServer(socket_path, fake_pipeline())
+    second.server_close()
+
+    assert not socket_path.exists()
+
+
+def test_refuses_to_replace_live_server(fake_pipeline, running_server):
+    """A second server on a live socket exits instead of stealing it."""
+    with pytest.raises(SystemExit, match="already listening"):
+        server.BDAServer(running_server.socket_path, fake_pipeline())
@@ -0,0 +1,94 @@
+"""Static sharding test suite."""
+
+import pytest
+
+from bda_svc import inputs, shards
+
+
+def make_images(folder, names):
+    """Create empty image files under a folder."""
+    for name in names:
+        path = folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+NAMES = [f"site{i % 3}/image{i}.png" for i in range(30)]
+
+
+# ---------------------------------------------------------------------------
+# Test: Shard selection (get_input_paths)
+# ---------------------------------------------------------------------------
+
+
+def test_shards_partition_inputs_exactly_once(tmp_path):
+    """Every image lands in exactly one of the shards."""
+    make_images(tmp_path, NAMES)
+    everything = inputs.get_input_paths(tmp_path)
+
+    selected = [inputs.get_input_paths(tmp_path, i, 3) for i in range(3)]
+
+    assert sorted(path for shard in selected for path in shard) == everything
+    assert all(shard for shard in selected)
+
+
+def test_shards_are_stable_across_mounts_and_new_files(tmp_path):
+    """Assignment depends only on the relative path, not the mount or new files."""
+    first, second = tmp_path / "node_a", tmp_path / "mnt/node_b"
+    make_images(first, NAMES)
+    make_images(second, NAMES + ["site9/new.png", "late.jpg"])
+
+    def names(folder):
+        return {
+            shards.relative_name(path, folder)
+            for path in inputs.get_input_paths(folder, 1, 4)
+        }
+
+    assert names(first) <= names(second)
+    assert names(second) - names(first) <= {"site9/new.png", "late.jpg"}
+
+
+def test_invalid_shard_exits(tmp_path):
+    """Shard indices outside [0, count) are rejected."""
+    make_images(tmp_path, NAMES)
+
+    with pytest.raises(SystemExit, match="Invalid shard"):
+        inputs.get_input_paths(tmp_path, 3, 3)
+
+
+# ---------------------------------------------------------------------------
+# Test: Manifests (write_manifest, merge_manifests)
+# ---------------------------------------------------------------------------
+
+
+def test_merge_confirms_complete_coverage(tmp_path):
+    """Manifests from every shard cover the folder exactly once."""
+    folder, output = tmp_path / "images", tmp_path / "out"
+    make_images(folder, NAMES)
+    manifests = []
+    for i in range(3):
+        paths = inputs.get_input_paths(folder, i, 3)
+        exported = [output / f"{path.stem}.json" for path in paths]
+        manifests.append(shards.write_manifest(folder, paths, exported, output, i, 3))
+
+    report = shards.merge_manifests(manifests, NAMES)
+
+    assert report["ok"] and report["images"] == len(NAMES)
+    assert manifests[0].name == "shard_0_of_3.json"
+
+
+def test_merge_reports_gaps_and_duplicates(tmp_path):
+    """Missing shards, repeated shards, and uncovered images are reported."""
+    folder, output = tmp_path / "images", tmp_path / "out"
+    make_images(folder, NAMES)
+    paths = inputs.get_input_paths(folder, 0, 2)
+    exported = [output / f"{path.stem}.json" for path in paths]
+    manifest = shards.write_manifest(folder, paths, exported, output, 0, 2)
+
+    report = shards.merge_manifests([manifest, manifest], NAMES)
+
+    assert not report["ok"]
+    assert report["missing_shards"] == [1]
+    assert report["duplicate_shards"] == [0]
+    assert len(report["duplicates"]) == len(paths)
+    assert len(report["missing"]) == len(NAMES) - len(paths)
@@ -0,0 +1,113 @@
+"""Video input test suite (frame decoding is replaced by in-memory frames)."""
+
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from bda_svc import video
+
+
+def no_thumbnail():
+    """Fail if a sampling mode asks for a thumbnail it does not need."""
+    raise AssertionError("thumbnail should not be computed")
+
+
+# ---------------------------------------------------------------------------
+# Test: Frame sampling (FrameSampler)
+# ---------------------------------------------------------------------------
+
+
+def test_every_nth_frame():
+    """`every` keeps frames 0, N, 2N, ..."""
+    sampler = video.FrameSampler("every", every=3)
+
+    selected = [i for i in range(10) if sampler.select(i, i / 30, no_thumbnail)]
+
+    assert selected == [0, 3, 6, 9]
+
+
+def test_fixed_rate_follows_video_time():
+    """`fps` keeps one frame per 1/fps seconds, even with uneven timestamps."""
+    sampler = video.FrameSampler("fps", fps=2.0)
+    timestamps = [i / 30 for i in range(60)] + [5.0, 5.01, 5.6]
+
+    selected = [
+        t for i, t in enumerate(timestamps) if sampler.select(i, t, no_thumbnail)
+    ]
+
+    assert selected == pytest.approx([0.0, 0.5, 1.0, 1.5, 5.0, 5.6])
+
+
+def test_scene_changes_trigger_samples():
+    """`scene` keeps the first frame and each frame that differs from the last kept."""
+    rng = np.random.default_rng(0)
+    first, second = rng.random((8, 9)), rng.random((8, 9))
+    frames = [first, first + 0.001, first, second, second, first]
+    sampler = video.FrameSampler("scene", scene_threshold=8)
+
+    selected = [
+        i
+        for i, frame in enumerate(frames)
+        if sampler.select(i, i / 30, lambda frame=frame: frame)
+    ]
+    sampler.reset()
+
+    assert selected == [0, 3, 5]
+    assert sampler.select(0, 0.0, lambda: second)
+
+
+def test_invalid_sampling_is_rejected():
+    """Unknown modes and non-positive settings raise ValueError."""
+    with pytest.raises(ValueError, match="Unknown sampling mode"):
+        video.FrameSampler("keyframes")
+    with pytest.raises(ValueError, match="must be positive"):
+        video.FrameSampler("fps", fps=0)
+
+
+# ---------------------------------------------------------------------------
+# Test: Streaming analysis (analyze_video)
+# ---------------------------------------------------------------------------
+
+
+def test_frames_are_analyzed_in_memory_with_source_and_timestamp(
+    fake_pipeline, monkeypatch, tmp_path
+):
+    """Frame results carry the video and timestamp; an index lists them all."""
+    clip, output = tmp_path / "clip.mp4", tmp_path / "out"
+
+    def frames(video_path, sampler):
+        assert video_path == clip
+        for index in (0, 30, 60):
+            yield video.VideoFrame(index, index / 30, Image.new("RGB", (index + 1, 2)))
+
+    monkeypatch.setattr(video, "iter_frames", frames)
+    model = fake_pipeline()
+
+    index_path = video.analyze_video(model, clip, output, video.FrameSampler())
+
+    index = json.loads(index_path.read_text())
+    assert index["source_video"] == str(clip) and index["sampling"] == "fps"
+    assert [frame["timestamp_s"] for frame in index["frames"]] == [0.0, 1.0, 2.0]
+    results = [json.loads((output / f["output"]).read_text()) for f in index["frames"]]
+    keys = ("width", "source_video", "frame_index", "timestamp_s")
+    assert [results[1][key] for key in keys] == [31, str(clip), 30, 1.0]
+    assert [len(batch) for batch in model.batches] == [2, 1]
+    assert all(isinstance(frame, Image.Image) for b in model.batches for frame in b)
+    assert all(path.suffix == ".json" for path in output.iterdir())
+
+
+def test_decoding_errors_surface(fake_pipeline, monkeypatch, tmp_path):
+    """A failure in the decoding thread is raised to the caller."""
+
+    def frames(video_path, sampler):
+        yield video.VideoFrame(0, 0.0, Image.new("RGB", (2, 2)))
+        raise OSError("corrupt stream")
+
+    monkeypatch.setattr(video, "iter_frames", frames)
+
+    with pytest.raises(OSError, match="corrupt stream"):
+        video.analyze_video(
+            fake_pipeline(), tmp_path / "clip.mp4", tmp_path, video.FrameSampler()
+        )
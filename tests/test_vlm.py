@@ -0,0 +1,432 @@
+"""VLMRunner test suite (runs a tiny randomly initialized InternVL model)."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import (
+    DynamicCache,
+    GotOcr2ImageProcessor,
+    InternVLConfig,
+    InternVLForConditionalGeneration,
+    InternVLProcessor,
+    InternVLVideoProcessor,
+    PreTrainedTokenizerFast,
+)
+
+from bda_svc.pipeline import model
+
+SPECIAL_TOKENS = [
+    "<|endoftext|>",
+    "<|im_start|>",
+    "<|im_end|>",
+    "<img>",
+    "</img>",
+    "<IMG_CONTEXT>",
+    "<video>",
+]
+
+CHAT_TEMPLATE = (
+    "{% for message in messages %}<|im_start|>{{ message['role'] }}\n"
+    "{% if message['content'] is string %}{{ message['content'] }}{% else %}"
+    "{% for c in message['content'] %}"
+    "{% if c['type'] == 'image' %}<IMG_CONTEXT>\n"
+    "{% elif c['type'] == 'text' %}{{ c['text'] }}{% endif %}"
+    "{% endfor %}{% endif %}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+SYSTEM_PROMPT = "You are an analyst."
+PROMPTS = [
+    "Describe the image. {image}List roads.",
+    "Describe the image. {image}List buildings, roads.",
+    "Describe the image. {image}Report.",
+]
+
+
+def tiny_processor() -> InternVLProcessor:
+    """Build an InternVL processor around a small byte-level BPE tokenizer."""
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(
+        [SYSTEM_PROMPT, *PROMPTS, '{"target_1": {"target_type": "roads"}}'],
+        trainers.BpeTrainer(
+            vocab_size=400,
+            special_tokens=SPECIAL_TOKENS,
+            initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        ),
+    )
+    return InternVLProcessor(
+        image_processor=GotOcr2ImageProcessor(
+            size={"height": 28, "width": 28},
+            crop_to_patches=True,
+            min_patches=1,
+            max_patches=3,
+        ),
+        video_processor=InternVLVideoProcessor(),
+        tokenizer=PreTrainedTokenizerFast(
+            tokenizer_object=tokenizer,
+            eos_token="<|im_end|>",
+            pad_token="<|endoftext|>",
+            extra_special_tokens={
+                "start_image_token": "<img>",
+                "end_image_token": "</img>",
+                "context_image_token": "<IMG_CONTEXT>",
+                "video_token": "<video>",
+            },
+        ),
+        image_seq_length=1,
+        chat_template=CHAT_TEMPLATE,
+    )
+
+
+def tiny_model(processor: InternVLProcessor, seed: int) -> torch.nn.Module:
+    """Build a randomly initialized InternVL model for the processor's vocabulary."""
+    tokenizer = processor.tokenizer
+    config = InternVLConfig(
+        vision_config={
+            "hidden_size": 16,
+            "num_hidden_layers": 1,
+            "num_attention_heads": 2,
+            "intermediate_size": 32,
+            "image_size": [28, 28],
+            "patch_size": [14, 14],
+        },
+        text_config={
+            "model_type": "qwen2",
+            "hidden_size": 32,
+            "num_hidden_layers": 2,
+            "num_attention_heads": 2,
+            "num_key_value_heads": 1,
+            "intermediate_size": 64,
+            "vocab_size": len(tokenizer),
+            "max_position_embeddings": 512,
+            # Wide weights keep greedy decoding clear of near-ties
+            "initializer_range": 0.5,
+        },
+        image_token_id=tokenizer.context_image_token_id,
+        downsample_ratio=0.5,
+        projector_hidden_act="gelu",
+    )
+    torch.manual_seed(seed)
+    return InternVLForConditionalGeneration(config).eval()
+
+
+@pytest.fixture(scope="module")
+def tiny():
+    """Shared tiny processor and target model."""
+    processor = tiny_processor()
+    return SimpleNamespace(processor=processor, model=tiny_model(processor, seed=0))
+
+
+@pytest.fixture
+def make_runner(monkeypatch, tiny):
+    """Return a factory for VLMRunners that load the tiny model."""
+
+    def load(model_id, pipeline_kwargs, quantization_kwargs):
+        if model_id == "draft":
+            # Drafts are wrapped in place, so each runner gets its own
+            return SimpleNamespace(
+                model=tiny_model(tiny.processor, seed=1), processor=tiny.processor
+            )
+        return SimpleNamespace(model=tiny.model, processor=tiny.processor)
+
+    monkeypatch.setattr(model.VLMRunner, "_load_pipeline", staticmethod(load))
+
+    def make(caches: bool = False, batch_size: int = 3, **kwargs) -> model.VLMRunner:
+        return model.VLMRunner(
+            "tiny",
+            pipeline_kwargs={"max_new_tokens": 8},
+            batch_size=batch_size,
+            vision_cache_kwargs={"enabled": caches},
+            prefix_cache_kwargs={"enabled": caches},
+            **kwargs,
+        )
+
+    return make
+
+
+@pytest.fixture
+def images() -> list[Image.Image]:
+    """Random images of different shapes (so patch counts and padding differ)."""
+    rng = np.random.default_rng(0)
+    return [
+        Image.fromarray(rng.integers(0, 255, (h, w, 3), dtype=np.uint8))
+        for h, w in [(40, 60), (28, 28), (30, 90)]
+    ]
+
+
+@pytest.fixture
+def items(images) -> list[tuple]:
+    """One request per image, sharing a system prompt and prompt prefix."""
+    return [
+        (image, prompt, SYSTEM_PROMPT)
+        for image, prompt in zip(images, PROMPTS, strict=True)
+    ]
+
+
+# --------------------------------------------------------------------------
+# Test: Padded batching (VLMRunner.generate_batch)
+# --------------------------------------------------------------------------
+
+
+def test_batched_generation_matches_unbatched(make_runner, items):
+    """A padded batch decodes each request as it would decode alone."""
+    runner = make_runner()
+    batched = runner.generate_batch(items)
+
+    assert batched == [runner.generate(*item) for item in items]
+    assert all(batched)
+
+
+def test_caches_do_not_change_greedy_output(make_runner, items):
+    """Vision and prefix caches, cold or warm, leave greedy output unchanged."""
+    expected = make_runner().generate_batch(items)
+    runner = make_runner(caches=True)
+
+    # First call fills both caches, second call reuses them
+    assert runner.generate_batch(items) == expected
+    assert runner.generate_batch(items) == expected
+    assert len(runner.vision_cache) == len(items)
+    assert len(runner.prefix_cache) == 1
+    assert _counters(runner)["prefix_cache.tokens_reused"] > 0
+    assert _counters(runner)["vision_cache.hits"] == len(items)
+
+
+def test_cached_prefix_survives_the_batch_that_reuses_it(make_runner, items):
+    """Batches extend a clone of the cached prefix, never the entry itself."""
+    runner = make_runner(caches=True, batch_size=1)
+    runner.generate(*items[0])
+    entry = runner.prefix_cache.get(runner._prefix_text(_render(runner, items[0])))
+    before = [layer.keys.clone() for layer in entry.kv.layers]
+
+    runner.generate_batch(items)
+
+    assert [layer.keys for layer in entry.kv.layers][0].shape == before[0].shape
+    assert all(
+        torch.equal(layer.keys, keys)
+        for layer, keys in zip(entry.kv.layers, before, strict=True)
+    )
+
+
+def test_draft_assisted_generation_matches_greedy(make_runner, items):
+    """A draft model speeds up decoding without changing greedy output."""
+    expected = make_runner().generate_batch(items)
+    runner = make_runner(caches=True, draft_model_id="draft")
+
+    assert runner.batch_size == 1
+    assert runner.vision_cache is None and runner.prefix_cache is None
+    assert runner.generate_batch(items) == expected
+    assert _counters(runner)["speculative.drafted.default"] > 0
+
+
+# --------------------------------------------------------------------------
+# Test: Conversations (VLMRunner.start_conversation / continue_conversation)
+# --------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("caches", [False, True])
+def test_continuation_matches_a_fresh_prefill(make_runner, tiny, items, caches):
+    """A turn decoded from the cached state matches prefilling the whole chat."""
+    runner = make_runner(caches=caches)
+    _, conversation = runner.start_conversation(*items[0])
+
+    response, extended = runner.continue_conversation(conversation, "Now roads.")
+
+    # Prefill the whole two-turn conversation from scratch
+    text = tiny.processor.apply_chat_template(
+        extended.messages[:-1], add_generation_prompt=True, tokenize=False
+    )
+    inputs = tiny.processor(
+        images=[items[0][0]], text=[text], add_special_tokens=False, return_tensors="pt"
+    )
+    with torch.inference_mode():
+        sequences = tiny.model.generate(
+            **inputs, **runner.generate_kwargs, do_sample=False
+        )
+    fresh = tiny.processor.decode(
+        sequences[0, inputs["input_ids"].shape[1] :], skip_special_tokens=True
+    )
+
+    assert response == fresh
+    assert _counters(runner)["conversation.tokens_reused"] > 0
+
+
+def test_continuing_twice_from_one_handle_gives_the_same_answer(make_runner, items):
+    """Continuing a conversation leaves its handle reusable."""
+    runner = make_runner()
+    _, conversation = runner.start_conversation(*items[1])
+
+    first, _ = runner.continue_conversation(conversation, "Now roads.")
+    second, _ = runner.continue_conversation(conversation, "Now roads.")
+
+    assert first == second
+
+
+def test_batched_conversations_match_single_ones(make_runner, items):
+    """Padded conversation states continue exactly like unbatched ones."""
+    runner = make_runner()
+    batched = runner.start_conversations(items)
+
+    for item, (response, conversation) in zip(items, batched, strict=True):
+        single, alone = runner.start_conversation(*item)
+        assert response == single
+        assert (
+            runner.continue_conversation(conversation, "Now roads.")[0]
+            == runner.continue_conversation(alone, "Now roads.")[0]
+        )
+
+
+# --------------------------------------------------------------------------
+# Test: Tensor helpers
+# --------------------------------------------------------------------------
+
+
+def _render(runner: model.VLMRunner, item: tuple) -> str:
+    """Return the chat-template text of one request."""
+    return runner.processor.apply_chat_template(
+        runner.build_messages(*item), add_generation_prompt=True, tokenize=False
+    )
+
+
+def _counters(runner: model.VLMRunner) -> dict:
+    """Return the runner's metric counters."""
+    return runner.metrics.snapshot()["counters"]
+
+
+def _runner_stub(**processor) -> SimpleNamespace:
+    """Object with just the attributes the helpers read from a VLMRunner."""
+    return SimpleNamespace(
+        generate_kwargs={"pad_token_id": 0}, processor=SimpleNamespace(**processor)
+    )
+
+
+def test_align_prefix_pads_between_prefix_and_rest():
+    """Left padding moves between the shared prefix and the rest of each row."""
+    input_ids = torch.tensor([[0, 0, 7, 8, 1, 2], [7, 8, 3, 4, 5, 6]])
+    attention_mask = (input_ids != 0).long()
+
+    aligned = model.VLMRunner._align_prefix(
+        _runner_stub(), input_ids, attention_mask, [7, 8]
+    )
+
+    ids, mask = aligned
+    assert ids.tolist() == [[7, 8, 0, 0, 1, 2], [7, 8, 3, 4, 5, 6]]
+    assert mask.tolist() == [[1, 1, 0, 0, 1, 1], [1, 1, 1, 1, 1, 1]]
+
+
+@pytest.mark.parametrize(
+    "rows",
+    [
+        [[0, 7, 8, 1], [7, 9, 2, 3]],  # second row has a different prefix
+        [[0, 0, 7, 8], [7, 8, 2, 3]],  # first row is only the prefix
+    ],
+)
+def test_align_prefix_refuses_rows_without_the_prefix(rows):
+    """A row that lacks the prefix (or is only the prefix) disables alignment."""
+    input_ids = torch.tensor(rows)
+    attention_mask = (input_ids != 0).long()
+
+    assert (
+        model.VLMRunner._align_prefix(_runner_stub(), input_ids, attention_mask, [7, 8])
+        is None
+    )
+
+
+def test_split_states_copies_each_row():
+    """Each row gets its own token ids, extended mask, and KV cache copy."""
+    kv = DynamicCache()
+    for layer in range(2):
+        keys = torch.arange(2 * 1 * 5 * 4, dtype=torch.float).reshape(2, 1, 5, 4)
+        kv.update(keys + layer, -keys, layer)
+    sequences = torch.tensor([[0, 1, 2, 3, 4, 5], [6, 7, 8, 9, 10, 11]])
+    attention_mask = torch.tensor([[0, 1, 1, 1], [1, 1, 1, 1]])
+
+    states = model.VLMRunner._split_states(sequences, attention_mask, kv)
+
+    assert [state["token_ids"].tolist() for state in states] == sequences.tolist()
+    assert [state["attention_mask"].tolist() for state in states] == [
+        [0, 1, 1, 1, 1, 1],
+        [1, 1, 1, 1, 1, 1],
+    ]
+    for row, state in enumerate(states):
+        for layer, original in zip(state["kv"].layers, kv.layers, strict=True):
+            assert torch.equal(layer.keys, original.keys[row : row + 1])
+            assert torch.equal(layer.values, original.values[row : row + 1])
+
+    # Rows are private copies
+    states[0]["kv"].layers[0].keys.zero_()
+    assert kv.layers[0].keys[0].any()
+
+
+def test_expand_image_tokens_repeats_tokens_per_patch():
+    """Each placeholder becomes start, seq_length tokens per patch, and end."""
+    runner = _runner_stub(
+        image_token="<I>",
+        start_image_token="<s>",
+        end_image_token="</s>",
+        image_seq_length=2,
+    )
+    encodings = [
+        model.VisionEncoding(num_patches=1, features=torch.zeros(0)),
+        model.VisionEncoding(num_patches=3, features=torch.zeros(0)),
+    ]
+
+    text = model.VLMRunner._expand_image_tokens(runner, "a<I>b<I>c", encodings)
+
+    assert text == "a<s><I><I></s>b<s>" + "<I>" * 6 + "</s>c"
+
+
+def test_expand_image_tokens_requires_one_placeholder_per_image():
+    """Placeholder and image counts must match."""
+    runner = _runner_stub(
+        image_token="<I>", start_image_token="<s>", end_image_token="</s>"
+    )
+    encoding = model.VisionEncoding(num_patches=1, features=torch.zeros(0))
+
+    with pytest.raises(ValueError, match="does not match"):
+        model.VLMRunner._expand_image_tokens(runner, "a<I>b<I>c", [encoding])
+
+
+def test_vision_features_land_on_the_image_tokens(make_runner, tiny, items):
+    """Cached vision features replace exactly the processor's image tokens."""
+    runner = make_runner(caches=True)
+    texts = [_render(runner, item) for item in items]
+
+    spliced, _ = runner.prepare_inputs(items, texts)
+    pixels = tiny.processor(
+        images=[item[0] for item in items],
+        text=texts,
+        padding=True,
+        add_special_tokens=False,
+        return_tensors="pt",
+    )
+
+    # Same tokens as the processor's own expansion, features at image positions
+    assert torch.equal(spliced["input_ids"], pixels["input_ids"])
+    with torch.inference_mode():
+        features = tiny.model.get_image_features(
+            pixel_values=pixels["pixel_values"], return_dict=True
+        ).pooler_output
+    image_mask = spliced["input_ids"] == tiny.model.config.image_token_id
+    assert torch.allclose(
+        spliced["inputs_embeds"][image_mask], features.reshape(-1, features.shape[-1])
+    )
+
+
+def test_prefix_entry_clone_is_private_and_batched():
+    """Clones repeat the prefix across the batch without sharing storage."""
+    kv = DynamicCache()
+    kv.update(torch.ones(1, 1, 3, 4), torch.ones(1, 1, 3, 4), 0)
+    entry = model.PrefixEntry(token_ids=[1, 2, 3], kv=kv)
+
+    clone = entry.clone(batch_size=2)
+    clone.layers[0].keys.zero_()
+
+    assert clone.layers[0].keys.shape[0] == 2
+    assert entry.kv.layers[0].keys.shape[0] == 1
+    assert entry.kv.layers[0].keys.all()
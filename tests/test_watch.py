@@ -0,0 +1,172 @@
+"""Watch-folder ingestion test suite (runs against a fake pipeline)."""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from bda_svc import journal, watch
+
+
+def analyzed(model):
+    """Return the file names a fake pipeline has decoded, in order."""
+    return [path.name for path in model.prepared]
+
+
+def wait_for(condition, timeout=10.0):
+    """Poll until a condition holds (or fail after a timeout)."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+# ---------------------------------------------------------------------------
+# Test: Debouncing (ArrivalTracker)
+# ---------------------------------------------------------------------------
+
+
+def test_files_settle_only_after_the_debounce_interval(tmp_path):
+    """A file still growing is held back; settled files are handed out once."""
+    path = tmp_path / "image.png"
+    path.write_bytes(b"partial")
+    tracker = watch.ArrivalTracker(debounce_s=1.0)
+
+    tracker.observe([path], now=0.0)
+    assert tracker.ready(now=0.5) == []
+    path.write_bytes(b"partial, then the rest")
+    assert tracker.ready(now=1.2) == []
+    assert tracker.next_deadline() == pytest.approx(2.2)
+
+    assert tracker.ready(now=2.3) == [(path, 0.0)]
+    tracker.observe([path], now=3.0)
+    assert tracker.ready(now=10.0) == []
+
+
+def test_handled_and_missing_files_are_ignored(tmp_path):
+    """Completed files are skipped unless they change; deleted files drop out."""
+    done, gone = tmp_path / "done.png", tmp_path / "gone.png"
+    done.write_bytes(b"done")
+    gone.write_bytes(b"gone")
+    tracker = watch.ArrivalTracker(debounce_s=0.0)
+    tracker.mark_handled(done)
+
+    tracker.observe([done, gone], now=0.0)
+    gone.unlink()
+
+    assert tracker.ready(now=1.0) == []
+    assert tracker.next_deadline() is None
+
+
+# ---------------------------------------------------------------------------
+# Test: Watch loop (watch_folder)
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_arriving_images_are_analyzed_with_latency(
+    fake_pipeline, tmp_path, use_inotify
+):
+    """Existing and newly arriving images are analyzed while the loop runs."""
+    folder, output = tmp_path / "in", tmp_path / "out"
+    (folder / "site").mkdir(parents=True)
+    Image.new("L", (3, 3)).save(folder / "early.png")
+    model, stop = fake_pipeline(), threading.Event()
+    run_journal = journal.RunJournal(output)
+    loop = threading.Thread(
+        target=watch.watch_folder,
+        args=(model, folder, output, 0.05, 0.05, run_journal),
+        kwargs={"use_inotify": use_inotify, "stop": stop},
+    )
+    loop.start()
+    try:
+        wait_for(lambda: analyzed(model) == ["early.png"])
+        Image.new("L", (5, 5)).save(folder / "site" / "late.png")
+        (folder / "notes.txt").write_text("not an image")
+        wait_for(lambda: len(analyzed(model)) == 2)
+    finally:
+        stop.set()
+        loop.join()
+        run_journal.close()
+
+    results = sorted(
+        json.loads(path.read_text())["width"] for path in output.glob("*_*.json")
+    )
+    assert results == [3, 5]
+    assert model.metrics.snapshot()["samples"]["watch.latency_ms"]["count"] == 2
+    assert len(journal.RunJournal(output).completed(list(folder.rglob("*.png")))) == 2
+
+
+def test_corrupt_arrivals_are_skipped_and_journaled(fake_pipeline, tmp_path):
+    """A truncated upload fails on its own; the watcher keeps going."""
+    folder, output = tmp_path / "in", tmp_path / "out"
+    folder.mkdir()
+    Image.new("L", (3, 3)).save(folder / "good.png")
+    (folder / "broken.png").write_bytes(b"\x89PNG truncated")
+    model, stop = fake_pipeline(), threading.Event()
+    run_journal = journal.RunJournal(output)
+    loop = threading.Thread(
+        target=watch.watch_folder,
+        args=(model, folder, output, 0.05, 0.05, run_journal),
+        kwargs={"use_inotify": False, "stop": stop},
+    )
+    loop.start()
+    try:
+        wait_for(lambda: "good.png" in analyzed(model))
+        Image.new("L", (5, 5)).save(folder / "later.png")
+        wait_for(lambda: "later.png" in analyzed(model))
+    finally:
+        stop.set()
+        loop.join()
+        run_journal.close()
+
+    entries = [
+        json.loads(line)
+        for line in (output / journal.MANIFEST_NAME).read_text().splitlines()
+    ]
+    status = {Path(entry["path"]).name: entry["status"] for entry in entries}
+    assert status == {"good.png": "done", "broken.png": "failed", "later.png": "done"}
+    assert analyzed(model).count("broken.png") == 2
+    assert model.metrics.snapshot()["counters"]["watch.failed"] == 1
+
+
+def test_files_removed_before_analysis_do_not_stop_the_watcher(fake_pipeline, tmp_path):
+    """A file deleted after it settled is journaled as failed; watching goes on."""
+    folder, output = tmp_path / "in", tmp_path / "out"
+    folder.mkdir()
+    Image.new("L", (3, 3)).save(folder / "gone.png")
+    model, stop = fake_pipeline(), threading.Event()
+    prepare = model.prepare
+
+    def remove_then_prepare(image_path):
+        if image_path.name == "gone.png":
+            image_path.unlink(missing_ok=True)
+        return prepare(image_path)
+
+    model.prepare = remove_then_prepare
+    run_journal = journal.RunJournal(output)
+    loop = threading.Thread(
+        target=watch.watch_folder,
+        args=(model, folder, output, 0.05, 0.05, run_journal),
+        kwargs={"use_inotify": False, "stop": stop},
+    )
+    loop.start()
+    try:
+        wait_for(lambda: analyzed(model).count("gone.png") == 2)
+        Image.new("L", (5, 5)).save(folder / "later.png")
+        wait_for(lambda: "later.png" in analyzed(model))
+    finally:
+        stop.set()
+        loop.join()
+        run_journal.close()
+
+    entries = [
+        json.loads(line)
+        for line in (output / journal.MANIFEST_NAME).read_text().splitlines()
+    ]
+    status = {Path(entry["path"]).name: entry["status"] for entry in entries}
+    assert status == {"gone.png": "failed", "later.png": "done"}
+    assert model.metrics.snapshot()["counters"]["watch.failed"] == 1
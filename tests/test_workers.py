@@ -0,0 +1,95 @@
+"""Multi-process worker test suite (runs against a fake pipeline)."""
+
+import json
+import os
+from functools import partial
+
+import pytest
+from PIL import Image
+
+from bda_svc import workers
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """Five small image files."""
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"image{i}.png"
+        Image.new("RGB", (8, 8)).save(path)
+        paths.append(path)
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Test: Device assignment (plan_devices)
+# ---------------------------------------------------------------------------
+
+
+def test_plan_devices_spreads_gpus_and_splits_cores():
+    """Workers share GPUs round-robin and get disjoint CPU core sets."""
+    devices = workers.plan_devices(3, gpu_count=2, cpus=list(range(8)))
+
+    assert [device.gpu for device in devices] == [0, 1, 0]
+    assert [device.cpus for device in devices] == [(0, 1, 2), (3, 4, 5), (6, 7)]
+
+
+def test_plan_devices_cpu_only_with_few_cores():
+    """Without GPUs, workers beyond the core count share cores."""
+    devices = workers.plan_devices(3, gpu_count=0, cpus=[4, 5])
+
+    assert [device.gpu for device in devices] == [None, None, None]
+    assert [device.cpus for device in devices] == [(4,), (5,), (4,)]
+
+
+def test_pinned_gpus_respect_the_parent_mask(monkeypatch):
+    """GPU indices map through an inherited CUDA_VISIBLE_DEVICES mask."""
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "2,3")
+    devices = workers.plan_devices(2, gpu_count=2, cpus=[])
+
+    workers._pin_device(devices[0])
+    assert os.environ["CUDA_VISIBLE_DEVICES"] == "2"
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "2,3")
+    workers._pin_device(devices[1])
+    assert os.environ["CUDA_VISIBLE_DEVICES"] == "3"
+
+    monkeypatch.delenv("CUDA_VISIBLE_DEVICES")
+    workers._pin_device(devices[1])
+    assert os.environ["CUDA_VISIBLE_DEVICES"] == "1"
+
+
+# ---------------------------------------------------------------------------
+# Test: Parallel analysis (analyze_parallel)
+# ---------------------------------------------------------------------------
+
+
+def test_parent_exports_results_from_all_workers(
+    fake_pipeline, image_paths, tmp_path, capsys
+):
+    """Every image is exported by the parent, in input order."""
+    output = tmp_path / "out"
+
+    exported = workers.analyze_parallel(image_paths, output, 2, fake_pipeline)
+
+    assert [path.name.split("_")[0] for path in exported] == [
+        path.stem for path in image_paths
+    ]
+    pids = {json.loads(path.read_text())["pid"] for path in exported}
+    assert os.getpid() not in pids
+    assert "Processed (5/5" in capsys.readouterr().out
+
+
+def test_failed_batches_exit_after_exporting_the_rest(
+    fake_pipeline, image_paths, tmp_path
+):
+    """A failing batch is reported; the other images are still exported."""
+    output = tmp_path / "out"
+
+    with pytest.raises(SystemExit, match="images were not analyzed"):
+        workers.analyze_parallel(
+            image_paths, output, 2, partial(fake_pipeline, fail_on="image0.png")
+        )
+
+    exported = {path.name.split("_")[0] for path in output.iterdir()}
+    assert "image0" not in exported
+    assert len(exported) >= 3